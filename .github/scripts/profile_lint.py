@@ -0,0 +1,355 @@
+"""Single-pass profile lint engine.
+
+Rules register themselves with @register_rule and are run together over each
+changed profile. Every profile (and every sibling profile a rule compares
+against) is parsed at most once per run, no matter how many rules look at it.
+
+Each rule writes its own markdown comment file, so the existing PR comment
+workflows keep working unchanged.
+
+Usage:
+    ALL_CHANGED_FILES="..." python .github/scripts/profile_lint.py [--rule NAME ...]
+"""
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+import yaml
+
+# libyaml is several times faster than the pure Python loader when it is available
+YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+PROFILE_SUFFIXES = (".yml", ".yaml")
+
+RULES = {}
+
+
+def register_rule(cls):
+    RULES[cls.name] = cls
+    return cls
+
+
+class Profile:
+    """A profile YAML file, parsed lazily and at most once."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.basename = self.path.name
+        self.error = None
+        self._data = None
+        self._loaded = False
+
+    @property
+    def data(self):
+        if not self._loaded:
+            self._loaded = True
+            try:
+                with open(self.path) as fp:
+                    self._data = yaml.load(fp, Loader=YamlLoader)
+            except yaml.YAMLError as e:
+                self.error = e
+        return self._data
+
+    @property
+    def components(self):
+        data = self.data
+        if not isinstance(data, dict) or not isinstance(data.get("components"), list):
+            return None
+        return data["components"]
+
+
+class LintContext:
+    """Caches parsed profiles and directory listings shared by all rules."""
+
+    def __init__(self):
+        self._profiles = {}
+        self._directories = {}
+
+    def profile(self, path):
+        key = os.path.abspath(path)
+        if key not in self._profiles:
+            self._profiles[key] = Profile(path)
+        return self._profiles[key]
+
+    def siblings(self, profile):
+        """Return the other .yml profiles in the same directory as profile."""
+        directory = os.path.dirname(os.path.abspath(profile.path))
+        if directory not in self._directories:
+            self._directories[directory] = sorted(
+                name for name in os.listdir(directory) if Path(name).suffix == ".yml"
+            )
+        return [self.profile(os.path.join(directory, name))
+                for name in self._directories[directory] if name != profile.basename]
+
+
+class Rule:
+    """Base class for profile rules.
+
+    check() is called once per changed profile. write_comment() is called once
+    at the end of the run with the list of deleted profile paths.
+    """
+    name = None
+    comment_file = None
+
+    def check(self, file, profile, context):
+        raise NotImplementedError
+
+    def write_comment(self, f, deleted_profiles):
+        raise NotImplementedError
+
+    def failed(self):
+        return False
+
+
+def write_deleted_profiles(f, deleted_profiles):
+    if deleted_profiles:
+        f.write("\n:warning: **Deleted profile files detected:**\n")
+        for deleted in deleted_profiles:
+            f.write("- `%s`\n" % deleted)
+
+
+# --- duplicate profiles -----------------------------------------------------
+
+def compare_component_capabilities_unordered(comp1, comp2):
+    for cap1 in comp1["capabilities"]:
+        cap_match_found = False
+        for cap2 in comp2["capabilities"]:
+            if cap1["id"] == cap2["id"]:
+                if cap1 == cap2:
+                    cap_match_found = True
+                # not a direct match, compare embedded configurations if they exist to see if they are ordered differently
+                elif "config" in cap1 and "config" in cap2 and compare_embedded_configs(cap1, cap2):
+                        cap_match_found = True
+
+                # comparison is done, so break out of inner loop
+                break
+
+        if cap_match_found == False:
+            return False
+
+    # no mismatches found
+    return True
+
+
+# check for differences in embedded configs
+def compare_embedded_configs(cap1, cap2):
+    configs1 = cap1["config"]["values"]
+    configs2 = cap2["config"]["values"]
+    print("Comparing embedded configs...")
+    for config1 in configs1:
+        config_match_found = False
+        for config2 in configs2:
+            if config1["key"] == config2["key"]:
+                if config1 == config2:
+                    config_match_found = True
+                # check for "enabledValues" to see if it is just a difference in ordering of the same values
+                elif "enabledValues" in config1 and "enabledValues" in config2:
+                    set1 = set(value for value in config1["enabledValues"])
+                    set2 = set(value for value in config2["enabledValues"])
+                    if set1 == set2:
+                        config_match_found = True
+
+                # comparison is done, so break out of inner loop
+                break
+
+        if config_match_found == False:
+            return False
+
+    # no mismatches found
+    return True
+
+def compare_preferences(prof1, prof2):
+    if "preferences" in prof1 and "preferences" in prof2:
+        return prof1["preferences"] == prof2["preferences"]
+    elif "preferences" not in prof1 and "preferences" not in prof2:
+        return True
+    else:
+        return False
+
+def compare_metadata(prof1, prof2):
+    if "metadata" in prof1 and "metadata" in prof2:
+        return prof1["metadata"] == prof2["metadata"]
+    elif "metadata" not in prof1 and "metadata" not in prof2:
+        return True
+    else:
+        return False
+
+def compare_components(prof1, prof2):
+    if len(prof1["components"]) == len(prof2["components"]):
+        for y, new_component in enumerate(prof1["components"]):
+            current_component = prof2["components"][y]
+
+            # compare categores. Use get() in case the category does not exist like in "thing" profiles
+            if new_component.get("categories") != current_component.get("categories"):
+                return False
+
+            # compare labels
+            if new_component.get("label") != current_component.get("label"):
+                return False
+
+            # check that there are the same number of capabilities and that the top capability matches
+            if  ((len(new_component["capabilities"]) == len(current_component["capabilities"])) and
+                (new_component["capabilities"][0]["id"] == current_component["capabilities"][0]["id"])):
+                    # check if capabilities are the exact same, or
+                    # similar with same top capability but different subsequent ordering
+                    if (new_component["capabilities"] == current_component["capabilities"] or
+                        compare_component_capabilities_unordered(new_component, current_component)):
+                        print("Duplicate capabilties found.")
+                    else:
+                        return False
+            else:
+                return False
+    else:
+        return False
+
+    return True
+
+
+@register_rule
+class DuplicateProfilesRule(Rule):
+    name = "duplicates"
+    comment_file = "profile-comment-body.md"
+
+    def __init__(self):
+        self.duplicate_pairs = []
+
+    def check(self, file, profile, context):
+        print('\nNEW PROFILE:\n%s is a profile! Comparing to other profiles...' % file)
+        if profile.components is None:
+            return
+
+        for current in context.siblings(profile):
+            # Compare only files that have not already been found to be a duplicate
+            if (current.basename, profile.basename) in self.duplicate_pairs:
+                continue
+            print("Comparing %s vs %s" % (profile.basename, current.basename))
+            if current.components is None:
+                continue
+
+            ''' Compare profiles. A duplicate is defined as follows:
+                - categories must be the same
+                - capabilities must be the same, with some ordering restrictions
+                - top capability must match, but subsequent ordering does not matter
+                - embedded configs must be the same, but certain values can be ordered differently (i.e. enabledValues)
+                - preferences must be the same
+            '''
+            if(compare_preferences(profile.data, current.data) == True and
+               compare_metadata(profile.data, current.data) == True and
+               compare_components(profile.data, current.data) == True):
+                print("%s and %s are duplicates!\n" % (profile.basename, current.basename))
+                self.duplicate_pairs.append((profile.basename, current.basename))
+
+    def write_comment(self, f, deleted_profiles):
+        if self.duplicate_pairs:
+            f.write("Duplicate profile check: Warning - duplicate profiles detected.\n")
+            for duplicate in self.duplicate_pairs:
+                f.write("%s == %s\n" % (duplicate[0], duplicate [1]))
+        else:
+            f.write("Duplicate profile check: Passed - no duplicate profiles detected.\n")
+        write_deleted_profiles(f, deleted_profiles)
+
+
+# --- main component categories ----------------------------------------------
+
+@register_rule
+class MissingCategoriesRule(Rule):
+    name = "categories"
+    comment_file = "profile-categories-comment-body.md"
+
+    def __init__(self):
+        self.missing_category_profiles = []
+
+    def check(self, file, profile, context):
+        print('\nCHECKING PROFILE:\n%s' % file)
+        if profile.components is None:
+            print("Skipping %s - no components found" % profile.basename)
+            return
+
+        # Find the main component and verify it has a categories field
+        main_component = next(
+            (c for c in profile.components if c.get('id') == 'main'),
+            None
+        )
+
+        if main_component is None:
+            print("Warning: %s has no 'main' component" % profile.basename)
+            return
+
+        if not main_component.get('categories'):
+            print("MISSING CATEGORY: %s" % file)
+            self.missing_category_profiles.append(file)
+        else:
+            print("OK: %s has categories: %s" % (
+                profile.basename,
+                [c['name'] for c in main_component['categories']]
+            ))
+
+    def write_comment(self, f, deleted_profiles):
+        if self.missing_category_profiles:
+            f.write("Profile category check: :x: **Missing categories detected.**\n\n")
+            f.write("The following profiles are missing a `categories` field on the `main` component:\n\n")
+            for profile in self.missing_category_profiles:
+                f.write("- `%s`\n" % profile)
+            f.write("\nPlease add a `categories` entry to the `main` component. Example:\n")
+            f.write("```yaml\ncomponents:\n  - id: main\n    categories:\n      - name: Switch\n    capabilities:\n      ...\n```\n")
+        else:
+            f.write("Profile category check: :white_check_mark: Passed - all profiles have a category defined.\n")
+        write_deleted_profiles(f, deleted_profiles)
+
+    def failed(self):
+        return len(self.missing_category_profiles) > 0
+
+
+# --- engine -----------------------------------------------------------------
+
+def lint(changed_files, rule_names=None, context=None):
+    """Run the selected rules (all registered rules by default) over the changed
+    profiles in a single traversal, write each rule's comment file, and return
+    the rule instances."""
+    context = context or LintContext()
+    rules = [RULES[name]() for name in (rule_names or RULES.keys())]
+    deleted_profiles = []
+
+    for file in changed_files:
+        if '/profiles/' not in file or not file.endswith(PROFILE_SUFFIXES):
+            continue
+
+        # Skip deleted files and track them for warning
+        if not os.path.exists(file):
+            print("Skipping %s - file was deleted" % os.path.basename(file))
+            deleted_profiles.append(file)
+            continue
+
+        profile = context.profile(file)
+        if profile.data is None and profile.error is not None:
+            print("Error parsing %s: %s" % (profile.basename, profile.error))
+            continue
+
+        for rule in rules:
+            rule.check(file, profile, context)
+
+    for rule in rules:
+        with open(rule.comment_file, "w") as f:
+            rule.write_comment(f, deleted_profiles)
+        with open(rule.comment_file, "r") as f:
+            print("\n" + f.read())
+
+    return rules
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lint changed profiles listed in ALL_CHANGED_FILES")
+    parser.add_argument("--rule", "-r", action="append", choices=sorted(RULES.keys()),
+                        help="only run the given rule (may be specified multiple times, default: all rules)")
+    args = parser.parse_args(argv)
+
+    changed_files = os.environ.get('ALL_CHANGED_FILES', '').split()
+    rules = lint(changed_files, args.rule)
+    if any(rule.failed() for rule in rules):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
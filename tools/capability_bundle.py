@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# Copyright 2026 SmartThings
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""capability_bundle.py
+
+Builds and reads a consolidated capability bundle: a single file holding every
+capability definition from a tools/fetch_capability_definitions.py cache
+directory, in place of hundreds of pretty-printed <id>_<version>.json files.
+
+Bundle layout
+-------------
+    header   8-byte magic b"STCAPB1\\0", uint32 flags, uint64 index length
+             (little endian)
+    index    compact JSON object mapping "<id>_<version>" to [offset, length]
+             of that definition within the data section
+    data     the definitions, each serialized as compact JSON and, when the
+             FLAG_ZLIB flag is set, individually zlib-compressed
+
+Because every entry is addressed by offset and compressed on its own, readers
+memory-map the file and decode only the definitions they ask for.
+
+Usage
+-----
+    python3 tools/capability_bundle.py build \\
+        --cache-dir ~/cap_cache --output ~/capabilities.stcb [--compress]
+
+    python3 tools/capability_bundle.py extract \\
+        --bundle ~/capabilities.stcb --output-dir ~/cap_cache \\
+        [--only switch_1 --only switchLevel_1]
+
+    python3 tools/capability_bundle.py list --bundle ~/capabilities.stcb
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from capability_cache import capability_file_name, default_file_mode, iter_cache_files, parse_capability_file_name
+
+MAGIC = b"STCAPB1\0"
+HEADER = struct.Struct("<8sIQ")
+FLAG_ZLIB = 0x1
+
+
+def is_bundle(path: Path) -> bool:
+    """True if path is a file that starts with the bundle magic."""
+    path = Path(path)
+    if not path.is_file():
+        return False
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def build_bundle(cache_dir: Path, output: Path, compress: bool = False) -> int:
+    """
+    Write every <id>_<version>.json file in cache_dir into a single bundle at
+    output.  The bundle is written to a temporary file and renamed into place,
+    so concurrent readers never see a partial bundle.
+
+    Returns the number of definitions written.
+    """
+    index: Dict[str, List[int]] = {}
+    blobs: List[bytes] = []
+    offset = 0
+    for (cap_id, cap_ver), path in iter_cache_files(cache_dir):
+        with open(path, encoding="utf-8") as f:
+            blob = json.dumps(json.load(f), separators=(",", ":")).encode("utf-8")
+        if compress:
+            blob = zlib.compress(blob, 9)
+        index[f"{cap_id}_{cap_ver}"] = [offset, len(blob)]
+        blobs.append(blob)
+        offset += len(blob)
+
+    index_blob = json.dumps(index, separators=(",", ":"), sort_keys=True).encode("utf-8")
+    flags = FLAG_ZLIB if compress else 0
+
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=output.parent, prefix=f".{output.name}.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, flags, len(index_blob)))
+            f.write(index_blob)
+            for blob in blobs:
+                f.write(blob)
+        os.chmod(tmp_name, default_file_mode())
+        os.replace(tmp_name, output)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+    return len(index)
+
+
+class CapabilityBundle:
+    """Read-only, memory-mapped access to a capability bundle."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # mmap refuses empty files; report it as a bad bundle below
+            self._map = b""
+        if len(self._map) < HEADER.size:
+            self.close()
+            raise ValueError(f"{self.path} is not a capability bundle")
+        magic, self.flags, index_length = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{self.path} is not a capability bundle")
+        index_start = HEADER.size
+        self._data_start = index_start + index_length
+        raw_index = json.loads(bytes(self._map[index_start:self._data_start]))
+        self._index: Dict[Tuple[str, int], Tuple[int, int]] = {}
+        for name, (offset, length) in raw_index.items():
+            key = parse_capability_file_name(name + ".json")
+            if key is not None:
+                self._index[key] = (offset, length)
+
+    def __enter__(self) -> "CapabilityBundle":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def __contains__(self, key: Tuple[str, int]) -> bool:
+        return key in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def keys(self) -> List[Tuple[str, int]]:
+        return sorted(self._index)
+
+    def read(self, cap_id: str, cap_ver: int) -> Optional[bytes]:
+        """Return the compact JSON bytes for a definition, or None if absent."""
+        entry = self._index.get((cap_id, cap_ver))
+        if entry is None:
+            return None
+        offset, length = entry
+        start = self._data_start + offset
+        blob = self._map[start:start + length]
+        if self.flags & FLAG_ZLIB:
+            blob = zlib.decompress(blob)
+        return bytes(blob)
+
+    def load(self, cap_id: str, cap_ver: int) -> Optional[Dict]:
+        blob = self.read(cap_id, cap_ver)
+        return json.loads(blob) if blob is not None else None
+
+    def items(self) -> Iterator[Tuple[Tuple[str, int], Dict]]:
+        for cap_id, cap_ver in self.keys():
+            yield (cap_id, cap_ver), self.load(cap_id, cap_ver)
+
+    def extract(self, output_dir: Path, keys: Optional[Iterable[Tuple[str, int]]] = None) -> int:
+        """
+        Write definitions back out as <id>_<version>.json files (all of them, or
+        only the given keys) for consumers that read a cache directory.
+
+        Returns the number of files written.
+        """
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        written = 0
+        for cap_id, cap_ver in (self.keys() if keys is None else keys):
+            blob = self.read(cap_id, cap_ver)
+            if blob is None:
+                continue
+            (output_dir / capability_file_name(cap_id, cap_ver)).write_bytes(blob)
+            written += 1
+        return written
+
+
+def _parse_key(name: str) -> Tuple[str, int]:
+    key = parse_capability_file_name(name if name.endswith(".json") else name + ".json")
+    if key is None:
+        raise argparse.ArgumentTypeError(f"expected <capabilityId>_<version>, got {name!r}")
+    return key
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Build a bundle from a capability cache directory.")
+    build.add_argument("--cache-dir", metavar="PATH", required=True,
+                       help="Directory of <capabilityId>_<version>.json files.")
+    build.add_argument("--output", metavar="PATH", required=True, help="Bundle file to write.")
+    build.add_argument("--compress", action="store_true", default=False,
+                       help="zlib-compress each definition.")
+
+    extract = subparsers.add_parser("extract", help="Write bundle entries back out as JSON files.")
+    extract.add_argument("--bundle", metavar="PATH", required=True, help="Bundle file to read.")
+    extract.add_argument("--output-dir", metavar="PATH", required=True,
+                         help="Directory to write <capabilityId>_<version>.json files.")
+    extract.add_argument("--only", metavar="ID_VERSION", action="append", type=_parse_key,
+                         help="Only extract this <capabilityId>_<version> (may be specified multiple times).")
+
+    listing = subparsers.add_parser("list", help="List the definitions in a bundle.")
+    listing.add_argument("--bundle", metavar="PATH", required=True, help="Bundle file to read.")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        cache_dir = Path(args.cache_dir).expanduser().resolve()
+        if not cache_dir.is_dir():
+            print(f"ERROR: --cache-dir does not exist: {cache_dir}", file=sys.stderr)
+            sys.exit(1)
+        output = Path(args.output).expanduser().resolve()
+        count = build_bundle(cache_dir, output, args.compress)
+        print(f"Wrote {count} definition(s) to {output} ({output.stat().st_size} bytes).")
+        return
+
+    bundle_path = Path(args.bundle).expanduser().resolve()
+    if not is_bundle(bundle_path):
+        print(f"ERROR: not a capability bundle: {bundle_path}", file=sys.stderr)
+        sys.exit(1)
+
+    with CapabilityBundle(bundle_path) as bundle:
+        if args.command == "extract":
+            output_dir = Path(args.output_dir).expanduser().resolve()
+            count = bundle.extract(output_dir, args.only)
+            print(f"Extracted {count} definition(s) to {output_dir}.")
+        else:
+            for cap_id, cap_ver in bundle.keys():
+                print(capability_file_name(cap_id, cap_ver))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+# Copyright 2026 SmartThings
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""capability_cache.py
+
+Helpers for reading the local capability definition cache produced by
+tools/fetch_capability_definitions.py (one <capabilityId>_<version>.json file
+per capability/version pair, or a consolidated bundle built from those files by
+tools/capability_bundle.py).
+
+CapabilityIndex loads the whole cache once into memory and answers the
+questions profile tooling needs to ask about a definition: which attributes and
+commands exist, which values an attribute's ``value`` property accepts, and
+which commands can be used as ``{{enumCommands}}``.
+"""
+
+import json
+import os
+import re
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Set, Tuple
+
+CAPABILITY_FILE_RE = re.compile(r"^(?P<id>.+)_(?P<version>\d+)\.json$")
+# The process umask, read once at import since os.umask() can only read it by setting it
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def default_file_mode() -> int:
+    """
+    The mode open() would give a new file.  Cache files are written through
+    tempfile.mkstemp(), which always uses 0600, and get this mode before they
+    are renamed into place so other users sharing the cache can read them.
+    """
+    return 0o666 & ~_UMASK
+
+
+def capability_file_name(cap_id: str, cap_ver: int) -> str:
+    return f"{cap_id}_{cap_ver}.json"
+
+
+def parse_capability_file_name(name: str) -> Optional[Tuple[str, int]]:
+    """Return (id, version) for a cache file name, or None if it is not one."""
+    m = CAPABILITY_FILE_RE.match(name)
+    if m is None:
+        return None
+    return m.group("id"), int(m.group("version"))
+
+
+def iter_cache_files(cache_dir: Path) -> Iterator[Tuple[Tuple[str, int], Path]]:
+    """Yield ((id, version), path) for every capability file in cache_dir."""
+    for path in sorted(Path(cache_dir).glob("*.json")):
+        key = parse_capability_file_name(path.name)
+        if key is not None:
+            yield key, path
+
+
+class CapabilityDefinition:
+    """The parts of a capability definition that profile tooling validates against."""
+
+    def __init__(self, definition: Dict):
+        self.id = definition.get("id")
+        self.version = definition.get("version")
+        self.attributes: Dict[str, Dict] = definition.get("attributes") or {}
+        self.commands: Dict[str, Dict] = definition.get("commands") or {}
+
+    def value_schema(self, attribute: str, prop: str = "value") -> Optional[Dict]:
+        schema = (self.attributes.get(attribute) or {}).get("schema") or {}
+        return (schema.get("properties") or {}).get(prop)
+
+    def allowed_values(self, attribute: str, prop: str = "value") -> Optional[Set]:
+        """The enum for an attribute property (or its array items), or None if unconstrained."""
+        schema = self.value_schema(attribute, prop)
+        if schema is None:
+            return None
+        enum = schema.get("enum")
+        if enum is None:
+            enum = (schema.get("items") or {}).get("enum")
+        return set(enum) if enum is not None else None
+
+    def enum_commands(self) -> Set[str]:
+        """Commands usable in a ``{{enumCommands}}`` config entry."""
+        names = set(self.commands.keys())
+        for attribute in self.attributes.values():
+            for enum_command in attribute.get("enumCommands") or []:
+                names.add(enum_command.get("command"))
+        return names
+
+    def command_arguments(self, command: str) -> List[str]:
+        return [arg.get("name") for arg in (self.commands.get(command) or {}).get("arguments") or []]
+
+
+class CapabilityIndex:
+    """An in-memory index of every capability definition in the local cache."""
+
+    def __init__(self, definitions: Dict[Tuple[str, int], CapabilityDefinition]):
+        self.definitions = definitions
+
+    @classmethod
+    def load(cls, cache: Path) -> "CapabilityIndex":
+        """Load every definition from a cache directory or a capability bundle file."""
+        # Imported here because capability_bundle itself builds on this module
+        from capability_bundle import CapabilityBundle, is_bundle
+
+        definitions = {}
+        if is_bundle(cache):
+            with CapabilityBundle(cache) as bundle:
+                for key, definition in bundle.items():
+                    definitions[key] = CapabilityDefinition(definition)
+            return cls(definitions)
+
+        for key, path in iter_cache_files(cache):
+            with open(path, encoding="utf-8") as f:
+                definitions[key] = CapabilityDefinition(json.load(f))
+        return cls(definitions)
+
+    def get(self, cap_id: str, cap_ver: int) -> Optional[CapabilityDefinition]:
+        return self.definitions.get((cap_id, cap_ver))
+
+    def __contains__(self, key: Tuple[str, int]) -> bool:
+        return key in self.definitions
+
+    def __len__(self) -> int:
+        return len(self.definitions)
+
+
+def load_manifest(manifest_dir: Path, driver: str) -> Optional[Dict]:
+    """
+    A driver's manifest, or None if it has none: the capability file names its
+    profiles use under "capabilities", and the capability ids its Lua source
+    refers to (at any version) under "references".
+    """
+    path = Path(manifest_dir) / f"{driver}.json"
+    if not path.is_file():
+        return None
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    manifest.setdefault("capabilities", [])
+    manifest.setdefault("references", [])
+    return manifest
+
+
+class DriverCapabilityDirs:
+    """
+    Per-driver views of a capability cache for the test runners.
+
+    Each driver gets its own directory holding only the capability files listed
+    in its manifest (written by fetch_capability_definitions.py --manifest-dir),
+    plus every cached version of the capabilities its Lua source refers to,
+    symlinked from a cache directory or extracted from a bundle, so each test
+    process loads only its own driver's definitions.  Drivers without a manifest
+    get the whole cache.
+
+    Directories are built on first use and are safe to build from several
+    processes at once.
+    """
+
+    def __init__(self, source: Path, manifest_dir: Optional[Path], work_dir: Path):
+        # Imported here because capability_bundle itself builds on this module
+        from capability_bundle import is_bundle
+
+        self.source = Path(source)
+        self.manifest_dir = Path(manifest_dir) if manifest_dir else None
+        self.work_dir = Path(work_dir)
+        self.source_is_bundle = is_bundle(self.source)
+        self._source_keys: Optional[List[Tuple[str, int]]] = None
+
+    @classmethod
+    def from_env(cls, env: Mapping[str, str]) -> Optional["DriverCapabilityDirs"]:
+        """
+        Build from ST_CAPABILITY_JSON_DIR and ST_CAPABILITY_MANIFEST_DIR.  Returns
+        None when there is nothing to do, i.e. no cache is configured, or the
+        cache is a plain directory and no manifests were given.
+        """
+        source = env.get("ST_CAPABILITY_JSON_DIR")
+        manifest_dir = env.get("ST_CAPABILITY_MANIFEST_DIR")
+        if not source or not Path(source).exists():
+            return None
+        if not manifest_dir and Path(source).is_dir():
+            return None
+        return cls(Path(source).resolve(), Path(manifest_dir).resolve() if manifest_dir else None,
+                   Path(tempfile.mkdtemp(prefix="st_capabilities_")))
+
+    def for_driver(self, driver: str) -> Path:
+        """The ST_CAPABILITY_JSON_DIR to use for tests of the given driver."""
+        manifest = load_manifest(self.manifest_dir, driver) if self.manifest_dir else None
+        if manifest is None:
+            if not self.source_is_bundle:
+                return self.source
+            return self._materialize("_all", None)
+        names = set(manifest["capabilities"])
+        references = set(manifest["references"])
+        if references:
+            names.update(capability_file_name(cap_id, cap_ver)
+                         for cap_id, cap_ver in self.source_keys() if cap_id in references)
+        return self._materialize(driver, sorted(names))
+
+    def source_keys(self) -> List[Tuple[str, int]]:
+        """Every (id, version) in the cache, read once."""
+        if self._source_keys is None:
+            if self.source_is_bundle:
+                from capability_bundle import CapabilityBundle
+
+                with CapabilityBundle(self.source) as bundle:
+                    self._source_keys = bundle.keys()
+            else:
+                self._source_keys = [key for key, _ in iter_cache_files(self.source)]
+        return self._source_keys
+
+    def cleanup(self) -> None:
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def _materialize(self, name: str, names: Optional[Iterable[str]]) -> Path:
+        dest = self.work_dir / name
+        if dest.is_dir():
+            return dest
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+        tmp = Path(tempfile.mkdtemp(dir=self.work_dir, prefix=f".{name}."))
+        if self.source_is_bundle:
+            from capability_bundle import CapabilityBundle
+
+            keys = None if names is None else [parse_capability_file_name(n) for n in names]
+            with CapabilityBundle(self.source) as bundle:
+                bundle.extract(tmp, [k for k in keys if k is not None] if keys is not None else None)
+        else:
+            for file_name in names:
+                target = self.source / file_name
+                if target.is_file():
+                    os.symlink(target, tmp / file_name)
+        try:
+            os.rename(tmp, dest)
+        except OSError:
+            # Another process built the same directory first
+            shutil.rmtree(tmp, ignore_errors=True)
+        return dest
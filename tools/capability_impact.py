@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# Copyright 2026 SmartThings
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""capability_impact.py
+
+Maps capabilities to the drivers and test files that use them, so a change to
+a capability definition in the ST_CAPABILITY_JSON_DIR cache only reruns the
+tests it can affect.
+
+A driver uses a capability when one of its profiles lists it (at a given
+version, parsed the way fetch_capability_definitions.py scans profiles), or
+when its Lua source refers to it as capabilities.<id> or
+capabilities["<id>"] (any version).  A test file uses a capability when it
+refers to it the same way, or names one of the driver's profiles that lists
+it (as in t_utils.get_profile_definition("<profile>.yml")).
+
+A changed definition can affect any test of a driver that uses it, since
+the driver's own code may emit its events, so by default every test file of
+those drivers is impacted.  --precise narrows this to the test files that use
+the capability themselves.
+
+Usage
+-----
+    python3 tools/capability_impact.py CAPABILITY ... [--precise] [--verbose]
+        [--files-only]
+    python3 tools/capability_impact.py
+    python3 tools/run_driver_tests.py --capability-changes CAPABILITY ...
+    python3 tools/run_driver_tests_p.py --capability-changes CAPABILITY ...
+
+CAPABILITY is a changed cache file (switchLevel_1.json, or a path to one), or
+a capability id (switchLevel) for every version of it.  Without any, prints
+how many drivers and test files each capability reaches.
+"""
+
+import argparse
+import re
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from capability_cache import parse_capability_file_name
+from driver_references import LUA_TOKEN_RE, lua_strings
+from fetch_capability_definitions import iter_profiles, profile_capabilities
+
+DRIVER_DIR = Path(__file__).resolve().parents[1].joinpath("drivers")
+# a capability id and version; a version of None matches every version
+CapabilityKey = Tuple[str, Optional[int]]
+CAPABILITIES_MODULE_RE = re.compile(r"""\blocal\s+([A-Za-z_]\w*)\s*=\s*require\s*\(?\s*["']st\.capabilities["']""")
+PROFILE_SUFFIXES = (".yml", ".yaml")
+
+
+def capability_references(text: str) -> Set[CapabilityKey]:
+    """The capabilities Lua source refers to through st.capabilities, under any local name for it."""
+    # comments are dropped so prose mentioning capabilities is not a reference
+    text = LUA_TOKEN_RE.sub(lambda m: "" if m.group(0).startswith("--") else m.group(0), text)
+    names = {"capabilities"} | set(CAPABILITIES_MODULE_RE.findall(text))
+    pattern = re.compile(r"""(?<![.\w])(?:{})\s*(?:\.\s*([A-Za-z]\w*)|\[\s*["']([^"'\n]+)["']\s*\])""".format(
+        "|".join(re.escape(name) for name in sorted(names))))
+    refs = set()
+    for m in pattern.finditer(text):
+        cap_id = m.group(1) or m.group(2)
+        # the module's own functions (build_cap_from_json_string, ...) have underscores; capability ids don't
+        if "_" not in cap_id:
+            refs.add((cap_id, None))
+    return refs
+
+
+def parse_change(change: str) -> CapabilityKey:
+    """A changed capability, from a cache file name or path, or a bare capability id."""
+    name = Path(change).name
+    key = parse_capability_file_name(name)
+    if key is not None:
+        return key
+    if name.endswith(".json"):
+        name = name[:-len(".json")]
+    return name, None
+
+
+def matches(change: CapabilityKey, use: CapabilityKey) -> bool:
+    return change[0] == use[0] and (change[1] is None or use[1] is None or change[1] == use[1])
+
+
+def profile_name(literal: str) -> str:
+    for suffix in PROFILE_SUFFIXES:
+        if literal.endswith(suffix):
+            return literal[:-len(suffix)]
+    return literal
+
+
+class CapabilityImpact:
+    """Which drivers and test files use each capability."""
+
+    def __init__(self):
+        # driver directory -> capabilities its profiles and non-test source use
+        self.driver_uses: Dict[Path, Set[CapabilityKey]] = defaultdict(set)
+        # test file -> capabilities it refers to directly or through a profile it names
+        self.test_uses: Dict[Path, Set[CapabilityKey]] = defaultdict(set)
+        self.driver_tests: Dict[Path, List[Path]] = {}
+
+    @classmethod
+    def build(cls, drivers_dir: Path = DRIVER_DIR) -> "CapabilityImpact":
+        impact = cls()
+        for driver_dir in sorted(path.parent for path in Path(drivers_dir).glob("*/*/src")):
+            impact.add_driver(driver_dir)
+        return impact
+
+    def add_driver(self, driver_dir: Path) -> None:
+        # profile name (and file stem) -> the versioned capabilities it lists
+        profiles: Dict[str, Set[CapabilityKey]] = defaultdict(set)
+        for profile_path, profile in iter_profiles([driver_dir]):
+            if profile is None:
+                continue
+            caps = {(cap_id, cap_ver) for cap_id, cap_ver, _, _ in profile_capabilities(profile)}
+            profiles[profile_path.stem] |= caps
+            if isinstance(profile.get("name"), str):
+                profiles[profile["name"]] |= caps
+        uses = self.driver_uses[driver_dir]
+        for caps in profiles.values():
+            uses |= caps
+        src_dir = driver_dir / "src"
+        test_dir = src_dir / "test"
+        tests = []
+        for lua_file in sorted(src_dir.rglob("*.lua")):
+            text = lua_file.read_text(encoding="utf-8", errors="replace")
+            refs = capability_references(text)
+            if test_dir not in lua_file.parents:
+                uses |= refs
+            elif lua_file.name.startswith("test_"):
+                tests.append(lua_file)
+                test_uses = self.test_uses[lua_file]
+                test_uses |= refs
+                for literal in lua_strings(text):
+                    test_uses |= profiles.get(profile_name(literal), set())
+        self.driver_tests[driver_dir] = tests
+
+    def drivers(self, changes: Iterable[CapabilityKey]) -> List[Path]:
+        changes = list(changes)
+        return [driver_dir for driver_dir, uses in sorted(self.driver_uses.items())
+                if any(matches(change, use) for change in changes for use in uses)]
+
+    def test_files(self, changes: Iterable[CapabilityKey], precise: bool = False) -> List[Path]:
+        """The test files a change to these capabilities can affect."""
+        changes = list(changes)
+        impacted = {test_file for test_file, uses in self.test_uses.items()
+                    if any(matches(change, use) for change in changes for use in uses)}
+        if not precise:
+            for driver_dir in self.drivers(changes):
+                impacted.update(self.driver_tests[driver_dir])
+        return sorted(impacted)
+
+    def capabilities(self) -> Set[str]:
+        return {cap_id for uses in [*self.driver_uses.values(), *self.test_uses.values()] for cap_id, _ in uses}
+
+
+def impacted_test_files(changes: Iterable[str], precise: bool = False, drivers_dir: Path = DRIVER_DIR) -> List[Path]:
+    """The test files impacted by changed capability files or ids, for the test runners."""
+    return CapabilityImpact.build(drivers_dir).test_files([parse_change(change) for change in changes], precise)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find the drivers and test files a capability change affects")
+    parser.add_argument("changes", nargs="*", metavar="CAPABILITY",
+                        help="changed capability cache files (<id>_<version>.json) or capability ids")
+    parser.add_argument("--drivers-dir", type=Path, default=DRIVER_DIR, help="the drivers directory to index")
+    parser.add_argument("--precise", action="store_true",
+                        help="only test files that use the capability themselves, not every test of a driver that does")
+    parser.add_argument("--verbose", "-v", action="store_true", help="list each driver's impacted test files")
+    parser.add_argument("--files-only", action="store_true", help="print only the impacted test files, one per line")
+    args = parser.parse_args(argv)
+
+    impact = CapabilityImpact.build(args.drivers_dir)
+    if not args.changes:
+        rows = []
+        for cap_id in impact.capabilities():
+            change = [(cap_id, None)]
+            rows.append((len(impact.drivers(change)), len(impact.test_files(change)), cap_id))
+        for drivers, tests, cap_id in sorted(rows, key=lambda row: (-row[1], row[2])):
+            print("{:<60} {:>4} drivers {:>5} test files".format(cap_id, drivers, tests))
+        return
+
+    changes = [parse_change(change) for change in args.changes]
+    test_files = impact.test_files(changes, args.precise)
+    if args.files_only:
+        for test_file in test_files:
+            print(test_file)
+        return
+    by_driver = defaultdict(list)
+    for test_file in test_files:
+        by_driver[test_file.parents[2]].append(test_file)
+    for driver_dir in sorted(set(impact.drivers(changes)) | set(by_driver)):
+        print("{:<40} {:>4} test files".format(driver_dir.name, len(by_driver.get(driver_dir, []))))
+        if args.verbose:
+            for test_file in by_driver.get(driver_dir, []):
+                print("    {}".format(test_file.name))
+    print("{} test files in {} drivers".format(len(test_files), len(by_driver)))
+
+
+if __name__ == "__main__":
+    main()
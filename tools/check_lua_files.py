@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# Copyright 2026 SmartThings
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""check_lua_files.py
+
+The checks tools/pre-commit runs on Lua files, with the same output and exit
+status, reading each file once and many files at a time:
+
+    <file>: SmartThings Copyright missing from file
+        a non-empty file under drivers/SmartThings with no
+        "-- Copyright [(c) ]YYYY[-YYYY] SmartThings" line
+    <file>: Missing newline at end of file
+        a non-empty file whose last byte is not a newline
+
+Usage
+-----
+    python3 tools/check_lua_files.py [DIR]
+
+Without DIR, checks the staged files that were added or modified, like the
+hook.  With DIR, checks every file under it, listed in the order find would
+list them, so the output is line for line what the shell loop printed.
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional
+
+# what the hook gave grep -P, as bytes since grep ran with --text
+COPYRIGHT_RE = re.compile(rb"-{2,} Copyright (?:\xc2\xa9 )?\d{4}(?:-\d{4})? SmartThings")
+SMARTTHINGS_DRIVERS = "drivers/SmartThings"
+# bash's $(tail -c 1 file) is empty for a trailing newline and also drops a NUL byte
+TRAILING_BYTES_OK = (b"\n", b"\0")
+
+
+def find_files(root: str) -> Iterator[str]:
+    """Files under root in `find root -type f -follow -print` order: directory order, depth first."""
+    try:
+        entries = list(os.scandir(root))
+    except NotADirectoryError:
+        if os.path.isfile(root):
+            yield root
+        return
+    except OSError:
+        return
+    for entry in entries:
+        path = os.path.join(root, entry.name) if not root.endswith("/") else root + entry.name
+        try:
+            if entry.is_dir():
+                yield from find_files(path)
+            elif entry.is_file():
+                yield path
+        except OSError:
+            continue
+
+
+def staged_files() -> List[str]:
+    proc = subprocess.run(["git", "diff", "--staged", "--name-only", "--diff-filter=AM"],
+                          stdout=subprocess.PIPE, check=True)
+    return proc.stdout.decode().split()
+
+
+def check_file(path: str) -> List[str]:
+    """The hook's messages for one file."""
+    try:
+        with open(path, "rb") as f:
+            content = f.read()
+    except OSError:
+        return []
+    if not content:
+        return []
+    problems = []
+    if SMARTTHINGS_DRIVERS in path and COPYRIGHT_RE.search(content) is None:
+        problems.append("{}: SmartThings Copyright missing from file".format(path))
+    if content[-1:] not in TRAILING_BYTES_OK:
+        problems.append("{}: Missing newline at end of file".format(path))
+    return problems
+
+
+def check_files(paths: List[str], jobs: Optional[int] = None) -> List[str]:
+    """Messages for the Lua files among paths, in the order of paths."""
+    lua_files = [path for path in paths if path.endswith(".lua") and os.path.isfile(path)]
+    with ThreadPoolExecutor(max_workers=jobs or min(32, (os.cpu_count() or 1) + 4)) as executor:
+        return [problem for problems in executor.map(check_file, lua_files) for problem in problems]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check Lua files for the SmartThings copyright header and a final newline")
+    parser.add_argument("dir", nargs="?", help="check every file under DIR instead of the staged files")
+    args = parser.parse_args(argv)
+
+    paths = list(find_files(args.dir)) if args.dir else staged_files()
+    problems = check_files(paths)
+    for problem in problems:
+        print(problem)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
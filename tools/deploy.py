@@ -1,4 +1,5 @@
 import os, subprocess, requests, json, time, yaml, csv
+import driver_package
 
 BRANCH = os.environ.get('BRANCH')
 ENVIRONMENT = os.environ.get('ENVIRONMENT')
@@ -6,6 +7,11 @@ CHANGED_DRIVERS = os.environ.get('CHANGED_DRIVERS')
 # configurable from Jenkins to override and manually set the drivers to be uploaded
 DRIVERS_OVERRIDE = os.environ.get('DRIVERS_OVERRIDE') or "[]"
 DRY_RUN = os.environ.get("DRY_RUN") == True or os.environ.get("DRY_RUN") == "True"
+# "modules" or "all" to leave unreferenced Lua modules (and profiles) out of the packages, see driver_package.py
+PRUNE_UNREFERENCED = os.environ.get("PRUNE_UNREFERENCED") or None
+if PRUNE_UNREFERENCED and PRUNE_UNREFERENCED not in driver_package.PRUNE_CHOICES:
+  print("PRUNE_UNREFERENCED must be one of "+", ".join(driver_package.PRUNE_CHOICES)+", not "+repr(PRUNE_UNREFERENCED)+", aborting.")
+  exit(1)
 print(BRANCH)
 print(ENVIRONMENT)
 print(CHANGED_DRIVERS)
@@ -142,18 +148,30 @@ for partner in partners:
               shell=True,
               capture_output=True,
           )
-      retries = 0
-      while not os.path.exists(driver+".zip") and retries < 5:
+      if PRUNE_UNREFERENCED:
+        # analysis and packaging errors would only happen again, so they fail the deploy instead of being retried
         try:
-          subprocess.run(["zip -r ../"+driver+".zip config.yml fingerprints.yml search-parameters.y*ml $(find . -name \"*.pem\") $(find . -name \"*.crt\") $(find profiles -name \"*.y*ml\") $(find . -name \"*.lua\") -x \"*test*\""], cwd=driver, shell=True, capture_output=True, check=True)
-        except subprocess.CalledProcessError as error:
-          print(error.stderr)
-        retries += 1
-      if retries >= 5:
-        print("5 zip failures, skipping "+package_key+" and continuing.")
-        continue
-      with open(driver+".zip", 'rb') as driver_package:
-        data = driver_package.read()
+          excluded = driver_package.pruned_files(driver, PRUNE_UNREFERENCED)
+          driver_package.write_package(driver, driver+".zip", excluded)
+        except Exception:
+          print("Failed to package driver "+driver+" with PRUNE_UNREFERENCED="+PRUNE_UNREFERENCED+", aborting.")
+          if os.path.exists(driver+".zip"):
+            os.remove(driver+".zip")
+          raise
+        print("Left {} unreferenced files out of {}".format(len(excluded), driver))
+      else:
+        retries = 0
+        while not os.path.exists(driver+".zip") and retries < 5:
+          try:
+            subprocess.run(["zip -r ../"+driver+".zip config.yml fingerprints.yml search-parameters.y*ml $(find . -name \"*.pem\") $(find . -name \"*.crt\") $(find profiles -name \"*.y*ml\") $(find . -name \"*.lua\") -x \"*test*\""], cwd=driver, shell=True, capture_output=True, check=True)
+          except subprocess.CalledProcessError as error:
+            print(error.stderr)
+          retries += 1
+        if retries >= 5:
+          print("5 zip failures, skipping "+package_key+" and continuing.")
+          continue
+      with open(driver+".zip", 'rb') as package_file:
+        data = package_file.read()
         response = None
         retries = 0
         while response == None or (response.status_code == 500 or response.status_code == 429):
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# Copyright 2026 SmartThings
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""diff_coverage.py
+
+Coverage of changed lines only.  Intersects the lines changed since a git ref
+with the per-process luacov stats written by the test runners (see
+tools/luacov_stats.py), reading only the stats of drivers whose source changed,
+and reports a compact per-file summary, optionally as JUnit XML and as markdown
+for a PR comment.
+
+Usage
+-----
+    python3 tools/run_driver_tests.py --diff-coverage origin/main
+    python3 tools/diff_coverage.py --base origin/main \\
+        [--stats-dir tools/coverage_output/stats] \\
+        [--junit diff_coverage.xml] [--markdown diff_coverage.md] \\
+        [--fail-under 80]
+
+Changed lines are taken from `git diff` between the merge base of --base and
+HEAD and the working tree, so uncommitted edits count too.  luacov's stats do
+not record which lines are executable, so blank lines, comments and lines that
+only close a block (end, else, }, ...) are not counted unless they were hit.
+"""
+
+import argparse
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+import junit_xml
+
+import luacov_stats
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+HUNK_RE = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@")
+NON_EXECUTABLE_RE = re.compile(
+    r"^\s*(?:--.*|end[\s,;)]*|else|do|repeat|then|[\]})]+[,;]?|)\s*(?:--.*)?$"
+)
+BLOCK_COMMENT_START_RE = re.compile(r"--\[(=*)\[")
+
+
+class FileCoverage(NamedTuple):
+    path: Path
+    covered: List[int]
+    missing: List[int]
+
+    @property
+    def relevant(self) -> int:
+        return len(self.covered) + len(self.missing)
+
+
+def changed_lines(base: str, repo_root: Path = REPO_ROOT) -> Dict[Path, Set[int]]:
+    """Added or modified line numbers per driver source .lua file since base."""
+    merge_base = subprocess.run(["git", "merge-base", base, "HEAD"], cwd=repo_root,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    diff = subprocess.run(["git", "diff", "--unified=0", "--no-color", "--no-ext-diff", merge_base, "--", "drivers"],
+                          cwd=repo_root, capture_output=True, text=True, check=True).stdout
+    changes: Dict[Path, Set[int]] = defaultdict(set)
+    current = None
+    for line in diff.splitlines():
+        if line.startswith("+++ "):
+            name = line[4:]
+            current = None
+            if name.startswith("b/") and name.endswith(".lua") and "/src/" in name and "/src/test/" not in name:
+                current = repo_root.joinpath(name[2:])
+        elif current is not None:
+            m = HUNK_RE.match(line)
+            if m:
+                start, count = int(m.group(1)), int(m.group(2) or 1)
+                changes[current].update(range(start, start + count))
+    return {path: lines for path, lines in changes.items() if lines}
+
+
+def driver_src(path: Path) -> Optional[Path]:
+    """The src directory of the driver a source file belongs to."""
+    for parent in path.parents:
+        if parent.name == "src" and parent.parent.parent.parent.name == "drivers":
+            return parent
+    return None
+
+
+def load_driver_hits(src_dir: Path, stats_files: Iterable[Path]) -> Dict[Path, List[int]]:
+    """Merge a driver's stats and key the hit counts by absolute source path."""
+    hits = {}
+    for chunk_name, counts in luacov_stats.merge_stats(stats_files).items():
+        path = Path(chunk_name)
+        if not path.is_absolute():
+            path = src_dir.joinpath(path)
+        hits[path.resolve()] = counts
+    return hits
+
+
+def executable_lines(path: Path) -> Set[int]:
+    """Line numbers that look executable: not blank, not comments, not lone block closers."""
+    lines = set()
+    in_block_comment = None
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for number, text in enumerate(f, 1):
+            if in_block_comment is not None:
+                if in_block_comment in text:
+                    in_block_comment = None
+                continue
+            m = BLOCK_COMMENT_START_RE.search(text)
+            if m and text.lstrip().startswith("--["):
+                closer = "]" + m.group(1) + "]"
+                if closer not in text[m.end():]:
+                    in_block_comment = closer
+                continue
+            if NON_EXECUTABLE_RE.match(text) is None:
+                lines.add(number)
+    return lines
+
+
+def diff_coverage(changes: Dict[Path, Set[int]], stats_dir: Path) -> List[FileCoverage]:
+    by_driver: Dict[Path, List[Path]] = defaultdict(list)
+    for path in changes:
+        src_dir = driver_src(path)
+        if src_dir is not None and path.exists():
+            by_driver[src_dir].append(path)
+
+    results = []
+    for src_dir, paths in sorted(by_driver.items()):
+        # only the changed drivers' stats are ever read
+        stats_files = sorted(Path(stats_dir).joinpath(src_dir.parent.name).glob("*.out"))
+        hits = load_driver_hits(src_dir, stats_files)
+        for path in sorted(paths):
+            file_hits = hits.get(path.resolve(), [])
+            relevant = changes[path] & executable_lines(path)
+            covered, missing = [], []
+            for number in sorted(changes[path]):
+                hit = number <= len(file_hits) and file_hits[number - 1] > 0
+                if hit:
+                    covered.append(number)
+                elif number in relevant:
+                    missing.append(number)
+            results.append(FileCoverage(path, covered, missing))
+    return results
+
+
+def format_ranges(numbers: List[int]) -> str:
+    ranges = []
+    for n in numbers:
+        if ranges and ranges[-1][1] == n - 1:
+            ranges[-1][1] = n
+        else:
+            ranges.append([n, n])
+    return ", ".join(str(a) if a == b else "{}-{}".format(a, b) for a, b in ranges)
+
+
+def percent(covered: int, relevant: int) -> float:
+    return 100.0 * covered / relevant if relevant else 100.0
+
+
+def totals(results: List[FileCoverage]):
+    covered = sum(len(r.covered) for r in results)
+    relevant = sum(r.relevant for r in results)
+    return covered, relevant
+
+
+def relative(path: Path) -> str:
+    try:
+        return str(path.relative_to(REPO_ROOT))
+    except ValueError:
+        return str(path)
+
+
+def print_summary(results: List[FileCoverage]) -> None:
+    for r in results:
+        if r.relevant == 0:
+            continue
+        line = "{}: {}/{} changed lines covered ({:.0f}%)".format(
+            relative(r.path), len(r.covered), r.relevant, percent(len(r.covered), r.relevant))
+        if r.missing:
+            line += ", missing: " + format_ranges(r.missing)
+        print(line)
+    covered, relevant = totals(results)
+    total_line = "Diff coverage: {}/{} changed lines covered ({:.1f}%)".format(covered, relevant, percent(covered, relevant))
+    print("#" * len(total_line))
+    print(total_line)
+    print("#" * len(total_line))
+
+
+def write_junit(results: List[FileCoverage], output: Path, fail_under: Optional[float]) -> None:
+    test_cases = []
+    for r in results:
+        if r.relevant == 0:
+            continue
+        case = junit_xml.TestCase(relative(r.path), classname="diff coverage")
+        pct = percent(len(r.covered), r.relevant)
+        case.stdout = "{}/{} changed lines covered ({:.0f}%)".format(len(r.covered), r.relevant, pct)
+        if fail_under is not None and pct < fail_under:
+            case.add_failure_info("changed lines not covered: " + format_ranges(r.missing))
+        test_cases.append(case)
+    with open(output, "w") as f:
+        junit_xml.to_xml_report_file(f, [junit_xml.TestSuite("diff coverage", test_cases)])
+
+
+def write_markdown(results: List[FileCoverage], output: Path) -> None:
+    covered, relevant = totals(results)
+    lines = [
+        "## Diff coverage: {:.1f}% ({}/{} changed lines)".format(percent(covered, relevant), covered, relevant),
+        "",
+        "| File | Covered | Missing lines |",
+        "|------|---------|---------------|",
+    ]
+    for r in results:
+        if r.relevant == 0:
+            continue
+        lines.append("| `{}` | {}/{} | {} |".format(relative(r.path), len(r.covered), r.relevant,
+                                                     format_ranges(r.missing) or "-"))
+    Path(output).write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def report(
+    base: Optional[str],
+    stats_dir: Path = luacov_stats.DEFAULT_STATS_DIR,
+    junit: Optional[Path] = None,
+    markdown: Optional[Path] = None,
+    fail_under: Optional[float] = None,
+    changes: Optional[Dict[Path, Set[int]]] = None,
+) -> bool:
+    """Print (and optionally write) diff coverage; returns False if below fail_under."""
+    if changes is None:
+        changes = changed_lines(base)
+    results = diff_coverage(changes, stats_dir)
+    print_summary(results)
+    if junit is not None:
+        write_junit(results, junit, fail_under)
+    if markdown is not None:
+        write_markdown(results, markdown)
+    covered, relevant = totals(results)
+    return fail_under is None or percent(covered, relevant) >= fail_under
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report test coverage of the driver source lines changed since a git ref")
+    parser.add_argument("--base", "-b", required=True, help="git ref to diff against (its merge base with HEAD is used)")
+    parser.add_argument("--stats-dir", type=Path, default=luacov_stats.DEFAULT_STATS_DIR, help="per-driver luacov stats written by the test runners")
+    parser.add_argument("--junit", "-j", type=Path, help="write a JUnit XML report with one test case per changed file")
+    parser.add_argument("--markdown", "-m", type=Path, help="write a markdown summary suitable for a PR comment")
+    parser.add_argument("--fail-under", type=float, help="exit with an error if diff coverage is below this percentage")
+    args = parser.parse_args(argv)
+    if not report(args.base, args.stats_dir, args.junit, args.markdown, args.fail_under):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# Copyright 2026 SmartThings
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""driver_package.py
+
+Builds a driver's upload package the way deploy.py's zip command does:
+config.yml, fingerprints.yml, search-parameters.y*ml, every *.pem, *.crt and
+*.lua file, and every profiles/**/*.y*ml, leaving out any path containing
+"test".  Optionally leaves out the files driver_references.py finds
+unreferenced.
+
+Usage
+-----
+    python3 tools/driver_package.py DRIVER_DIR [--output driver.zip]
+        [--prune modules|all] [--list]
+
+Arguments
+---------
+    --output    Where to write the package (default: DRIVER_DIR.zip)
+    --prune     Leave out unreferenced Lua modules, or unreferenced modules
+                and profiles.  A profile nothing in the driver references
+                may still be in use by installed devices or assigned from
+                the cloud (virtual devices, for example), so review
+                driver_references.py's report before pruning profiles.
+    --list      Print the files the package would contain instead of
+                writing it
+"""
+
+import argparse
+import fnmatch
+import zipfile
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+PRUNE_CHOICES = ("modules", "all")
+ROOT_FILES = ("config.yml", "fingerprints.yml", "search-parameters.y*ml")
+# matched against the whole path, like the patterns given to find -name
+ANYWHERE_PATTERNS = ("*.pem", "*.crt", "*.lua")
+PROFILE_PATTERN = "*.y*ml"
+# zip -x "*test*"
+EXCLUDE_PATTERN = "*test*"
+
+
+def package_files(driver_dir: Path) -> List[Path]:
+    """The files deploy.py's zip command puts in the driver's package, relative to driver_dir."""
+    driver_dir = Path(driver_dir)
+    files = set()
+    for pattern in ROOT_FILES:
+        files.update(path for path in driver_dir.glob(pattern) if path.is_file())
+    for pattern in ANYWHERE_PATTERNS:
+        files.update(path for path in driver_dir.rglob(pattern) if path.is_file())
+    profiles_dir = driver_dir / "profiles"
+    if profiles_dir.is_dir():
+        files.update(path for path in profiles_dir.rglob(PROFILE_PATTERN) if path.is_file())
+    relative = (path.relative_to(driver_dir) for path in files)
+    return sorted(path for path in relative if not fnmatch.fnmatchcase(path.as_posix(), EXCLUDE_PATTERN))
+
+
+def pruned_files(driver_dir: Path, prune: Optional[str]) -> List[Path]:
+    """The unreferenced files to leave out of the package, relative to driver_dir."""
+    if prune is None:
+        return []
+    # imported here so packaging without pruning only needs the standard library
+    from driver_references import analyze_driver
+    refs = analyze_driver(Path(driver_dir))
+    unreferenced = refs.unreferenced if prune == "all" else refs.unreferenced_modules
+    return [path.relative_to(driver_dir) for path in unreferenced]
+
+
+def write_package(driver_dir: Path, output: Path, exclude: Iterable[Path] = ()) -> List[Path]:
+    """Zip the driver's package files, less exclude, to a path or file object; returns the files written."""
+    exclude = set(exclude)
+    files = [path for path in package_files(driver_dir) if path not in exclude]
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as package:
+        for path in files:
+            package.write(Path(driver_dir) / path, path.as_posix())
+    return files
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a driver package like deploy.py does")
+    parser.add_argument("driver_dir", type=Path, help="the driver directory")
+    parser.add_argument("--output", "-o", type=Path, help="the package to write (default: DRIVER_DIR.zip)")
+    parser.add_argument("--prune", choices=PRUNE_CHOICES, help="leave out unreferenced modules, or modules and profiles")
+    parser.add_argument("--list", action="store_true", help="list the package's files instead of writing it")
+    args = parser.parse_args(argv)
+
+    exclude = set(pruned_files(args.driver_dir, args.prune))
+    if args.list:
+        for path in package_files(args.driver_dir):
+            if path not in exclude:
+                print(path.as_posix())
+        return
+    output = args.output or args.driver_dir.with_name(args.driver_dir.name + ".zip")
+    files = write_package(args.driver_dir, output, exclude)
+    print("Wrote {} files to {} ({} bytes), leaving out {} unreferenced files".format(
+        len(files), output, output.stat().st_size, len(exclude)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# Copyright 2026 SmartThings
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""driver_references.py
+
+Finds the profiles and Lua modules of a driver that nothing references, so
+they can be left out of its package.
+
+Lua modules are reachable from src/init.lua through the require graph.  Since
+drivers load sub-drivers and generated cluster definitions by name at run
+time, every string literal in a reachable module counts as a reference:
+
+  - a literal naming a module ("fan-light", "st.foo", "sub_drivers/aqara")
+    reaches that module
+  - a literal naming a package, or ending in "." (or the part of a format
+    string before its first %-directive, like
+    "RvcCleanMode.server.attributes.%s"), reaches every module under that
+    package, as lazy loaders require modules by key under a package name
+  - a reachable package's can_handle module is reachable, since the lazy
+    sub-driver loader requires it by name
+
+Profiles are referenced by a fingerprint's deviceProfileName, or by a string
+literal in a reachable module.  Profile names are often assembled from parts
+("light-level-" .. n .. "-button"), so a profile also counts as referenced
+when a literal is a prefix of its name up to a "-" or "_", or when a literal
+that starts or ends with "-" or "_" occurs in its name (without those
+separators, which are often trimmed off once the name is built).  Everything this does
+not rule out is kept.
+
+Usage
+-----
+    python3 tools/driver_references.py [--driver NAME ...] [--verbose]
+
+Prints the unreferenced profiles and modules of each driver, and the bytes
+they would save in its package (see driver_package.py).
+"""
+
+import argparse
+import re
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Set
+
+import yaml
+
+from fingerprint_index import YamlLoader, load_profiles
+
+DRIVER_DIR = Path(__file__).resolve().parents[1].joinpath("drivers")
+# comments are matched (and dropped) first so strings inside them are not references
+LUA_TOKEN_RE = re.compile(
+    r"""--\[(?P<ceq>=*)\[.*?\](?P=ceq)\]"""
+    r"""|--[^\n]*"""
+    r"""|\[(?P<eq>=*)\[(?P<long>.*?)\](?P=eq)\]"""
+    r"""|"(?P<dq>(?:[^"\\\n]|\\.)*)\""""
+    r"""|'(?P<sq>(?:[^'\\\n]|\\.)*)'""",
+    re.DOTALL)
+FORMAT_DIRECTIVE_RE = re.compile(r"%[-+ #0-9.]*[a-zA-Z%]")
+FRAGMENT_SEPARATORS = ("-", "_")
+# modules a package's sub-driver loader requires by name
+LAZY_LOADED_MODULES = ("can_handle",)
+
+
+class DriverReferences(NamedTuple):
+    driver_dir: Path
+    modules: Dict[str, Path]
+    reachable_modules: Set[str]
+    profiles: Dict[str, Path]
+    referenced_profiles: Set[str]
+
+    @property
+    def unreferenced_modules(self) -> List[Path]:
+        reached = {self.modules[name] for name in self.reachable_modules}
+        return sorted(set(self.modules.values()) - reached)
+
+    @property
+    def unreferenced_profiles(self) -> List[Path]:
+        referenced_files = {self.profiles[name] for name in self.referenced_profiles}
+        return sorted(set(self.profiles.values()) - referenced_files)
+
+    @property
+    def unreferenced(self) -> List[Path]:
+        return self.unreferenced_profiles + self.unreferenced_modules
+
+
+def lua_strings(text: str) -> Iterable[str]:
+    for m in LUA_TOKEN_RE.finditer(text):
+        for group in ("dq", "sq", "long"):
+            value = m.group(group)
+            if value is not None:
+                yield value
+                break
+
+
+def driver_modules(src_dir: Path) -> Dict[str, Path]:
+    """Module name -> file for every non-test Lua file under src."""
+    modules = {}
+    for path in src_dir.rglob("*.lua"):
+        relative = path.relative_to(src_dir)
+        if relative.parts[0] == "test":
+            continue
+        parts = list(relative.with_suffix("").parts)
+        if parts[-1] == "init" and len(parts) > 1:
+            # a package's init.lua is required by the package name
+            modules[".".join(parts[:-1])] = path
+        modules[".".join(parts)] = path
+    return modules
+
+
+def module_references(literal: str, modules: Dict[str, Path], packages: Dict[str, List[str]]) -> Iterable[str]:
+    name = literal.replace("/", ".")
+    if name.endswith(".lua"):
+        name = name[:-4]
+    if name in modules:
+        yield name
+    prefix = FORMAT_DIRECTIVE_RE.split(name, 1)[0]
+    if prefix.endswith("."):
+        prefix = prefix[:-1]
+    elif prefix != name:
+        return
+    # lazy loaders take a package name and require its modules by key at run time
+    yield from packages.get(prefix, ())
+
+
+def reachable_modules(modules: Dict[str, Path], literals_of) -> Set[str]:
+    packages: Dict[str, List[str]] = {}
+    for name in modules:
+        parts = name.split(".")
+        for i in range(1, len(parts)):
+            packages.setdefault(".".join(parts[:i]), []).append(name)
+    reached_files: Set[Path] = set()
+    reached: Set[str] = set()
+    pending = ["init"] if "init" in modules else []
+    while pending:
+        name = pending.pop()
+        if name in reached:
+            continue
+        reached.add(name)
+        path = modules[name]
+        for lazy in LAZY_LOADED_MODULES:
+            if name + "." + lazy in modules:
+                pending.append(name + "." + lazy)
+        if path in reached_files:
+            continue
+        reached_files.add(path)
+        for literal in literals_of(path):
+            pending.extend(module_references(literal, modules, packages))
+    # a file is reachable under either of its names
+    return {name for name, path in modules.items() if path in reached_files}
+
+
+def profile_is_referenced(name: str, literals: Set[str], fragments: Set[str]) -> bool:
+    if name in literals:
+        return True
+    for i, char in enumerate(name):
+        if char in FRAGMENT_SEPARATORS and name[:i] in literals:
+            return True
+    return any(fragment in name for fragment in fragments)
+
+
+def profile_fragments(literals: Iterable[str]) -> Set[str]:
+    """The parts of string literals that look like pieces of a profile name built at run time."""
+    fragments = set()
+    for literal in literals:
+        for piece in FORMAT_DIRECTIVE_RE.split(literal):
+            if len(piece) > 1 and (piece[0] in FRAGMENT_SEPARATORS or piece[-1] in FRAGMENT_SEPARATORS):
+                # names are often built with a leading separator that is trimmed off afterwards
+                core = piece.strip("".join(FRAGMENT_SEPARATORS))
+                if core:
+                    fragments.add(core)
+    return fragments
+
+
+def fingerprint_profiles(driver_dir: Path) -> Set[str]:
+    path = driver_dir / "fingerprints.yml"
+    if not path.is_file():
+        return set()
+    with open(path, encoding="utf-8") as f:
+        data = yaml.load(f, Loader=YamlLoader) or {}
+    return {entry.get("deviceProfileName") for entries in data.values() for entry in entries or []
+            if isinstance(entry, dict)}
+
+
+def analyze_driver(driver_dir: Path) -> DriverReferences:
+    src_dir = driver_dir / "src"
+    modules = driver_modules(src_dir)
+    cache: Dict[Path, List[str]] = {}
+
+    def literals_of(path: Path) -> List[str]:
+        if path not in cache:
+            cache[path] = list(lua_strings(path.read_text(encoding="utf-8", errors="replace")))
+        return cache[path]
+
+    reachable = reachable_modules(modules, literals_of)
+    literals = {literal for name in reachable for literal in literals_of(modules[name])}
+    fragments = profile_fragments(literals)
+    profiles = load_profiles(driver_dir / "profiles")
+    referenced = fingerprint_profiles(driver_dir)
+    referenced.update(name for name in profiles if profile_is_referenced(name, literals, fragments))
+    return DriverReferences(driver_dir, modules, reachable, profiles, referenced & set(profiles))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report driver profiles and Lua modules nothing references")
+    parser.add_argument("--driver", "-d", action="append", dest="drivers", help="only analyze this driver (repeatable)")
+    parser.add_argument("--verbose", "-v", action="store_true", help="list every unreferenced file")
+    args = parser.parse_args(argv)
+
+    total_files = total_bytes = 0
+    for driver_dir in sorted(DRIVER_DIR.glob("*/*")):
+        if not driver_dir.joinpath("config.yml").is_file():
+            continue
+        if args.drivers and driver_dir.name not in args.drivers:
+            continue
+        refs = analyze_driver(driver_dir)
+        unreferenced = refs.unreferenced
+        if not unreferenced:
+            continue
+        size = sum(path.stat().st_size for path in unreferenced)
+        total_files += len(unreferenced)
+        total_bytes += size
+        print("{}: {} unreferenced profiles, {} unreferenced modules ({} bytes)".format(
+            driver_dir.name, len(refs.unreferenced_profiles), len(refs.unreferenced_modules), size))
+        if args.verbose:
+            for path in unreferenced:
+                print("\t" + str(path.relative_to(driver_dir)))
+    print("{} unreferenced files, {} bytes".format(total_files, total_bytes))
+
+
+if __name__ == "__main__":
+    main()
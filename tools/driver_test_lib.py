@@ -0,0 +1,574 @@
+# Copyright 2026 SmartThings
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""driver_test_lib.py
+
+Running driver test files and reading their results from Python, for tools
+that need test results without going through the text output of
+run_driver_tests.py.
+
+Each test file is run as its own `lua <test file>` process from the driver's
+src directory, and its stdout is parsed in a single pass into one result per
+test case plus the harness's closing "Passed X of Y tests" line:
+
+    Running test "<name>" (<i> of <n>)
+    ----------------------------------
+    <logs>
+    PASSED | FAILED
+    ...
+    Passed <x> of <y> tests
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import re
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Sequence, Set, Tuple
+
+import junit_xml
+
+try:
+    import resource
+except ImportError:  # not available on Windows; memory limits are then ignored
+    resource = None
+
+DRIVER_DIR = Path(os.path.abspath(__file__)).parents[1].joinpath("drivers")
+TEST_CASE_FILTER_LUA = DRIVER_DIR.parent.joinpath("tools", "lua", "test_case_filter.lua")
+LAST_FAILED_FILE = DRIVER_DIR.parent.joinpath("tools", "test_output", "last_failed.json")
+QUARANTINE_FILE = DRIVER_DIR.parent.joinpath("tools", "test_quarantine.json")
+# a quarantine entry that covers every test case in the file, and the file failing to run
+WHOLE_FILE = "*"
+
+OUTPUT_RE = re.compile(
+    r"^Running test \"(?P<name>[^\"]*)\""
+    r"|^[ \t]*(?P<status>PASSED|FAILED)\b"
+    r"|^Passed (?P<passed>\d+) of (?P<total>\d+) tests",
+    flags=re.MULTILINE,
+)
+
+
+def resource_properties(duration: float, cpu_time: float, max_rss_kb: int) -> Dict[str, str]:
+    """A lua process's resource usage as JUnit test suite properties, the same for every runner."""
+    return {
+        "wall_time": "%.3f" % duration,
+        "cpu_time": "%.3f" % cpu_time,
+        "max_rss_kb": str(max_rss_kb),
+    }
+
+
+class LuaRun(NamedTuple):
+    """The outcome of one lua process, with its resource usage."""
+    stdout: str
+    stderr: str
+    returncode: int
+    duration: float
+    timed_out: bool
+    # peak resident set size in KiB and user+system CPU seconds, 0 if unknown
+    max_rss_kb: int
+    cpu_time: float
+
+    def properties(self) -> Dict[str, str]:
+        """Resource usage as JUnit test suite properties."""
+        return resource_properties(self.duration, self.cpu_time, self.max_rss_kb)
+
+
+class TestCaseResult(NamedTuple):
+    name: str
+    passed: bool
+    output: str
+
+
+class TestFileResult(NamedTuple):
+    test_file: Path
+    cases: List[TestCaseResult]
+    # (passed, total) from the harness's last line, or None if it never got there
+    summary: Optional[Tuple[int, int]]
+    stdout: str
+    stderr: str
+    returncode: int
+    duration: float
+    timed_out: bool = False
+    max_rss_kb: int = 0
+    cpu_time: float = 0.0
+
+    @property
+    def driver(self) -> str:
+        return self.test_file.parts[-4]
+
+    @property
+    def complete(self) -> bool:
+        """True when the harness finished and every test it counted was seen."""
+        if self.summary is None:
+            return False
+        passed, total = self.summary
+        return total == len(self.cases) and passed == sum(1 for c in self.cases if c.passed)
+
+    def passing(self) -> List[str]:
+        return [c.name for c in self.cases if c.passed]
+
+    def failing(self, quarantine: Optional[Mapping[Path, Set[str]]] = None) -> List[str]:
+        """The failed test cases, less any that are quarantined."""
+        return [c.name for c in self.cases
+                if not c.passed and not (quarantine and quarantined(quarantine, self.test_file, c.name))]
+
+    def quarantined_failures(self, quarantine: Mapping[Path, Set[str]]) -> List[str]:
+        return [c.name for c in self.cases if not c.passed and quarantined(quarantine, self.test_file, c.name)]
+
+    @property
+    def suite_name(self) -> str:
+        return self.test_file.stem.replace("_", " ")
+
+    @property
+    def crashed(self) -> bool:
+        """
+        True when the lua process died partway through (the harness never
+        reported every test, or it exited non-zero) after every test it got to
+        had passed, as opposed to timing out or failing before any test ran.
+        A failed test, quarantined or not, already accounts for a non-zero
+        exit, so it is never a crash.
+        """
+        if self.timed_out or (len(self.cases) == 0 and self.stderr != "") or self.failing():
+            return False
+        return not self.complete or self.returncode != 0
+
+    @property
+    def errored(self) -> bool:
+        """True when the file failed outside of any test case: it timed out, failed to run or crashed."""
+        return self.timed_out or (len(self.cases) == 0 and self.stderr != "") or self.crashed
+
+    def failed_with(self, quarantine: Optional[Mapping[Path, Set[str]]]) -> bool:
+        """Whether the file failed, not counting quarantined test cases (or errors, if the whole file is)."""
+        if self.failing(quarantine):
+            return True
+        return self.errored and not (quarantine and quarantined(quarantine, self.test_file))
+
+    @property
+    def failed(self) -> bool:
+        return self.failed_with(None)
+
+    def junit_suite(self, quarantine: Optional[Mapping[Path, Set[str]]] = None) -> junit_xml.TestSuite:
+        """
+        The file's results as a JUnit test suite, the way run_driver_tests_p.py
+        reports them: one case per test, plus an error case if the file failed to
+        run or timed out, and the process's resource usage as properties.
+        Quarantined failures are reported as skipped.
+        """
+        quarantine = quarantine or {}
+        file_quarantined = quarantined(quarantine, self.test_file)
+
+        def add_error(test_case, message, output):
+            if file_quarantined:
+                test_case.add_skipped_info("quarantined as flaky: " + message, output)
+            else:
+                test_case.add_error_info(message, output)
+
+        suite = junit_xml.TestSuite(self.suite_name)
+        suite.properties = resource_properties(self.duration, self.cpu_time, self.max_rss_kb)
+        test_cases = []
+        for case in self.cases:
+            test_case = junit_xml.TestCase(case.name)
+            test_case.stdout = case.output
+            if not case.passed and quarantined(quarantine, self.test_file, case.name):
+                test_case.add_skipped_info("quarantined as flaky: FAILED", case.output)
+            elif not case.passed:
+                if "traceback" in case.output:
+                    test_case.add_error_info("ERROR", case.output)
+                else:
+                    test_case.add_failure_info("FAILED", case.output)
+            test_cases.append(test_case)
+        if self.stderr != "" and len(self.cases) == 0:
+            error_case = junit_xml.TestCase("(file error) {}".format(self.suite_name))
+            add_error(error_case, "ERROR", self.stderr)
+            test_cases.append(error_case)
+        if self.crashed:
+            crash_case = junit_xml.TestCase("(crash) {}".format(self.suite_name))
+            add_error(crash_case, "ERROR", "Exited with status {} after {} of its tests\n{}".format(
+                self.returncode, len(self.cases), self.stderr or self.stdout[-4096:]))
+            test_cases.append(crash_case)
+        if self.timed_out:
+            timeout_case = junit_xml.TestCase("(timeout) {}".format(self.suite_name))
+            add_error(timeout_case, "TIMEOUT", "Timed out after {:.1f} seconds\n{}".format(self.duration, self.stdout[-4096:]))
+            test_cases.append(timeout_case)
+        suite.test_cases = test_cases
+        return suite
+
+
+def discover_test_files(filter: Optional[str] = None, drivers: Optional[Iterable[str]] = None) -> List[Path]:
+    """
+    Test files under drivers/<partner>/<driver>/src/test, optionally restricted
+    to those whose path matches the regex filter and to the named drivers.
+    """
+    driver_names = set(drivers) if drivers is not None else None
+    filter_re = re.compile(filter) if filter is not None else None
+    test_files = []
+    for test_file in sorted(DRIVER_DIR.glob("*/*/src/test/test_*.lua")):
+        if driver_names is not None and test_file.parts[-4] not in driver_names:
+            continue
+        if filter_re is not None and filter_re.search(str(test_file)) is None:
+            continue
+        test_files.append(test_file)
+    return test_files
+
+
+def test_name_filter_args() -> List[str]:
+    """
+    lua arguments that make the harness register only the test cases whose name
+    contains $ST_TEST_NAME_FILTER; see tools/lua/test_case_filter.lua.
+    """
+    return ["-e", "dofile([==[%s]==])" % TEST_CASE_FILTER_LUA]
+
+
+def load_last_failed(path: Path = LAST_FAILED_FILE) -> Set[Path]:
+    """Test files that failed the last time they ran."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return {DRIVER_DIR.parent.joinpath(name) for name in json.load(f)}
+    except (OSError, ValueError):
+        return set()
+
+
+def save_last_failed(ran: Iterable[Path], failed: Iterable[Path], path: Path = LAST_FAILED_FILE) -> None:
+    """Update the last failed files: files that ran drop out unless they failed again."""
+    failed = set(failed)
+    last_failed = (load_last_failed(path) - set(ran)) | failed
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(sorted(str(p.relative_to(DRIVER_DIR.parent)) for p in last_failed), f, indent=1)
+
+
+def load_quarantine(path: Path = QUARANTINE_FILE) -> Dict[Path, Set[str]]:
+    """
+    Known flaky test cases, by test file, as written by tools/flaky_tests.py.
+    The runners still run them but report their failures without failing.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            return {DRIVER_DIR.parent.joinpath(name): set(cases) for name, cases in json.load(f).items()}
+    except (OSError, ValueError):
+        return {}
+
+
+def save_quarantine(quarantine: Mapping[Path, Iterable[str]], swept: Iterable[Path], path: Path = QUARANTINE_FILE) -> None:
+    """Replace the entries of the swept test files with quarantine's, keeping the rest."""
+    swept = set(swept)
+    entries = {test_file: cases for test_file, cases in load_quarantine(path).items() if test_file not in swept}
+    entries.update((test_file, set(cases)) for test_file, cases in quarantine.items() if cases)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({str(test_file.relative_to(DRIVER_DIR.parent)): sorted(cases) for test_file, cases in sorted(entries.items())},
+                  f, indent=1)
+        f.write("\n")
+
+
+def quarantined(quarantine: Mapping[Path, Set[str]], test_file: Path, case: Optional[str] = None) -> bool:
+    """Whether a test case (or, with no case, the file failing to run) is quarantined."""
+    cases = quarantine.get(Path(test_file))
+    return bool(cases) and (WHOLE_FILE in cases or (case is not None and case in cases))
+
+
+def changed_drivers() -> Set[str]:
+    """Drivers with uncommitted changes, from git status."""
+    proc = subprocess.run(["git", "status", "--porcelain", "--", "drivers"], cwd=DRIVER_DIR.parent,
+                          stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    drivers = set()
+    for line in proc.stdout.decode(errors="replace").splitlines():
+        parts = line[3:].strip('"').split(" -> ")[-1].split("/")
+        if len(parts) > 2:
+            drivers.add(parts[2])
+    return drivers
+
+
+def prioritize(test_files: Iterable[Path], last_failed: Optional[Set[Path]] = None) -> List[Path]:
+    """
+    Order test files so the likeliest failures run first: files that failed
+    last time, then files of drivers with uncommitted changes, each group most
+    recently modified first, then everything else in path order.
+    """
+    if last_failed is None:
+        last_failed = load_last_failed()
+    dirty = changed_drivers()
+
+    def key(test_file):
+        if test_file in last_failed:
+            group = 0
+        elif test_file.parts[-4] in dirty:
+            group = 1
+        else:
+            return (2, 0.0, str(test_file))
+        return (group, -test_file.stat().st_mtime, str(test_file))
+
+    return sorted(test_files, key=key)
+
+
+def parse_test_output(stdout: str) -> Tuple[List[TestCaseResult], Optional[Tuple[int, int]]]:
+    """Split harness output into per-test results and the (passed, total) summary."""
+    cases = []
+    summary = None
+    name = None
+    start = 0
+    for m in OUTPUT_RE.finditer(stdout):
+        if m.group("name") is not None:
+            name = m.group("name")
+            start = m.start()
+        elif m.group("status") is not None:
+            if name is not None:
+                cases.append(TestCaseResult(name, m.group("status") == "PASSED", stdout[start:m.end()]))
+                name = None
+        else:
+            summary = (int(m.group("passed")), int(m.group("total")))
+    return cases, summary
+
+
+def limit_memory(pid: int, limit_mb: int) -> None:
+    """Cap a running process's address space (RLIMIT_AS) at limit_mb MiB, where supported."""
+    if resource is None or not hasattr(resource, "prlimit"):
+        return
+    limit = limit_mb * 1024 * 1024
+    try:
+        resource.prlimit(pid, resource.RLIMIT_AS, (limit, limit))
+    except (OSError, ValueError):
+        pass  # the process already exited, or the limit is above the hard limit
+
+
+def _spawn_lua(args: Sequence[str], cwd: Path, env: Optional[Mapping[str, str]], memory_limit: Optional[int],
+               out, err) -> subprocess.Popen:
+    run_env = dict(os.environ if env is None else env)
+    run_env["PWD"] = str(cwd)
+    proc = subprocess.Popen(["lua", *args], cwd=cwd, env=run_env, stdout=out, stderr=err)
+    if memory_limit is not None:
+        limit_memory(proc.pid, memory_limit)
+    return proc
+
+
+def _lua_run(proc: subprocess.Popen, status: int, usage, start: float, timed_out: bool, out, err) -> LuaRun:
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    max_rss_kb, cpu_time = 0, 0.0
+    if usage is not None:
+        # ru_maxrss is in bytes on macOS and KiB elsewhere
+        max_rss_kb = usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+        cpu_time = usage.ru_utime + usage.ru_stime
+    duration = time.monotonic() - start
+    out.seek(0)
+    err.seek(0)
+    return LuaRun(out.read().decode(errors="replace"), err.read().decode(errors="replace"),
+                  proc.returncode, duration, timed_out, max_rss_kb, cpu_time)
+
+
+def run_lua(
+    args: Sequence[str],
+    cwd: Path,
+    env: Optional[Mapping[str, str]] = None,
+    timeout: Optional[float] = None,
+    memory_limit: Optional[int] = None,
+) -> LuaRun:
+    """
+    Run `lua <args>` in cwd, killing it after timeout seconds and capping its
+    address space at memory_limit MiB.  Output goes to temporary files rather
+    than pipes so nothing has to drain them while the process runs, and the
+    process is reaped with wait4 to get its peak RSS and CPU time.  Nothing
+    process-global (working directory, environment) is changed, so this is
+    safe to call from any thread.
+    """
+    with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+        start = time.monotonic()
+        proc = _spawn_lua(args, cwd, env, memory_limit, out, err)
+        timed_out = threading.Event()
+        lock = threading.Lock()
+        reaped = False
+
+        def kill():
+            # the lock keeps the kill from racing with reaping, which would free the pid
+            with lock:
+                if not reaped:
+                    timed_out.set()
+                    os.kill(proc.pid, signal.SIGKILL)
+
+        timer = None
+        if timeout is not None:
+            timer = threading.Timer(timeout, kill)
+            timer.daemon = True
+            timer.start()
+        try:
+            if hasattr(os, "waitid"):
+                # wait for the exit without reaping, so the pid stays valid until the lock is held
+                os.waitid(os.P_PID, proc.pid, os.WEXITED | os.WNOWAIT)
+            with lock:
+                reaped = True
+                if hasattr(os, "wait4"):
+                    _, status, usage = os.wait4(proc.pid, 0)
+                else:
+                    status, usage = os.waitpid(proc.pid, 0)[1], None
+        finally:
+            if timer is not None:
+                timer.cancel()
+        return _lua_run(proc, status, usage, start, timed_out.is_set(), out, err)
+
+
+async def run_lua_async(
+    args: Sequence[str],
+    cwd: Path,
+    env: Optional[Mapping[str, str]] = None,
+    timeout: Optional[float] = None,
+    memory_limit: Optional[int] = None,
+) -> LuaRun:
+    """
+    run_lua for asyncio.  On Linux the exit is awaited through a pidfd
+    registered with the event loop, so there is no thread or child watcher per
+    process and hundreds can be in flight at once; elsewhere run_lua runs in a
+    worker thread.
+    """
+    if not hasattr(os, "pidfd_open"):
+        return await asyncio.to_thread(run_lua, args, cwd, env, timeout, memory_limit)
+    loop = asyncio.get_running_loop()
+    with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+        start = time.monotonic()
+        proc = _spawn_lua(args, cwd, env, memory_limit, out, err)
+        pidfd = os.pidfd_open(proc.pid)
+        exited = loop.create_future()
+        loop.add_reader(pidfd, lambda: exited.done() or exited.set_result(None))
+        timed_out = False
+        try:
+            try:
+                await asyncio.wait_for(asyncio.shield(exited), timeout)
+            except asyncio.TimeoutError:
+                timed_out = True
+                # os.kill rather than proc.kill: Popen.poll() would reap the child before wait4
+                os.kill(proc.pid, signal.SIGKILL)
+                await exited
+        except BaseException:
+            # cancelled: don't leave the process running
+            os.kill(proc.pid, signal.SIGKILL)
+            raise
+        finally:
+            loop.remove_reader(pidfd)
+            os.close(pidfd)
+            _, status, usage = os.wait4(proc.pid, 0)
+        return _lua_run(proc, status, usage, start, timed_out, out, err)
+
+
+def run_test_file(
+    test_file: Path,
+    lua_args: Sequence[str] = (),
+    env: Optional[Mapping[str, str]] = None,
+    timeout: Optional[float] = None,
+    memory_limit: Optional[int] = None,
+) -> TestFileResult:
+    """Run one test file with lua from its driver's src directory and parse the results."""
+    test_file = Path(test_file)
+    run = run_lua([*lua_args, str(test_file)], test_file.parents[1], env, timeout, memory_limit)
+    cases, summary = parse_test_output(run.stdout)
+    return TestFileResult(test_file, cases, summary, run.stdout, run.stderr, run.returncode, run.duration,
+                          run.timed_out, run.max_rss_kb, run.cpu_time)
+
+
+def run_test_files(
+    test_files: Iterable[Path],
+    jobs: Optional[int] = None,
+    lua_args: Sequence[str] = (),
+    env_for: Optional[Callable[[Path], Mapping[str, str]]] = None,
+    timeout: Optional[float] = None,
+    memory_limit: Optional[int] = None,
+    executor: Optional[Executor] = None,
+) -> Iterator[TestFileResult]:
+    """
+    Run test files concurrently and yield each result as soon as it is done.
+    env_for, if given, returns the environment for each test file.  Every file
+    is a separate lua process, so threads are enough to keep them all busy.
+    A long-lived executor can be passed in to reuse its threads across runs
+    (jobs then only bounds how many files are queued ahead).
+
+    test_files is read lazily and at most twice jobs files are submitted at a
+    time, so a long run (a repeated sweep, say) only holds the results that
+    have not been yielded yet.
+    """
+    if executor is None:
+        with ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as executor:
+            yield from run_test_files(test_files, jobs, lua_args, env_for, timeout, memory_limit, executor)
+        return
+    in_flight = 2 * (jobs or os.cpu_count() or 1)
+    remaining = iter(test_files)
+    pending: Set[Future] = set()
+
+    def submit(count: int) -> None:
+        for test_file in itertools.islice(remaining, count):
+            pending.add(executor.submit(run_test_file, test_file, lua_args, env_for(test_file) if env_for else None,
+                                        timeout, memory_limit))
+
+    try:
+        submit(in_flight)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            pending.difference_update(done)
+            submit(len(done))
+            for future in done:
+                yield future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+async def run_test_file_async(
+    test_file: Path,
+    lua_args: Sequence[str] = (),
+    env: Optional[Mapping[str, str]] = None,
+    timeout: Optional[float] = None,
+    memory_limit: Optional[int] = None,
+) -> TestFileResult:
+    """run_test_file for asyncio."""
+    test_file = Path(test_file)
+    run = await run_lua_async([*lua_args, str(test_file)], test_file.parents[1], env, timeout, memory_limit)
+    cases, summary = parse_test_output(run.stdout)
+    return TestFileResult(test_file, cases, summary, run.stdout, run.stderr, run.returncode, run.duration,
+                          run.timed_out, run.max_rss_kb, run.cpu_time)
+
+
+async def run_test_files_async(
+    test_files: Iterable[Path],
+    jobs: Optional[int] = None,
+    lua_args: Sequence[str] = (),
+    env_for: Optional[Callable[[Path], Mapping[str, str]]] = None,
+    timeout: Optional[float] = None,
+    memory_limit: Optional[int] = None,
+    on_start: Optional[Callable[[Path], None]] = None,
+) -> AsyncIterator[TestFileResult]:
+    """
+    Run test files with at most jobs lua processes at once and yield each
+    result as soon as it is done.  on_start, if given, is called as each file's
+    process is started.
+    """
+    semaphore = asyncio.Semaphore(jobs or os.cpu_count())
+
+    async def run_one(test_file):
+        async with semaphore:
+            if on_start is not None:
+                on_start(test_file)
+            return await run_test_file_async(test_file, lua_args, env_for(test_file) if env_for else None,
+                                             timeout, memory_limit)
+
+    tasks = [asyncio.ensure_future(run_one(test_file)) for test_file in test_files]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
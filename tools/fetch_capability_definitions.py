@@ -36,7 +36,10 @@ Usage
         --drivers-dir ~/projects/SmartThingsEdgeDrivers/drivers \\
         --output-dir ~/cap_cache \\
         [--overwrite] \\
-        [--failed-output-file failures_comment.md]
+        [--shared-cache [--lock-timeout 300]] \\
+        [--failed-output-file failures_comment.md] \\
+        [--manifest-dir ~/cap_manifests] \\
+        [--bundle-file ~/capabilities.stcb [--compress-bundle]]
 
 Arguments
 ---------
@@ -49,11 +52,33 @@ Arguments
                                When absent (default), only missing files are fetched;
                                capabilities already on disk are skipped entirely,
                                and no API request is made for them.
+    --shared-cache             --output-dir is shared by concurrent fetchers (e.g. CI
+                               jobs on one build agent).  Each capability is locked
+                               (an flock() lease under <output-dir>/.locks) while it
+                               is fetched, and pairs that another process is already
+                               fetching are waited for rather than downloaded again.
+                               Any pair the other process fails to write is then
+                               fetched by this one.
+    --lock-timeout SECONDS     With --shared-cache, the longest time to wait for
+                               other processes (default 300).
     --failed-output-file PATH  When set, write a markdown-formatted report of any
                                capabilities that could not be downloaded to this file.
                                The file is only created when there are failures, making
                                it suitable for use as a PR comment via hashFiles() checks
                                in CI workflows.
+    --manifest-dir PATH        When set, write a <driver>.json manifest per driver
+                               listing the <capabilityId>_<version>.json files that
+                               driver's profiles use, and the capability ids its Lua
+                               source refers to.  The test runners read these from
+                               ST_CAPABILITY_MANIFEST_DIR so each driver's tests only
+                               see the definitions that driver needs.
+    --bundle-file PATH         When set, also write every definition in --output-dir
+                               to a single consolidated bundle file (see
+                               tools/capability_bundle.py) once fetching completes.
+    --compress-bundle          zlib-compress each definition in the bundle.
+
+Files are always written to a temporary file and renamed into place, so a killed
+or concurrent fetch never leaves a partial JSON file behind.
 
 Environment
 -----------
@@ -65,16 +90,32 @@ import argparse
 import json
 import os
 import sys
+import tempfile
 import time
 from pathlib import Path
-from typing import Dict, List, Set, Tuple
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 
 import requests
 import yaml
 
+try:
+    import fcntl
+except ImportError:  # Windows: shared-cache locking is a no-op
+    fcntl = None
+
+from capability_bundle import build_bundle
+from capability_cache import capability_file_name, default_file_mode
+
 API_BASE = "https://api.smartthings.com/v1"
 QUERY_ENDPOINT = f"{API_BASE}/capabilities/query"
 
+# Per-capability lock files live here when --shared-cache is used
+LOCK_DIR_NAME = ".locks"
+LOCK_POLL_INTERVAL = 0.2
+
+# libyaml is several times faster than the pure Python loader when it is available
+YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
 # These two IDs appear in the /capabilities list but are rejected by both the
 # /capabilities/query endpoint and the individual GET endpoint.  They are
 # lowercase/deprecated duplicates of alarmSensor and samsungTV respectively.
@@ -253,45 +294,145 @@ def build_headers(pat: str) -> Dict:
     }
 
 
-def scan_profiles(drivers_dirs: List[Path]) -> Set[Tuple[str, int]]:
+def iter_profiles(
+    drivers_dirs: List[Path],
+    errors: Optional[List[Tuple[Path, Exception]]] = None,
+) -> Iterator[Tuple[Path, Optional[Dict]]]:
     """
-    Walk every drivers_dir, find all *.yml files under any profiles/ subdirectory,
-    parse them with PyYAML, and extract (capabilityId, version) pairs.
+    Walk every drivers_dir and yield (path, profile) for every *.yml file under
+    any profiles/ subdirectory.  profile is None when the file parses but has no
+    components list.
 
-    Returns a deduplicated set of (id, version) tuples.
+    Files that fail to parse, or whose top level is not a mapping, are reported
+    on stderr and, when errors is given, appended to it as (path, exception).
+    They are not yielded.
     """
-    found: Set[Tuple[str, int]] = set()
-    profile_count = 0
-    error_count = 0
-
     for drivers_dir in drivers_dirs:
         for profile_path in drivers_dir.rglob("profiles/*.yml"):
-            profile_count += 1
             try:
                 with open(profile_path, encoding="utf-8") as f:
-                    profile = yaml.safe_load(f)
-                if not profile or not isinstance(profile.get("components"), list):
-                    continue
-                for component in profile["components"]:
-                    for cap in component.get("capabilities") or []:
-                        cap_id = cap.get("id")
-                        cap_ver = cap.get("version", 1)
-                        if cap_id:
-                            found.add((cap_id, int(cap_ver)))
+                    profile = yaml.load(f, Loader=YamlLoader)
             except Exception as exc:
                 print(f"  WARNING: failed to parse {profile_path}: {exc}", file=sys.stderr)
-                error_count += 1
+                if errors is not None:
+                    errors.append((profile_path, exc))
+                continue
+            if profile is not None and not isinstance(profile, dict):
+                exc = ValueError(f"expected a mapping at the top level, got {type(profile).__name__}")
+                print(f"  WARNING: failed to parse {profile_path}: {exc}", file=sys.stderr)
+                if errors is not None:
+                    errors.append((profile_path, exc))
+                continue
+            if not profile or not isinstance(profile.get("components"), list):
+                yield profile_path, None
+                continue
+            yield profile_path, profile
+
+
+def profile_capabilities(profile: Dict) -> Iterator[Tuple[str, int, Dict, Dict]]:
+    """Yield (id, version, capability entry, component) for every capability in a profile."""
+    for component in profile["components"]:
+        for cap in component.get("capabilities") or []:
+            cap_id = cap.get("id")
+            if cap_id:
+                yield cap_id, int(cap.get("version", 1)), cap, component
+
+
+def scan_driver_profiles(drivers_dirs: List[Path]) -> Dict[str, Set[Tuple[str, int]]]:
+    """
+    Walk every drivers_dir, find all *.yml files under any profiles/ subdirectory,
+    parse them with PyYAML, and extract (capabilityId, version) pairs.
+
+    Returns a dict mapping each driver's directory name (the parent of its
+    profiles/ directory) to the deduplicated set of (id, version) tuples its
+    profiles use.
+    """
+    found: Dict[str, Set[Tuple[str, int]]] = {}
+    profile_count = 0
+    load_errors: List[Tuple[Path, Exception]] = []
+    errors: List[Tuple[Path, Exception]] = []
+
+    for profile_path, profile in iter_profiles(drivers_dirs, load_errors):
+        profile_count += 1
+        if profile is None:
+            continue
+        driver_pairs = found.setdefault(profile_path.parent.parent.name, set())
+        try:
+            for cap_id, cap_ver, _, _ in profile_capabilities(profile):
+                driver_pairs.add((cap_id, cap_ver))
+        except Exception as exc:
+            print(f"  WARNING: failed to parse {profile_path}: {exc}", file=sys.stderr)
+            errors.append((profile_path, exc))
+    # files that failed to load were not yielded; the others are already counted
+    profile_count += len(load_errors)
+    errors = load_errors + errors
 
     print(
         f"Scanned {profile_count} profile(s) across {len(drivers_dirs)} driver tree(s)"
-        + (f", {error_count} parse error(s)" if error_count else "")
+        + (f", {len(errors)} parse error(s)" if errors else "")
         + "."
     )
     return found
 
 
+def scan_profiles(drivers_dirs: List[Path]) -> Set[Tuple[str, int]]:
+    """
+    Like scan_driver_profiles(), but returns the deduplicated set of
+    (id, version) tuples across all drivers.
+    """
+    found: Set[Tuple[str, int]] = set()
+    for driver_pairs in scan_driver_profiles(drivers_dirs).values():
+        found |= driver_pairs
+    return found
+
+
+def scan_driver_references(drivers_dirs: List[Path]) -> Dict[str, Set[str]]:
+    """
+    Walk every drivers_dir and return a dict mapping each driver's directory
+    name (the parent of its src/ directory) to the capability ids its Lua
+    source and tests refer to as capabilities.<id> or capabilities["<id>"].
+    """
+    # Imported here because capability_impact itself builds on this module
+    from capability_impact import capability_references
+
+    found: Dict[str, Set[str]] = {}
+    for drivers_dir in drivers_dirs:
+        for lua_file in drivers_dir.rglob("src/**/*.lua"):
+            parts = lua_file.relative_to(drivers_dir).parts
+            src = parts.index("src")
+            driver = parts[src - 1] if src > 0 else drivers_dir.name
+            text = lua_file.read_text(encoding="utf-8", errors="replace")
+            found.setdefault(driver, set()).update(cap_id for cap_id, _ in capability_references(text))
+    return found
+
+
+def write_manifests(
+    driver_pairs: Dict[str, Set[Tuple[str, int]]],
+    manifest_dir: Path,
+    driver_refs: Optional[Dict[str, Set[str]]] = None,
+) -> None:
+    """
+    Write one <driver>.json manifest per driver listing the capability cache
+    files its profiles use and the capability ids its Lua source refers to
+    ({"capabilities": ["<id>_<version>.json", ...], "references": ["<id>", ...]}).
+    Test runners use these to hand each driver's tests only the definitions
+    that driver needs.
+    """
+    driver_refs = driver_refs or {}
+    manifest_dir.mkdir(parents=True, exist_ok=True)
+    for driver in sorted(set(driver_pairs) | set(driver_refs)):
+        manifest = {
+            "capabilities": [
+                capability_file_name(cap_id, cap_ver)
+                for cap_id, cap_ver in sorted(driver_pairs.get(driver, ())) if cap_id not in EXCLUDED_IDS
+            ],
+            "references": sorted(driver_refs.get(driver, set()) - EXCLUDED_IDS),
+        }
+        (manifest_dir / f"{driver}.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+
+
 def output_path(output_dir: Path, cap_id: str, cap_ver: int) -> Path:
-    return output_dir / f"{cap_id}_{cap_ver}.json"
+    return output_dir / capability_file_name(cap_id, cap_ver)
 
 
 def fetch_definitions(
@@ -400,6 +541,144 @@ def _fetch_individual(
     failures.append((cap_id, cap_ver, f"HTTP {last_status}"))
 
 
+def write_atomic(dest: Path, text: str) -> None:
+    """
+    Write text to dest via a temporary file in the same directory and a rename,
+    so readers (and other fetchers sharing the directory) never see a partial file.
+    """
+    fd, tmp_name = tempfile.mkstemp(dir=dest.parent, prefix=f".{dest.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.chmod(tmp_name, default_file_mode())
+        os.replace(tmp_name, dest)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+
+
+def fetch_and_write(
+    pairs: List[Tuple[str, int]],
+    headers: Dict,
+    output_dir: Path,
+) -> Tuple[int, int, List[Tuple[str, int, str]]]:
+    """
+    Fetch the given pairs and write each definition atomically into output_dir.
+
+    Returns (written, skipped because of an API error, failures).
+    """
+    definitions, failures = fetch_definitions(pairs, headers)
+    written = 0
+    skipped_api = 0
+    for cap_id, cap_ver in pairs:
+        definition = definitions.get((cap_id, cap_ver))
+        if definition is None:
+            skipped_api += 1
+            continue
+        write_atomic(output_path(output_dir, cap_id, cap_ver), json.dumps(definition, indent=2))
+        written += 1
+    return written, skipped_api, failures
+
+
+class CacheLock:
+    """
+    An exclusive advisory lock on one capability/version in a shared output
+    directory.  The lock is an flock() on a file under <output-dir>/.locks, so
+    the kernel drops it if the holding process dies, which makes it a lease
+    rather than something that can be left stale by a killed CI job.
+
+    On platforms without fcntl every lock succeeds immediately.
+    """
+
+    def __init__(self, output_dir: Path, cap_id: str, cap_ver: int):
+        self.path = output_dir / LOCK_DIR_NAME / f"{cap_id}_{cap_ver}.lock"
+        self._file = None
+
+    def acquire(self, timeout: Optional[float] = 0) -> bool:
+        """
+        Try to take the lock, polling for up to timeout seconds (0 = don't wait,
+        None = wait forever).  Returns True if the lock is now held.
+        """
+        if fcntl is None:
+            return True
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                if deadline is not None and time.monotonic() >= deadline:
+                    self._file.close()
+                    self._file = None
+                    return False
+                time.sleep(LOCK_POLL_INTERVAL)
+
+    def release(self) -> None:
+        if self._file is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+def claim_pairs(
+    output_dir: Path,
+    pairs: List[Tuple[str, int]],
+    overwrite: bool = False,
+) -> Tuple[List[Tuple[str, int]], List[Tuple[str, int]], List[CacheLock]]:
+    """
+    Try to lock every pair without waiting.
+
+    Returns a tuple of:
+      - pairs this process now holds the lock for and should fetch
+      - pairs another process is currently fetching
+      - the locks held, to be released once the claimed pairs are written
+    """
+    claimed, busy, locks = [], [], []
+    for cap_id, cap_ver in pairs:
+        lock = CacheLock(output_dir, cap_id, cap_ver)
+        if not lock.acquire(timeout=0):
+            busy.append((cap_id, cap_ver))
+            continue
+        # Another process may have finished this pair between our existence
+        # check and taking the lock
+        if not overwrite and output_path(output_dir, cap_id, cap_ver).exists():
+            lock.release()
+            continue
+        claimed.append((cap_id, cap_ver))
+        locks.append(lock)
+    return claimed, busy, locks
+
+
+def wait_for_pairs(
+    output_dir: Path,
+    pairs: List[Tuple[str, int]],
+    timeout: float,
+) -> Tuple[List[Tuple[str, int]], List[CacheLock]]:
+    """
+    Wait for the processes fetching pairs to release their locks.  A pair whose
+    file exists afterwards was fetched by the other process.  A pair that is
+    still missing (the other process failed, or the wait timed out) is left for
+    the caller to fetch.
+
+    Returns (pairs still missing, locks held on those pairs).
+    """
+    deadline = time.monotonic() + timeout
+    remaining, locks = [], []
+    for cap_id, cap_ver in pairs:
+        lock = CacheLock(output_dir, cap_id, cap_ver)
+        held = lock.acquire(timeout=max(0.0, deadline - time.monotonic()))
+        if output_path(output_dir, cap_id, cap_ver).exists():
+            if held:
+                lock.release()
+            continue
+        remaining.append((cap_id, cap_ver))
+        if held:
+            locks.append(lock)
+    return remaining, locks
+
+
 def write_failure_report(
     failures: List[Tuple[str, int, str]],
     output_file: Path,
@@ -480,6 +759,50 @@ def main(argv=None):
             "hashFiles() checks in CI workflows."
         ),
     )
+    parser.add_argument(
+        "--shared-cache",
+        action="store_true",
+        default=False,
+        help=(
+            "--output-dir is shared with other concurrent fetchers.  Each "
+            "capability is locked while it is fetched; pairs another process is "
+            "already fetching are waited for instead of downloaded again."
+        ),
+    )
+    parser.add_argument(
+        "--lock-timeout",
+        metavar="SECONDS",
+        type=float,
+        default=300.0,
+        help=(
+            "With --shared-cache, how long to wait for other processes before "
+            "fetching their pairs anyway (default: 300)."
+        ),
+    )
+    parser.add_argument(
+        "--manifest-dir",
+        metavar="PATH",
+        default=None,
+        help=(
+            "When set, write a <driver>.json manifest per driver listing the "
+            "capability files its profiles use and the capabilities its Lua source refers to."
+        ),
+    )
+    parser.add_argument(
+        "--bundle-file",
+        metavar="PATH",
+        default=None,
+        help=(
+            "When set, also write every definition in --output-dir to a single "
+            "consolidated bundle file once fetching completes."
+        ),
+    )
+    parser.add_argument(
+        "--compress-bundle",
+        action="store_true",
+        default=False,
+        help="zlib-compress each definition in the --bundle-file bundle.",
+    )
     args = parser.parse_args(argv)
 
     pat = os.environ.get("CAPABILITY_PAT", "")
@@ -498,9 +821,18 @@ def main(argv=None):
             sys.exit(1)
 
     # Step 1: scan profiles
-    all_pairs = scan_profiles(drivers_dirs)
+    driver_pairs = scan_driver_profiles(drivers_dirs)
+    all_pairs: Set[Tuple[str, int]] = set()
+    for pairs in driver_pairs.values():
+        all_pairs |= pairs
     print(f"Found {len(all_pairs)} unique capability/version pair(s).")
 
+    if args.manifest_dir:
+        manifest_dir = Path(args.manifest_dir).expanduser().resolve()
+        driver_refs = scan_driver_references(drivers_dirs)
+        write_manifests(driver_pairs, manifest_dir, driver_refs)
+        print(f"Wrote {len(set(driver_pairs) | set(driver_refs))} per-driver capability manifest(s) to {manifest_dir}.")
+
     # Step 2: filter known-bad IDs
     excluded = {p for p in all_pairs if p[0] in EXCLUDED_IDS}
     for cap_id, cap_ver in sorted(excluded):
@@ -525,27 +857,49 @@ def main(argv=None):
         print("Nothing to fetch. Output directory is up to date.")
         _print_summary(len(drivers_dirs), len(all_pairs) + len(excluded), len(excluded),
                        already_present, 0, 0, 0, output_dir)
+        _write_bundle(args, output_dir)
         return
 
-    print(f"Fetching {len(to_fetch)} capability definition(s)...")
-
-    # Step 4: fetch
-    definitions, failures = fetch_definitions(to_fetch, headers)
-
-    # Step 5: write
-    written = 0
-    skipped_api = 0
-    for cap_id, cap_ver in to_fetch:
-        definition = definitions.get((cap_id, cap_ver))
-        if definition is None:
-            skipped_api += 1
-            continue
-        dest = output_path(output_dir, cap_id, cap_ver)
-        dest.write_text(json.dumps(definition, indent=2), encoding="utf-8")
-        written += 1
+    # Step 4: with --shared-cache, claim the pairs no other process is fetching
+    locks: List[CacheLock] = []
+    waiting: List[Tuple[str, int]] = []
+    if args.shared_cache:
+        to_fetch, waiting, locks = claim_pairs(output_dir, to_fetch, args.overwrite)
+        if waiting:
+            print(f"{len(waiting)} capability/version pair(s) are being fetched by another process.")
+    requested = len(to_fetch)
+
+    # Step 5: fetch and write
+    written, skipped_api, failures = 0, 0, []
+    try:
+        if to_fetch:
+            print(f"Fetching {len(to_fetch)} capability definition(s)...")
+            written, skipped_api, failures = fetch_and_write(to_fetch, headers, output_dir)
+    finally:
+        for lock in locks:
+            lock.release()
+
+    # Step 5b: wait for the other processes, and fetch anything they failed to write
+    fetched_by_others = 0
+    if waiting:
+        print(f"Waiting up to {args.lock_timeout:.0f}s for {len(waiting)} pair(s) fetched elsewhere...")
+        remaining, locks = wait_for_pairs(output_dir, waiting, args.lock_timeout)
+        fetched_by_others = len(waiting) - len(remaining)
+        requested += len(remaining)
+        try:
+            if remaining:
+                print(f"Fetching {len(remaining)} capability definition(s) not written by other processes...")
+                more_written, more_skipped, more_failures = fetch_and_write(remaining, headers, output_dir)
+                written += more_written
+                skipped_api += more_skipped
+                failures += more_failures
+        finally:
+            for lock in locks:
+                lock.release()
 
     _print_summary(len(drivers_dirs), len(all_pairs) + len(excluded), len(excluded),
-                   already_present, len(to_fetch), written, skipped_api, output_dir)
+                   already_present, requested, written, skipped_api, output_dir,
+                   fetched_by_others)
 
     # Step 6: write failure report if requested
     if args.failed_output_file:
@@ -554,6 +908,17 @@ def main(argv=None):
         if failures:
             print(f"  Failure report written to: {failed_output_file}")
 
+    # Step 7: write the consolidated bundle if requested
+    _write_bundle(args, output_dir)
+
+
+def _write_bundle(args: argparse.Namespace, output_dir: Path) -> None:
+    if not args.bundle_file:
+        return
+    bundle_file = Path(args.bundle_file).expanduser().resolve()
+    count = build_bundle(output_dir, bundle_file, args.compress_bundle)
+    print(f"  Bundle of {count} definition(s) written to: {bundle_file}")
+
 
 def _print_summary(
     trees: int,
@@ -564,6 +929,7 @@ def _print_summary(
     written: int,
     skipped_api: int,
     output_dir: Path,
+    fetched_by_others: int = 0,
 ) -> None:
     print()
     print("=== Summary ===")
@@ -574,6 +940,8 @@ def _print_summary(
     print(f"  Already on disk      : {already_present}")
     print(f"  Requested from API   : {requested}")
     print(f"  Written              : {written}")
+    if fetched_by_others:
+        print(f"  Fetched by others    : {fetched_by_others}")
     if skipped_api:
         print(f"  Skipped (API error)  : {skipped_api}")
     print(f"  Output directory     : {output_dir}")
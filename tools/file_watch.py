@@ -0,0 +1,224 @@
+# Copyright 2026 SmartThings
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""file_watch.py
+
+Waiting for files under a directory tree to change, for the test runners'
+--watch mode.
+
+On Linux this uses inotify through ctypes, with a watch on every directory in
+the tree (new directories are watched as they appear).  Elsewhere, or when
+inotify is unavailable, the tree is polled for changed modification times.
+Either way, wait() returns once a burst of changes has been quiet for the
+debounce interval, so an editor writing several files (or writing one file in
+several steps) triggers a single rerun.
+
+Usage
+-----
+    with FileWatcher(Path("drivers")) as watcher:
+        while True:
+            changed = watcher.wait(debounce=0.2)
+            ...
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+
+# inotify event masks, from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+EVENT_HEADER = struct.Struct("iIII")
+READ_SIZE = 64 * 1024
+POLL_INTERVAL = 0.5
+
+
+def ignored(name: str) -> bool:
+    """Editor swap and backup files, and the stats files luacov writes while tests run."""
+    return (name.startswith(".") or name.endswith("~") or name.endswith((".swp", ".swx", ".tmp"))
+            or name == "4913" or (name.startswith("luacov.") and name.endswith(".out")))
+
+
+class _Inotify:
+    def __init__(self, root: Path):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self.fd = libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.dirs: Dict[int, Path] = {}
+        self.overflowed = False
+        try:
+            self.watch_tree(root)
+        except OSError:
+            os.close(self.fd)
+            raise
+
+    def watch_tree(self, root: Path) -> None:
+        for dirpath, dirnames, _ in os.walk(root):
+            dirnames[:] = [d for d in dirnames if not ignored(d)]
+            wd = self._add_watch(self.fd, os.fsencode(dirpath), WATCH_MASK)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), "inotify_add_watch failed for {}".format(dirpath))
+            self.dirs[wd] = Path(dirpath)
+
+    def read(self, timeout: Optional[float]) -> Optional[Set[Path]]:
+        """Changed paths, or None if nothing happened within timeout."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return None
+        changed = set()
+        try:
+            data = os.read(self.fd, READ_SIZE)
+        except BlockingIOError:
+            return changed
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # events were dropped, so the caller cannot know what changed
+                self.overflowed = True
+                continue
+            if mask & IN_IGNORED:
+                self.dirs.pop(wd, None)
+                continue
+            directory = self.dirs.get(wd)
+            if directory is None or not name or ignored(name):
+                continue
+            path = directory / name
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and path.is_dir():
+                    # files written into a new directory before it is watched are picked up by the walk
+                    self.watch_tree(path)
+                    changed.update(p for p in path.rglob("*") if p.is_file() and not ignored(p.name))
+                continue
+            changed.add(path)
+        return changed
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class _Poller:
+    def __init__(self, root: Path):
+        self.root = root
+        self.overflowed = False
+        self.snapshot = self.scan()
+
+    def scan(self) -> Dict[Path, Tuple[int, int]]:
+        files = {}
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if not ignored(d)]
+            for name in filenames:
+                if ignored(name):
+                    continue
+                path = Path(dirpath, name)
+                try:
+                    st = path.stat()
+                except OSError:
+                    continue
+                files[path] = (st.st_mtime_ns, st.st_size)
+        return files
+
+    def read(self, timeout: Optional[float]) -> Optional[Set[Path]]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            snapshot = self.scan()
+            changed = {path for path in snapshot.keys() | self.snapshot.keys()
+                       if snapshot.get(path) != self.snapshot.get(path)}
+            self.snapshot = snapshot
+            if changed:
+                return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            wait = POLL_INTERVAL if deadline is None else min(POLL_INTERVAL, max(0.0, deadline - time.monotonic()))
+            time.sleep(wait)
+
+    def close(self) -> None:
+        pass
+
+
+class FileWatcher:
+    """Changed files under root, from inotify where available and polling otherwise."""
+
+    def __init__(self, root: Path, polling: bool = False):
+        self.root = Path(root)
+        self.backend = None
+        if not polling and sys.platform.startswith("linux"):
+            try:
+                self.backend = _Inotify(self.root)
+            except (OSError, AttributeError) as e:
+                print("inotify unavailable ({}), polling for changes instead".format(e))
+        if self.backend is None:
+            self.backend = _Poller(self.root)
+
+    @property
+    def method(self) -> str:
+        return "inotify" if isinstance(self.backend, _Inotify) else "polling"
+
+    def wait(self, debounce: float = 0.2, timeout: Optional[float] = None) -> Optional[Set[Path]]:
+        """
+        Block until something changes, then until nothing more has changed for
+        debounce seconds, and return every path that changed.  Returns None if
+        timeout passes first.  If overflowed is then true, events were lost and
+        the caller should assume anything may have changed.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            changed = self.backend.read(remaining)
+            if changed is None:
+                return None
+            # events for ignored files come back as an empty set
+            if changed or self.backend.overflowed:
+                break
+        while True:
+            more = self.backend.read(debounce)
+            if more is None:
+                break
+            changed |= more
+        return changed
+
+    @property
+    def overflowed(self) -> bool:
+        overflowed = self.backend.overflowed
+        self.backend.overflowed = False
+        return overflowed
+
+    def close(self) -> None:
+        self.backend.close()
+
+    def __enter__(self) -> "FileWatcher":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
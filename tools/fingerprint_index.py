@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+# Copyright 2026 SmartThings
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""fingerprint_index.py
+
+Loads every driver's fingerprints.yml once into hashed indexes keyed by the
+protocol identifiers a device is matched on, and checks them:
+
+  - the same zigbee manufacturer/model, zwave manufacturerId/productType/
+    productId or matter vendorId/productId claimed by more than one driver
+    (error), or twice in one driver with different profiles (error) or the
+    same profile (warning)
+  - a zwave fingerprint that leaves productType or productId out (or a
+    zigbee one without a manufacturer) and so also matches a more specific
+    fingerprint of another driver (warning)
+  - a fingerprint id used twice in one driver (error)
+  - a deviceProfileName with no matching profile in the driver's profiles/
+    directory (error)
+
+Generic fingerprints (zigbeeGeneric, zwaveGeneric, matterGeneric, ...) are
+loaded and checked for ids and profiles, but are expected to overlap and are
+not compared across drivers.
+
+Usage
+-----
+    python3 tools/fingerprint_index.py \\
+        [--drivers-dir drivers] \\
+        [--changed-file drivers/SmartThings/zigbee-switch/fingerprints.yml ...] \\
+        [--output-file fingerprint-comment-body.md] \\
+        [--warnings-as-errors] \\
+        [--baseline tools/fingerprint_baseline.json | --no-baseline] \\
+        [--update-baseline]
+
+Arguments
+---------
+    --drivers-dir       Root directory containing <partner>/<driver>/ trees
+                        (default: drivers next to this script's directory)
+    --changed-file      Only report problems involving the drivers these
+                        files belong to (repeatable; also read from the
+                        whitespace separated ALL_CHANGED_FILES environment
+                        variable).  Conflicts are still found against every
+                        driver.
+    --output-file       Write the problems as a markdown PR comment
+    --warnings-as-errors
+                        Exit with an error on warnings too
+    --baseline          Errors already in the tree when the check was added,
+                        which are reported as known errors but don't fail the
+                        check (default: tools/fingerprint_baseline.json)
+    --no-baseline       Fail on every error, known or not
+    --update-baseline   Write the errors found now to the baseline file, so
+                        only errors introduced after this fail the check
+
+Exits 1 if any errors not in the baseline are reported.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import re
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+import yaml
+
+try:
+    YamlLoader = yaml.CSafeLoader
+except AttributeError:
+    YamlLoader = yaml.SafeLoader
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_DRIVERS_DIR = REPO_ROOT / "drivers"
+DEFAULT_BASELINE = REPO_ROOT / "tools" / "fingerprint_baseline.json"
+PROFILE_NAME_RE = re.compile(r"^name:\s*['\"]?([^'\"#\s]+)", re.MULTILINE)
+
+Key = Tuple
+
+
+def _identifier(value):
+    """Normalise a numeric id that may be written as 0x.. text or parsed as an int."""
+    if isinstance(value, str):
+        try:
+            return int(value, 0)
+        except ValueError:
+            return value.strip()
+    return value
+
+
+def zigbee_key(entry: Dict) -> Key:
+    return ("zigbee", entry.get("manufacturer"), entry.get("model"))
+
+
+def zwave_key(entry: Dict) -> Key:
+    return ("zwave", _identifier(entry.get("manufacturerId")), _identifier(entry.get("productType")),
+            _identifier(entry.get("productId")))
+
+
+def matter_key(entry: Dict) -> Key:
+    return ("matter", _identifier(entry.get("vendorId")), _identifier(entry.get("productId")))
+
+
+# Fingerprint sections that match one specific device model, and how to key them
+MANUFACTURER_KEYS = {
+    "zigbeeManufacturer": zigbee_key,
+    "zwaveManufacturer": zwave_key,
+    "matterManufacturer": matter_key,
+}
+
+
+def wildcard_keys(key: Key) -> List[Key]:
+    """key, then every key with some identifiers left out that would also match it, most specific first."""
+    protocol, *ids = key
+    keys = []
+    for mask in itertools.product((False, True), repeat=len(ids)):
+        wildcard = (protocol, *(None if masked else value for masked, value in zip(mask, ids)))
+        if wildcard not in keys:
+            keys.append(wildcard)
+    keys.sort(key=lambda k: sum(value is None for value in k))
+    return keys
+
+
+def format_key(key: Key) -> str:
+    protocol, *ids = key
+    if protocol == "zigbee":
+        return "zigbee manufacturer {!r} model {!r}".format(*ids)
+    names = ("manufacturerId", "productType", "productId") if protocol == "zwave" else ("vendorId", "productId")
+    return "{} {}".format(protocol, " ".join(
+        "{}={}".format(name, "0x%04X" % value if isinstance(value, int) else value)
+        for name, value in zip(names, ids) if value is not None))
+
+
+class Fingerprint(NamedTuple):
+    driver: str
+    path: Path
+    section: str
+    id: str
+    device_label: Optional[str]
+    device_profile_name: Optional[str]
+    key: Optional[Key]
+    entry: Dict
+
+
+class Problem(NamedTuple):
+    path: Path
+    driver: str
+    message: str
+    error: bool = True
+    # other drivers involved, whose changes should also report this problem
+    related: Tuple[str, ...] = ()
+
+
+class FingerprintIndex:
+    """Every fingerprint in the tree, indexed by protocol key and by driver."""
+
+    def __init__(self, fingerprints: List[Fingerprint], profiles: Dict[str, Dict[str, Path]],
+                 driver_dirs: Dict[str, Path], load_errors: List[Problem]):
+        self.fingerprints = fingerprints
+        self.profiles = profiles
+        self.driver_dirs = driver_dirs
+        self.load_errors = load_errors
+        self.by_key: Dict[Key, List[Fingerprint]] = defaultdict(list)
+        self.by_driver: Dict[str, List[Fingerprint]] = defaultdict(list)
+        for fingerprint in fingerprints:
+            if fingerprint.key is not None:
+                self.by_key[fingerprint.key].append(fingerprint)
+            self.by_driver[fingerprint.driver].append(fingerprint)
+
+    @classmethod
+    def load(cls, drivers_dirs: Iterable[Path]) -> "FingerprintIndex":
+        fingerprints: List[Fingerprint] = []
+        profiles: Dict[str, Dict[str, Path]] = {}
+        driver_dirs: Dict[str, Path] = {}
+        errors: List[Problem] = []
+        for drivers_dir in drivers_dirs:
+            for path in sorted(Path(drivers_dir).glob("*/*/fingerprints.yml")):
+                driver_dir = path.parent
+                driver = driver_dir.name
+                driver_dirs[driver] = driver_dir
+                profiles[driver] = load_profiles(driver_dir / "profiles")
+                try:
+                    with open(path, encoding="utf-8") as f:
+                        data = yaml.load(f, Loader=YamlLoader) or {}
+                except (OSError, yaml.YAMLError) as e:
+                    errors.append(Problem(path, driver, "could not be parsed: {}".format(e)))
+                    continue
+                fingerprints.extend(parse_fingerprints(driver, path, data))
+        return cls(fingerprints, profiles, driver_dirs, errors)
+
+    def lookup(self, key: Key) -> List[Fingerprint]:
+        return self.by_key.get(key, [])
+
+    def key_conflicts(self) -> List[Problem]:
+        problems = []
+        for key, matches in self.by_key.items():
+            if len(matches) < 2:
+                continue
+            drivers = sorted({m.driver for m in matches})
+            if len(drivers) > 1:
+                claims = ", ".join("{} ({})".format(m.driver, m.id) for m in matches)
+                for m in matches:
+                    problems.append(Problem(m.path, m.driver, "{} is also matched by other drivers: {}".format(
+                        format_key(key), claims), related=tuple(drivers)))
+                continue
+            profile_names = {m.device_profile_name for m in matches}
+            first = matches[0]
+            ids = ", ".join(m.id for m in matches)
+            if len(profile_names) > 1:
+                problems.append(Problem(first.path, first.driver, "{} is matched by {} with different profiles: {}".format(
+                    format_key(key), ids, ", ".join(sorted(str(p) for p in profile_names)))))
+            else:
+                problems.append(Problem(first.path, first.driver, "{} is matched more than once, by {}".format(
+                    format_key(key), ids), error=False))
+        return problems
+
+    def shadowed(self) -> List[Problem]:
+        """Specific fingerprints that a wildcard fingerprint of another driver also matches."""
+        problems = []
+        for key, matches in self.by_key.items():
+            for wildcard in wildcard_keys(key)[1:]:
+                for broad in self.by_key.get(wildcard, ()):
+                    for m in matches:
+                        if m.driver != broad.driver:
+                            problems.append(Problem(m.path, m.driver, "{} ({}) is also matched by {} fingerprint {!r}".format(
+                                format_key(key), m.id, broad.driver, broad.id), error=False, related=(broad.driver,)))
+        return problems
+
+    def duplicate_ids(self) -> List[Problem]:
+        problems = []
+        for driver, fingerprints in self.by_driver.items():
+            seen: Dict[str, Fingerprint] = {}
+            for fingerprint in fingerprints:
+                if fingerprint.id in seen:
+                    problems.append(Problem(fingerprint.path, driver, "fingerprint id {!r} is used more than once".format(
+                        fingerprint.id)))
+                seen[fingerprint.id] = fingerprint
+        return problems
+
+    def missing_profiles(self) -> List[Problem]:
+        problems = []
+        for fingerprint in self.fingerprints:
+            name = fingerprint.device_profile_name
+            if name is None:
+                problems.append(Problem(fingerprint.path, fingerprint.driver,
+                                        "fingerprint {!r} has no deviceProfileName".format(fingerprint.id)))
+            elif name not in self.profiles.get(fingerprint.driver, ()):
+                problems.append(Problem(fingerprint.path, fingerprint.driver,
+                                        "fingerprint {!r} uses profile {!r}, which is not in {}/profiles".format(
+                                            fingerprint.id, name, fingerprint.driver)))
+        return problems
+
+    def check(self) -> List[Problem]:
+        return self.load_errors + self.key_conflicts() + self.shadowed() + self.duplicate_ids() + self.missing_profiles()
+
+
+def load_profiles(profiles_dir: Path) -> Dict[str, Path]:
+    """Profile files in a profiles directory, by their top level name: (and by file name)."""
+    profiles: Dict[str, Path] = {}
+    if not profiles_dir.is_dir():
+        return profiles
+    for path in sorted(profiles_dir.iterdir()):
+        if path.suffix not in (".yml", ".yaml"):
+            continue
+        profiles.setdefault(path.stem, path)
+        try:
+            text = path.read_text(encoding="utf-8")
+        except OSError:
+            continue
+        m = PROFILE_NAME_RE.search(text)
+        if m:
+            profiles[m.group(1)] = path
+    return profiles
+
+
+def parse_fingerprints(driver: str, path: Path, data: Dict) -> Iterable[Fingerprint]:
+    for raw_section, entries in data.items():
+        # some files have "zigbeeManufacturer :" with a space before the colon
+        section = str(raw_section).strip()
+        key_fn = MANUFACTURER_KEYS.get(section)
+        for entry in entries or []:
+            if not isinstance(entry, dict):
+                continue
+            yield Fingerprint(
+                driver=driver,
+                path=path,
+                section=section,
+                id=str(entry.get("id")),
+                device_label=entry.get("deviceLabel"),
+                device_profile_name=entry.get("deviceProfileName"),
+                key=key_fn(entry) if key_fn else None,
+                entry=entry,
+            )
+
+
+def changed_drivers(changed_files: Iterable[str]) -> Set[str]:
+    """Driver directory names for changed paths of the form drivers/<partner>/<driver>/..."""
+    drivers = set()
+    for changed in changed_files:
+        parts = Path(changed).parts
+        if "drivers" in parts:
+            i = parts.index("drivers")
+            if len(parts) > i + 2:
+                drivers.add(parts[i + 2])
+    return drivers
+
+
+def relative_path(path: Path, root: Path) -> Path:
+    try:
+        return path.relative_to(root)
+    except ValueError:
+        return path
+
+
+def baseline_key(problem: Problem, root: Path) -> Tuple[str, str]:
+    return relative_path(problem.path, root).as_posix(), problem.message
+
+
+def load_baseline(path: Path) -> Set[Tuple[str, str]]:
+    """The known errors in a baseline file, as (path, message); empty if there is none."""
+    if not path.is_file():
+        return set()
+    with open(path, encoding="utf-8") as f:
+        return {(entry["path"], entry["message"]) for entry in json.load(f).get("errors", [])}
+
+
+def save_baseline(path: Path, problems: List[Problem], root: Path) -> None:
+    errors = sorted({baseline_key(p, root) for p in problems if p.error})
+    data = {"errors": [{"path": error_path, "message": message} for error_path, message in errors]}
+    path.write_text(json.dumps(data, indent=2) + "\n", encoding="utf-8")
+
+
+def write_report(problems: List[Problem], output_file: Path, root: Path,
+                 baseline: Optional[Set[Tuple[str, str]]] = None) -> None:
+    baseline = baseline or set()
+    known = [p for p in problems if p.error and baseline_key(p, root) in baseline]
+    errors = [p for p in problems if p.error and baseline_key(p, root) not in baseline]
+    warnings = [p for p in problems if not p.error]
+    lines = ["# Fingerprint check", ""]
+    for title, group in (("Errors", errors), ("Known errors (in the baseline)", known), ("Warnings", warnings)):
+        if not group:
+            continue
+        lines.append("## {} ({})".format(title, len(group)))
+        lines.append("")
+        for p in group:
+            lines.append("- `{}`: {}".format(relative_path(p.path, root), p.message))
+        lines.append("")
+    Path(output_file).write_text("\n".join(lines), encoding="utf-8")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check driver fingerprints for conflicts and missing profiles")
+    parser.add_argument("--drivers-dir", action="append", type=Path, help="root of <partner>/<driver> trees (repeatable)")
+    parser.add_argument("--changed-file", action="append", default=[], help="only report problems for these files' drivers")
+    parser.add_argument("--output-file", type=Path, help="write the problems as a markdown comment")
+    parser.add_argument("--warnings-as-errors", action="store_true", help="fail on warnings too")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE,
+                        help="known errors that don't fail the check (default: tools/fingerprint_baseline.json)")
+    parser.add_argument("--no-baseline", action="store_true", help="fail on known errors too")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="write every error found now to the baseline file and exit")
+    args = parser.parse_args(argv)
+
+    changed_files = args.changed_file + os.environ.get("ALL_CHANGED_FILES", "").split()
+    index = FingerprintIndex.load(args.drivers_dir or [DEFAULT_DRIVERS_DIR])
+    problems = index.check()
+    if args.update_baseline:
+        save_baseline(args.baseline, problems, REPO_ROOT)
+        print("Wrote {} known errors to {}".format(sum(p.error for p in problems), args.baseline))
+        return
+    baseline = set() if args.no_baseline else load_baseline(args.baseline)
+    # known errors the tree no longer has, checked before the problems are narrowed to the changed drivers
+    fixed = baseline - {baseline_key(p, REPO_ROOT) for p in problems if p.error}
+    if changed_files:
+        drivers = changed_drivers(changed_files)
+        problems = [p for p in problems if p.driver in drivers or drivers.intersection(p.related)]
+
+    known = [p for p in problems if p.error and baseline_key(p, REPO_ROOT) in baseline]
+    errors = [p for p in problems if (p.error or args.warnings_as_errors) and p not in known]
+    for p in problems:
+        label = "WARNING" if not p.error else "KNOWN ERROR" if p in known else "ERROR"
+        print("{}: {}: {}".format(label, p.path, p.message))
+    for error_path, message in sorted(fixed):
+        print("FIXED: {}: {} (remove it from {})".format(error_path, message, args.baseline.name))
+    print("Checked {} fingerprints in {} drivers: {} errors, {} known errors, {} warnings".format(
+        len(index.fingerprints), len(index.driver_dirs), sum(p.error for p in problems) - len(known),
+        len(known), sum(not p.error for p in problems)))
+
+    if args.output_file is not None:
+        if problems:
+            write_report(problems, args.output_file, REPO_ROOT, baseline)
+        elif args.output_file.exists():
+            args.output_file.unlink()
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# Copyright 2026 SmartThings
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""fingerprint_match.py
+
+Answers "which driver would this device match?" offline, from a serialized
+index of every driver's manufacturer fingerprints (see fingerprint_index.py).
+A query is a few dictionary lookups: the device's exact key, then the keys
+with identifiers left out that wildcard fingerprints use.
+
+The index is written to tools/fingerprint_index.pickle the first time it is
+needed and rebuilt whenever a fingerprints.yml or profile file changes.
+
+Usage
+-----
+    python3 tools/fingerprint_match.py zigbee MANUFACTURER MODEL
+    python3 tools/fingerprint_match.py zwave MANUFACTURER_ID PRODUCT_TYPE PRODUCT_ID
+    python3 tools/fingerprint_match.py matter VENDOR_ID PRODUCT_ID
+    python3 tools/fingerprint_match.py --csv devices.csv [--output matches.csv]
+    python3 tools/fingerprint_match.py --rebuild
+
+Numeric ids are decimal unless written with a 0x prefix; --hex reads them all
+as hexadecimal, the way z-wave ids are usually reported.
+
+CSV format
+----------
+A header row and one device per row.  The protocol column is zigbee, zwave or
+matter, and the identifier columns use the fingerprints.yml field names:
+
+    protocol,manufacturer,model,manufacturerId,productType,productId,vendorId
+
+Any other columns are copied to the output, which has one row per device with
+the best match (or none) and the number of drivers that match it.
+
+Python API
+----------
+    from fingerprint_match import FingerprintMatcher
+    matcher = FingerprintMatcher.load()
+    matcher.match(("zwave", 0x0086, 0x0102, 0x0064))
+"""
+
+import argparse
+import csv
+import os
+import pickle
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from fingerprint_index import DEFAULT_DRIVERS_DIR, REPO_ROOT, FingerprintIndex, Key, format_key, wildcard_keys
+
+DEFAULT_INDEX_FILE = Path(__file__).resolve().parent.joinpath("fingerprint_index.pickle")
+INDEX_VERSION = 1
+# the identifier fields of each protocol's key, in key order
+KEY_FIELDS = {
+    "zigbee": ("manufacturer", "model"),
+    "zwave": ("manufacturerId", "productType", "productId"),
+    "matter": ("vendorId", "productId"),
+}
+# identifiers that are numbers, rather than strings like zigbee model names
+NUMERIC_PROTOCOLS = ("zwave", "matter")
+OUTPUT_FIELDS = ["match", "driver", "fingerprint_id", "device_label", "device_profile_name", "profile",
+                 "matching_drivers"]
+
+
+class Match(NamedTuple):
+    driver: str
+    fingerprints_file: str
+    fingerprint_id: str
+    device_label: Optional[str]
+    device_profile_name: Optional[str]
+    # the profile file deviceProfileName resolves to, relative to the repo root
+    profile: Optional[str]
+    key: Key
+
+    @property
+    def exact(self) -> bool:
+        return None not in self.key
+
+
+def source_stamps(drivers_dir: Path) -> Dict[str, Tuple[int, int]]:
+    """(mtime, size) of every file the index is built from."""
+    stamps = {}
+    for pattern in ("*/*/fingerprints.yml", "*/*/profiles/*.yml", "*/*/profiles/*.yaml"):
+        for path in drivers_dir.glob(pattern):
+            st = path.stat()
+            stamps[str(path)] = (st.st_mtime_ns, st.st_size)
+    return stamps
+
+
+def _relative(path: Optional[Path]) -> Optional[str]:
+    if path is None:
+        return None
+    try:
+        return Path(path).relative_to(REPO_ROOT).as_posix()
+    except ValueError:
+        return str(path)
+
+
+class FingerprintMatcher:
+    # by_key holds plain tuples of Match fields, so the pickle does not depend on where Match is defined
+    def __init__(self, by_key: Dict[Key, List[Tuple]], sources: Dict[str, Tuple[int, int]]):
+        self.by_key = by_key
+        self.sources = sources
+
+    @classmethod
+    def build(cls, drivers_dir: Path = DEFAULT_DRIVERS_DIR) -> "FingerprintMatcher":
+        sources = source_stamps(drivers_dir)
+        index = FingerprintIndex.load([drivers_dir])
+        by_key: Dict[Key, List[Tuple]] = {}
+        for key, fingerprints in index.by_key.items():
+            by_key[key] = [tuple(Match(
+                driver=f.driver,
+                fingerprints_file=_relative(f.path),
+                fingerprint_id=f.id,
+                device_label=f.device_label,
+                device_profile_name=f.device_profile_name,
+                profile=_relative(index.profiles.get(f.driver, {}).get(f.device_profile_name)),
+                key=key,
+            )) for f in fingerprints]
+        return cls(by_key, sources)
+
+    @classmethod
+    def load(cls, index_file: Path = DEFAULT_INDEX_FILE, drivers_dir: Path = DEFAULT_DRIVERS_DIR,
+             rebuild: bool = False) -> "FingerprintMatcher":
+        """The serialized index, rebuilt and saved first if it is missing or out of date."""
+        if not rebuild:
+            try:
+                with open(index_file, "rb") as f:
+                    data = pickle.load(f)
+                if data.get("version") == INDEX_VERSION and data["sources"] == source_stamps(drivers_dir):
+                    return cls(data["by_key"], data["sources"])
+            except (OSError, pickle.UnpicklingError, EOFError, KeyError, AttributeError):
+                pass
+        matcher = cls.build(drivers_dir)
+        matcher.save(index_file)
+        return matcher
+
+    def save(self, index_file: Path) -> None:
+        tmp = Path(str(index_file) + ".tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump({"version": INDEX_VERSION, "sources": self.sources, "by_key": self.by_key}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, index_file)
+
+    def match(self, key: Key) -> List[Match]:
+        """Fingerprints that match a device, exact matches first, then by how many identifiers they name."""
+        matches = []
+        for candidate in wildcard_keys(key):
+            matches.extend(Match._make(fields) for fields in self.by_key.get(candidate, ()))
+        return matches
+
+
+def parse_id(value: Optional[str], hex_ids: bool):
+    """A numeric identifier from text: 0x.. is hexadecimal, anything else decimal unless hex_ids."""
+    if value is None or value.strip() == "":
+        return None
+    value = value.strip()
+    return int(value, 16) if hex_ids else int(value, 0)
+
+
+def device_key(protocol: str, values: Iterable[Optional[str]], hex_ids: bool = False) -> Key:
+    protocol = protocol.strip().lower()
+    if protocol not in KEY_FIELDS:
+        raise ValueError("unknown protocol {!r}, expected one of {}".format(protocol, ", ".join(KEY_FIELDS)))
+    values = list(values)
+    if len(values) != len(KEY_FIELDS[protocol]):
+        raise ValueError("{} devices are identified by {}".format(protocol, ", ".join(KEY_FIELDS[protocol])))
+    if protocol in NUMERIC_PROTOCOLS:
+        return (protocol, *(parse_id(value, hex_ids) for value in values))
+    return (protocol, *values)
+
+
+def match_row(matcher: FingerprintMatcher, row: Dict[str, str], hex_ids: bool) -> Dict[str, str]:
+    out = dict(row)
+    try:
+        protocol = (row.get("protocol") or "").strip().lower()
+        key = device_key(protocol, (row.get(field) for field in KEY_FIELDS.get(protocol, ())), hex_ids)
+    except ValueError as e:
+        out.update(dict.fromkeys(OUTPUT_FIELDS, ""), match="error: {}".format(e))
+        return out
+    matches = matcher.match(key)
+    if not matches:
+        out.update(dict.fromkeys(OUTPUT_FIELDS, ""), match="none", matching_drivers="0")
+        return out
+    best = matches[0]
+    out.update(
+        match="exact" if best.exact else "wildcard",
+        driver=best.driver,
+        fingerprint_id=best.fingerprint_id,
+        device_label=best.device_label or "",
+        device_profile_name=best.device_profile_name or "",
+        profile=best.profile or "",
+        matching_drivers=str(len({m.driver for m in matches})),
+    )
+    return out
+
+
+def match_csv(matcher: FingerprintMatcher, input_file, output_file, hex_ids: bool) -> Tuple[int, int]:
+    """Write a match row per device; returns (devices, devices without a match)."""
+    reader = csv.DictReader(input_file)
+    fields = list(reader.fieldnames or []) + [f for f in OUTPUT_FIELDS if f not in (reader.fieldnames or [])]
+    writer = csv.DictWriter(output_file, fieldnames=fields)
+    writer.writeheader()
+    devices = unmatched = 0
+    for row in reader:
+        out = match_row(matcher, row, hex_ids)
+        devices += 1
+        unmatched += out["match"] != "exact" and out["match"] != "wildcard"
+        writer.writerow(out)
+    return devices, unmatched
+
+
+def print_matches(key: Key, matches: List[Match]) -> None:
+    if not matches:
+        print("No driver matches {}".format(format_key(key)))
+        return
+    for m in matches:
+        print("{} {}: {} ({})".format("exact   " if m.exact else "wildcard", m.driver, m.fingerprint_id,
+                                      m.device_label))
+        print("    fingerprint: {} {}".format(m.fingerprints_file, format_key(m.key)))
+        print("    profile:     {} -> {}".format(m.device_profile_name, m.profile or "(not found)"))
+    drivers = {m.driver for m in matches}
+    if len(drivers) > 1:
+        print("Matched by {} drivers: {}".format(len(drivers), ", ".join(sorted(drivers))))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find the drivers whose fingerprints match a device")
+    parser.add_argument("protocol", nargs="?", choices=sorted(KEY_FIELDS), help="the device's protocol")
+    parser.add_argument("ids", nargs="*", help="the device's identifiers, in fingerprints.yml field order")
+    parser.add_argument("--csv", type=argparse.FileType("r", encoding="utf-8"), help="match every device in this CSV file")
+    parser.add_argument("--output", "-o", type=argparse.FileType("w", encoding="utf-8"), default=sys.stdout,
+                        help="where to write the CSV matches (default: stdout)")
+    parser.add_argument("--hex", action="store_true", help="read numeric ids as hexadecimal")
+    parser.add_argument("--index", type=Path, default=DEFAULT_INDEX_FILE, help="the serialized index file")
+    parser.add_argument("--rebuild", action="store_true", help="rebuild the serialized index")
+    args = parser.parse_args(argv)
+
+    matcher = FingerprintMatcher.load(args.index, rebuild=args.rebuild)
+    if args.csv is not None:
+        devices, unmatched = match_csv(matcher, args.csv, args.output, args.hex)
+        print("Matched {} of {} devices".format(devices - unmatched, devices), file=sys.stderr)
+        return
+    if args.protocol is None:
+        if not args.rebuild:
+            parser.error("give a protocol and ids, or --csv")
+        print("Indexed {} fingerprint keys".format(len(matcher.by_key)))
+        return
+    try:
+        key = device_key(args.protocol, args.ids, args.hex)
+    except ValueError as e:
+        parser.error(str(e))
+    matches = matcher.match(key)
+    print_matches(key, matches)
+    if not matches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
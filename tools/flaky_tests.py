@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# Copyright 2026 SmartThings
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""flaky_tests.py
+
+Finds flaky driver tests by running the selected test files N times each,
+several lua processes at once, and comparing the runs:
+
+    flaky     test cases that passed in some runs and failed in others, and
+              test files that only sometimes failed to run or timed out
+    failing   test cases that failed in every run, and test files that
+              failed to run or timed out every time (broken, not flaky)
+    timing    each file's duration across runs: mean, standard deviation and
+              range; files whose duration varies a lot are often the ones
+              racing timers
+
+The runs are interleaved (every file once, then every file again, ...) so a
+slow patch on the machine is spread across files rather than landing on all
+the runs of one.  Only about two files per job are queued at a time and
+results are folded into per-test counts as they arrive, so a sweep of the
+full suite holds the output of at most two runs per job, and stopping a sweep with Ctrl-C still writes the report for the runs
+that finished.  The exit status is 1 when anything is failing in every run;
+flaky tests alone don't fail the sweep.
+
+The report goes to tools/test_output/flaky_report.json.  With --quarantine,
+the flaky tests are also written to the quarantine list
+(tools/test_quarantine.json) that run_driver_tests.py and
+run_driver_tests_p.py read: quarantined tests still run, but their failures
+are reported as skipped rather than failing the run.  Entries of the test
+files in the sweep are replaced, so a test that is no longer flaky leaves
+the list on the next sweep.
+
+Usage
+-----
+    python3 tools/flaky_tests.py [--repeat N] [--filter REGEX] [--driver NAME ...]
+        [--test-filter NAME] [--jobs N] [--timeout SECONDS] [--memory-limit MB]
+        [--report FILE] [--quarantine [FILE]]
+    python3 tools/run_driver_tests.py --repeat N [--filter REGEX] ...
+
+Overnight, across the whole suite:
+
+    python3 tools/flaky_tests.py --repeat 20 --timeout 120 --quarantine
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Sequence, Set
+
+from capability_cache import DriverCapabilityDirs
+from driver_test_lib import (DRIVER_DIR, QUARANTINE_FILE, WHOLE_FILE, TestFileResult, discover_test_files,
+                             run_test_files, save_quarantine, test_name_filter_args)
+
+DEFAULT_REPEAT = 10
+DEFAULT_REPORT = DRIVER_DIR.parent.joinpath("tools", "test_output", "flaky_report.json")
+# output kept from a test case's first failure, for the report
+MAX_OUTPUT = 4096
+# files whose duration's standard deviation is at least this fraction of the mean are listed as unstable
+UNSTABLE_TIMING = 0.25
+
+
+class CaseStats:
+    __slots__ = ("runs", "passed", "output")
+
+    def __init__(self):
+        self.runs = 0
+        self.passed = 0
+        self.output = ""
+
+    @property
+    def flaky(self) -> bool:
+        return 0 < self.passed < self.runs
+
+    @property
+    def failing(self) -> bool:
+        return self.runs > 0 and self.passed == 0
+
+
+class FileStats:
+    """One test file's results, accumulated run by run."""
+
+    def __init__(self, test_file: Path):
+        self.test_file = test_file
+        self.runs = 0
+        # runs where the file crashed, timed out or the harness never finished
+        self.errors = 0
+        self.timeouts = 0
+        self.error_output = ""
+        self.cases: Dict[str, CaseStats] = {}
+        # running mean and sum of squared deviations of the duration (Welford)
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def add(self, result: TestFileResult) -> None:
+        self.runs += 1
+        delta = result.duration - self.mean
+        self.mean += delta / self.runs
+        self.m2 += delta * (result.duration - self.mean)
+        self.min = min(self.min, result.duration)
+        self.max = max(self.max, result.duration)
+        for case in result.cases:
+            stats = self.cases.setdefault(case.name, CaseStats())
+            stats.runs += 1
+            if case.passed:
+                stats.passed += 1
+            elif not stats.output:
+                stats.output = case.output[-MAX_OUTPUT:]
+        if result.timed_out or not result.complete or result.crashed:
+            self.errors += 1
+            self.timeouts += result.timed_out
+            if not self.error_output:
+                self.error_output = (result.stderr or result.stdout)[-MAX_OUTPUT:]
+
+    @property
+    def stdev(self) -> float:
+        return math.sqrt(self.m2 / (self.runs - 1)) if self.runs > 1 else 0.0
+
+    @property
+    def flaky_errors(self) -> bool:
+        return 0 < self.errors < self.runs
+
+    def flaky_cases(self) -> List[str]:
+        return sorted(name for name, stats in self.cases.items() if stats.flaky)
+
+    def failing_cases(self) -> List[str]:
+        return sorted(name for name, stats in self.cases.items() if stats.failing)
+
+    def quarantine(self) -> Set[str]:
+        """What to quarantine: the flaky cases, or the whole file if it only sometimes fails to run."""
+        return {WHOLE_FILE} if self.flaky_errors else set(self.flaky_cases())
+
+    def to_json(self) -> dict:
+        return {
+            "runs": self.runs,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "duration": {"mean": round(self.mean, 3), "stdev": round(self.stdev, 3),
+                         "min": round(self.min, 3) if self.runs else 0.0, "max": round(self.max, 3)},
+            "cases": {name: {"runs": stats.runs, "passed": stats.passed} for name, stats in sorted(self.cases.items())},
+        }
+
+
+def relative(test_file: Path) -> str:
+    return str(test_file.relative_to(DRIVER_DIR.parent))
+
+
+def sweep(
+    test_files: Sequence[Path],
+    repeat: int = DEFAULT_REPEAT,
+    jobs: Optional[int] = None,
+    test_filter: Optional[str] = None,
+    timeout: Optional[float] = None,
+    memory_limit: Optional[int] = None,
+    progress: bool = True,
+) -> Dict[Path, FileStats]:
+    """Run each test file repeat times, jobs at a time, and collect the stats of the runs that finished."""
+    env = os.environ.copy()
+    lua_args = []
+    if test_filter is not None:
+        env["ST_TEST_NAME_FILTER"] = test_filter
+        lua_args = test_name_filter_args()
+    capability_dirs = DriverCapabilityDirs.from_env(env)
+
+    def env_for(test_file):
+        if capability_dirs is None:
+            return env
+        file_env = dict(env)
+        file_env["ST_CAPABILITY_JSON_DIR"] = str(capability_dirs.for_driver(test_file.parts[-4]))
+        return file_env
+
+    stats = {test_file: FileStats(test_file) for test_file in test_files}
+    total = len(test_files) * repeat
+    done = 0
+    start = time.monotonic()
+    try:
+        for result in run_test_files((test_file for _ in range(repeat) for test_file in test_files), jobs,
+                                     lua_args, env_for, timeout, memory_limit):
+            stats[result.test_file].add(result)
+            done += 1
+            if progress and (done % max(1, len(test_files)) == 0 or done == total):
+                print("{}/{} runs in {:.0f}s".format(done, total, time.monotonic() - start), flush=True)
+    except KeyboardInterrupt:
+        print("Interrupted after {} of {} runs".format(done, total))
+    finally:
+        if capability_dirs is not None:
+            capability_dirs.cleanup()
+    return stats
+
+
+def build_report(stats: Mapping[Path, FileStats], repeat: int, duration: float) -> dict:
+    flaky, failing = [], []
+    for test_file, file_stats in sorted(stats.items()):
+        if file_stats.flaky_errors:
+            flaky.append({"file": relative(test_file), "case": WHOLE_FILE, "passed": file_stats.runs - file_stats.errors,
+                          "runs": file_stats.runs, "output": file_stats.error_output})
+        for name in file_stats.flaky_cases():
+            case = file_stats.cases[name]
+            flaky.append({"file": relative(test_file), "case": name, "passed": case.passed, "runs": case.runs,
+                          "output": case.output})
+        if file_stats.runs and file_stats.errors == file_stats.runs:
+            failing.append({"file": relative(test_file), "case": WHOLE_FILE, "runs": file_stats.runs})
+        for name in file_stats.failing_cases():
+            failing.append({"file": relative(test_file), "case": name, "runs": file_stats.cases[name].runs})
+    flaky.sort(key=lambda entry: (entry["passed"] / entry["runs"], entry["file"], entry["case"]))
+    return {
+        "repeat": repeat,
+        "duration": round(duration, 1),
+        "runs": sum(file_stats.runs for file_stats in stats.values()),
+        "flaky": flaky,
+        "failing": failing,
+        "files": {relative(test_file): file_stats.to_json() for test_file, file_stats in sorted(stats.items())},
+    }
+
+
+def print_report(stats: Mapping[Path, FileStats], report: dict, top: int = 10) -> None:
+    print("{} runs of {} test files in {:.0f}s".format(report["runs"], len(stats), report["duration"]))
+    if report["flaky"]:
+        print("Flaky:")
+        for entry in report["flaky"]:
+            case = "(fails to run)" if entry["case"] == WHOLE_FILE else entry["case"]
+            print("  {:>4}/{:<4} {}: {}".format(entry["passed"], entry["runs"], entry["file"], case))
+    if report["failing"]:
+        print("Failing in every run:")
+        for entry in report["failing"]:
+            case = "(fails to run)" if entry["case"] == WHOLE_FILE else entry["case"]
+            print("  {}: {}".format(entry["file"], case))
+    unstable = sorted((file_stats for file_stats in stats.values()
+                       if file_stats.runs > 1 and file_stats.mean > 0 and file_stats.stdev >= UNSTABLE_TIMING * file_stats.mean),
+                      key=lambda file_stats: -file_stats.stdev / file_stats.mean)
+    if unstable:
+        print("Most variable durations:")
+        for file_stats in unstable[:top]:
+            print("  {:>7.2f}s +/- {:<6.2f} ({:.2f}-{:.2f}s) {}".format(
+                file_stats.mean, file_stats.stdev, file_stats.min, file_stats.max, relative(file_stats.test_file)))
+    if not report["flaky"] and not report["failing"]:
+        print("No flaky or failing tests")
+
+
+def run(
+    test_files: Sequence[Path],
+    repeat: int = DEFAULT_REPEAT,
+    jobs: Optional[int] = None,
+    test_filter: Optional[str] = None,
+    timeout: Optional[float] = None,
+    memory_limit: Optional[int] = None,
+    report_file: Path = DEFAULT_REPORT,
+    quarantine_file: Optional[Path] = None,
+) -> dict:
+    """Sweep the test files, print and write the report, and update the quarantine list if given one."""
+    print("Running {} test files {} times each".format(len(test_files), repeat))
+    start = time.monotonic()
+    stats = sweep(test_files, repeat, jobs, test_filter, timeout, memory_limit)
+    report = build_report(stats, repeat, time.monotonic() - start)
+    print_report(stats, report)
+    report_file = Path(report_file)
+    report_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(report_file, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1)
+    print("Wrote {}".format(report_file))
+    if quarantine_file is not None:
+        # only files that completed every run have a full picture; the rest keep their entries
+        swept = [test_file for test_file, file_stats in stats.items() if file_stats.runs == repeat]
+        save_quarantine({test_file: stats[test_file].quarantine() for test_file in swept}, swept, quarantine_file)
+        print("Updated {}".format(quarantine_file))
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run driver test files repeatedly to find flaky tests")
+    parser.add_argument("--repeat", "-n", type=int, default=DEFAULT_REPEAT, metavar="N", help="runs of each test file")
+    parser.add_argument("--filter", "-f", type=str, help="only run test files whose path matches this regex")
+    parser.add_argument("--driver", "-d", action="append", dest="drivers", help="only run this driver's tests (repeatable)")
+    parser.add_argument("--test-filter", "-t", type=str, metavar="NAME", help="only run the test cases whose name contains NAME")
+    parser.add_argument("--jobs", "-j", type=int, help="lua processes to run at once (default: number of CPUs)")
+    parser.add_argument("--timeout", type=float, metavar="SECONDS", help="kill a test file's lua process after SECONDS")
+    parser.add_argument("--memory-limit", type=int, metavar="MB", help="cap each lua process at MB MiB of address space (Linux)")
+    parser.add_argument("--report", type=Path, default=DEFAULT_REPORT, help="where to write the JSON report")
+    parser.add_argument("--quarantine", type=Path, nargs="?", const=QUARANTINE_FILE, metavar="FILE",
+                        help="write the flaky tests to this quarantine list (default: tools/test_quarantine.json)")
+    args = parser.parse_args(argv)
+    if args.repeat < 2:
+        parser.error("--repeat must be at least 2")
+
+    test_files = discover_test_files(args.filter, args.drivers)
+    if not test_files:
+        parser.error("no test files selected")
+    report = run(test_files, args.repeat, args.jobs, args.test_filter, args.timeout, args.memory_limit, args.report,
+                 args.quarantine)
+    sys.exit(1 if report["failing"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+# Copyright 2026 SmartThings
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""junit_stream.py
+
+Writing JUnit XML one test suite at a time, for the test runners.
+
+junit_xml.to_xml_report_file needs every suite, with all of its captured
+output, in memory until the end of the run.  JUnitStreamWriter instead
+serializes each suite with junit_xml's own build_xml_doc as soon as it is
+added and forgets it, so the runner only ever holds one test file's results.
+
+After every suite the file is a complete, valid report: the closing
+</testsuites> tag is written after the suite and overwritten by the next
+one, and the totals in the opening tag are rewritten in place (they are
+padded to a fixed width so they always fit).  A run that is killed leaves
+the results of every file that finished.  Reports whose name ends in .gz
+are gzip-compressed instead; those are flushed after every suite so a
+partial report can still be read with zcat, but their totals are left out
+since the opening tag cannot be rewritten.
+
+Captured output longer than max_output characters (a test's stdout, a
+failure's traceback, ...) is cut down to its beginning and end.  With a
+spill_dir, the whole text is first written to a file there and the report
+says where.
+
+Usage
+-----
+    with JUnitStreamWriter(path, spill_dir=spill_dir_for(path)) as writer:
+        for ...:
+            writer.write_suite(test_suite)
+"""
+
+import gzip
+import re
+import xml.etree.ElementTree as ET
+import zlib
+from pathlib import Path
+from typing import Dict, Optional, Set
+
+import junit_xml
+
+# characters of captured output kept in the report per test case, failure, ...
+DEFAULT_MAX_OUTPUT = 64 * 1024
+XML_DECLARATION = b'<?xml version="1.0" encoding="utf-8"?>\n'
+CLOSING_TAG = b"</testsuites>\n"
+# room for the totals in the opening tag, which is rewritten after every suite
+HEADER_WIDTH = 160
+TOTALS = ("disabled", "errors", "failures", "skipped", "tests")
+# characters that are not allowed in XML 1.0 documents, which junit_xml also removes
+ILLEGAL_XML_CHARS_RE = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\x84\x86-\x9f\ud800-\udfff\ufdd0-\ufddf\ufffe\uffff]")
+UNSAFE_NAME_RE = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+def spill_dir_for(path: Path) -> Path:
+    """Where a report's oversized output goes: results.xml(.gz) -> results_output/."""
+    path = Path(path)
+    name = path.name[:-len(".gz")] if path.name.endswith(".gz") else path.name
+    return path.with_name(Path(name).stem + "_output")
+
+
+def safe_name(name: str, limit: int = 80) -> str:
+    return UNSAFE_NAME_RE.sub("_", name).strip("_")[:limit] or "output"
+
+
+class JUnitStreamWriter:
+    """A JUnit XML report written a suite at a time, gzip-compressed if the path ends in .gz."""
+
+    def __init__(self, path: Path, max_output: Optional[int] = DEFAULT_MAX_OUTPUT, spill_dir: Optional[Path] = None):
+        self.path = Path(path)
+        self.max_output = max_output or None
+        self.spill_dir = Path(spill_dir) if spill_dir is not None else None
+        self.compressed = self.path.name.endswith(".gz")
+        self.totals: Dict[str, int] = {key: 0 for key in TOTALS}
+        self.time = 0.0
+        self.spilled: Set[Path] = set()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.compressed:
+            self.file = gzip.open(self.path, "wb")
+            self.file.write(XML_DECLARATION + b"<testsuites>\n")
+        else:
+            self.file = open(self.path, "wb")
+            self.file.write(XML_DECLARATION)
+            self.header_offset = self.file.tell()
+            self.file.write(self.header())
+            self.file.write(CLOSING_TAG)
+            self.end = self.header_offset + len(self.header())
+        self.file.flush()
+
+    def header(self) -> bytes:
+        attributes = "".join(' {}="{}"'.format(key, self.totals[key]) for key in TOTALS)
+        attributes += ' time="{:.3f}"'.format(self.time)
+        return "<testsuites{}>\n".format(attributes.ljust(HEADER_WIDTH)).encode()
+
+    def spill(self, text: str, suite: str, case: str, kind: str) -> str:
+        """text, cut to max_output characters, with the whole of it written to spill_dir first."""
+        if self.max_output is None or text is None or len(text) <= self.max_output:
+            return text
+        note = "{} characters omitted".format(len(text) - self.max_output)
+        if self.spill_dir is not None:
+            spill_file = self.spill_dir.joinpath(safe_name(suite), "{}.{}.txt".format(safe_name(case), kind))
+            n = 1
+            while spill_file in self.spilled:
+                n += 1
+                spill_file = spill_file.with_name("{}.{}.{}.txt".format(safe_name(case), kind, n))
+            self.spilled.add(spill_file)
+            spill_file.parent.mkdir(parents=True, exist_ok=True)
+            spill_file.write_text(text, encoding="utf-8", errors="replace")
+            try:
+                shown = spill_file.relative_to(self.path.parent)
+            except ValueError:
+                shown = spill_file
+            note += ", full output in {}".format(shown)
+        # the end of the output is usually where the failure is
+        head = self.max_output // 4
+        return "{}\n[... {} ...]\n{}".format(text[:head], note, text[-(self.max_output - head):])
+
+    def limit_output(self, suite: junit_xml.TestSuite) -> None:
+        suite.stdout = self.spill(suite.stdout, suite.name, "suite", "stdout")
+        suite.stderr = self.spill(suite.stderr, suite.name, "suite", "stderr")
+        for case in suite.test_cases:
+            case.stdout = self.spill(case.stdout, suite.name, case.name, "stdout")
+            case.stderr = self.spill(case.stderr, suite.name, case.name, "stderr")
+            for kind, infos in (("failure", case.failures), ("error", case.errors), ("skipped", case.skipped)):
+                for info in infos:
+                    info["output"] = self.spill(info["output"], suite.name, case.name, kind)
+
+    def write_suite(self, suite: junit_xml.TestSuite) -> None:
+        """Add a suite to the report; it can be discarded afterwards."""
+        self.limit_output(suite)
+        element = suite.build_xml_doc()
+        for key in TOTALS:
+            self.totals[key] += int(element.get(key, 0))
+        self.time += float(element.get("time", 0))
+        ET.indent(element, level=1)
+        text = "  " + ILLEGAL_XML_CHARS_RE.sub("", ET.tostring(element, encoding="unicode")) + "\n"
+        data = text.encode("utf-8", errors="replace")
+        if self.compressed:
+            self.file.write(data)
+            # a sync flush makes everything so far readable even if the process dies
+            self.file.flush(zlib.Z_SYNC_FLUSH)
+            return
+        self.file.seek(self.end)
+        self.file.write(data)
+        self.end = self.file.tell()
+        self.file.write(CLOSING_TAG)
+        self.file.seek(self.header_offset)
+        self.file.write(self.header())
+        self.file.flush()
+
+    def close(self) -> None:
+        if self.file.closed:
+            return
+        if self.compressed:
+            self.file.write(CLOSING_TAG)
+        self.file.close()
+
+    def __enter__(self) -> "JUnitStreamWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,123 @@
+-- Copyright 2026 SmartThings, Inc.
+-- Licensed under the Apache License, Version 2.0
+
+-- Sampling profiler loaded by tools/run_driver_tests.py --profile before the
+-- test file runs, the same way luacov is.  A count hook fires every `interval`
+-- VM instructions and charges the CPU time since the previous sample to the
+-- current call stack.  Coroutines get their own hook as they are created, so
+-- handlers run by the harness's scheduler are sampled too.
+--
+-- When the process exits the stacks are written to the output file in the
+-- folded format flamegraph tools read, one "outer;...;inner microseconds"
+-- line per stack.  tools/lua_profile.py merges these files into a report.
+
+local profiler = {}
+
+local clock = os.clock
+local getinfo = debug.getinfo
+local sethook = debug.sethook
+local concat = table.concat
+
+local MAX_DEPTH = 100
+
+local stacks = {}
+local output_path
+local interval
+local last_clock
+local running = false
+
+local function frame_name(info)
+  local name = info.name or (info.what == "main" and "(main chunk)") or "?"
+  local frame
+  if info.what == "C" then
+    frame = name .. " [C]"
+  else
+    frame = string.format("%s (%s:%d)", name, info.short_src, info.linedefined)
+  end
+  -- ";" separates frames in the folded format
+  return (frame:gsub(";", ":"))
+end
+
+local function sample()
+  local now = clock()
+  local elapsed = now - last_clock
+  last_clock = now
+  local frames = {}
+  -- level 1 is this hook, level 2 the function that was running
+  local level = 2
+  while level < MAX_DEPTH + 2 do
+    local info = getinfo(level, "Sn")
+    if info == nil then
+      break
+    end
+    frames[#frames + 1] = frame_name(info)
+    level = level + 1
+  end
+  -- outermost frame first
+  local n = #frames
+  for i = 1, n // 2 do
+    frames[i], frames[n - i + 1] = frames[n - i + 1], frames[i]
+  end
+  local key = concat(frames, ";")
+  stacks[key] = (stacks[key] or 0) + elapsed
+end
+
+function profiler.start(path, count)
+  output_path = path
+  interval = count or 1000
+  last_clock = clock()
+  running = true
+  sethook(sample, "", interval)
+
+  local create = coroutine.create
+  coroutine.create = function(f)
+    local co = create(f)
+    if running then
+      sethook(co, sample, "", interval)
+    end
+    return co
+  end
+  local resume = coroutine.resume
+  coroutine.wrap = function(f)
+    local co = coroutine.create(f)
+    return function(...)
+      local result = table.pack(resume(co, ...))
+      if not result[1] then
+        error(result[2], 0)
+      end
+      return table.unpack(result, 2, result.n)
+    end
+  end
+
+  -- the harness ends with os.exit, which skips garbage collection
+  local exit = os.exit
+  os.exit = function(...)
+    profiler.stop()
+    return exit(...)
+  end
+  -- otherwise write the stacks when the state is closed
+  profiler.sentinel = setmetatable({}, { __gc = function() profiler.stop() end })
+  package.loaded["st_test_profiler"] = profiler
+  return profiler
+end
+
+function profiler.stop()
+  if not running then
+    return
+  end
+  running = false
+  sethook()
+  local f = io.open(output_path, "w")
+  if f == nil then
+    return
+  end
+  for stack, seconds in pairs(stacks) do
+    local micros = math.floor(seconds * 1000000 + 0.5)
+    if micros > 0 then
+      f:write(stack, " ", micros, "\n")
+    end
+  end
+  f:close()
+end
+
+return profiler
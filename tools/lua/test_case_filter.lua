@@ -0,0 +1,25 @@
+-- Copyright 2026 SmartThings, Inc.
+-- Licensed under the Apache License, Version 2.0
+
+-- Loaded by tools/run_driver_tests.py --test-filter before the test file runs.
+-- Only test cases whose name contains ST_TEST_NAME_FILTER (a plain substring,
+-- not a Lua pattern) are registered with the integration test harness, so the
+-- others never run and are not counted in the "Passed X of Y tests" line.
+
+local name_filter = os.getenv("ST_TEST_NAME_FILTER")
+if name_filter == nil or name_filter == "" then
+  return
+end
+
+local integration_test = require "integration_test"
+
+for _, register_name in ipairs({ "register_message_test", "register_coroutine_test" }) do
+  local register = integration_test[register_name]
+  if type(register) == "function" then
+    integration_test[register_name] = function(name, ...)
+      if type(name) == "string" and string.find(name, name_filter, 1, true) ~= nil then
+        return register(name, ...)
+      end
+    end
+  end
+end
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# Copyright 2026 SmartThings
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""lua_profile.py
+
+Profiling driver tests with the sampling profiler in tools/lua/profiler.lua.
+
+The test runners' --profile option loads the profiler into each test file's
+lua process, which writes its samples to
+tools/profile_output/stacks/<driver>/<test file>.folded.  This module merges
+those files into:
+
+    tools/profile_output/profile.folded   every stack, summed across files, in
+                                          the folded format flamegraph.pl and
+                                          speedscope read
+    tools/profile_output/profile.txt      functions sorted by self time, with
+                                          their total (inclusive) time
+
+Usage
+-----
+    python3 tools/run_driver_tests.py --profile [--filter REGEX]
+    python3 tools/run_driver_tests_p.py --profile
+    python3 tools/lua_profile.py [--top N] [--output-dir DIR] [STACKS ...]
+
+STACKS are .folded files or directories of them (default:
+tools/profile_output/stacks).
+"""
+
+import argparse
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+TOOLS_DIR = Path(__file__).resolve().parent
+PROFILER_LUA = TOOLS_DIR.joinpath("lua", "profiler.lua")
+DEFAULT_PROFILE_DIR = TOOLS_DIR.joinpath("profile_output")
+DEFAULT_STACKS_DIR = DEFAULT_PROFILE_DIR.joinpath("stacks")
+# VM instructions between samples
+DEFAULT_INTERVAL = 1000
+DEFAULT_TOP = 40
+
+
+def stacks_path(stacks_dir: Path, test_file: Path) -> Path:
+    """Where a test file's samples go: <stacks_dir>/<driver>/<test file stem>.folded."""
+    return Path(stacks_dir).joinpath(test_file.parts[-4], test_file.stem + ".folded")
+
+
+def profile_lua_args(stacks_file: Path, interval: int = DEFAULT_INTERVAL) -> List[str]:
+    """lua arguments that start the profiler, writing its samples to stacks_file."""
+    return ["-e", "dofile([==[%s]==]).start([==[%s]==], %d)" % (PROFILER_LUA, stacks_file, interval)]
+
+
+def load_folded(path: Path, into: Counter = None) -> Counter:
+    stacks = Counter() if into is None else into
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            stack, sep, count = line.rstrip("\n").rpartition(" ")
+            if sep and count.isdigit():
+                stacks[stack] += int(count)
+    return stacks
+
+
+def expand_inputs(inputs: Iterable[Path]) -> List[Path]:
+    files = []
+    for path in inputs:
+        path = Path(path)
+        if path.is_dir():
+            files.extend(sorted(path.rglob("*.folded")))
+        elif path.is_file():
+            files.append(path)
+    return files
+
+
+def merge_stacks(files: Iterable[Path]) -> Counter:
+    stacks = Counter()
+    for path in files:
+        load_folded(path, stacks)
+    return stacks
+
+
+def function_times(stacks: Counter) -> Dict[str, Tuple[int, int]]:
+    """Microseconds per function: (self time, total time counting each stack once)."""
+    self_time = Counter()
+    total_time = Counter()
+    for stack, micros in stacks.items():
+        frames = stack.split(";")
+        self_time[frames[-1]] += micros
+        # recursive functions appear more than once in a stack but only spend the time once
+        for frame in set(frames):
+            total_time[frame] += micros
+    return {frame: (self_time[frame], total) for frame, total in total_time.items()}
+
+
+def write_folded(stacks: Counter, path: Path) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, micros in sorted(stacks.items()):
+            f.write("{} {}\n".format(stack, micros))
+
+
+def format_report(stacks: Counter, top: int = DEFAULT_TOP) -> str:
+    times = function_times(stacks)
+    overall = sum(stacks.values()) or 1
+    lines = ["Sampled {:.3f} seconds of CPU time in {} stacks".format(overall / 1e6, len(stacks)), "",
+             "{:>10} {:>6} {:>10} {:>6}  {}".format("self ms", "self%", "total ms", "total%", "function")]
+    ranked = sorted(times.items(), key=lambda item: (-item[1][0], -item[1][1], item[0]))
+    for frame, (self_micros, total_micros) in ranked[:top]:
+        lines.append("{:>10.1f} {:>5.1f}% {:>10.1f} {:>5.1f}%  {}".format(
+            self_micros / 1e3, self_micros * 100.0 / overall, total_micros / 1e3, total_micros * 100.0 / overall, frame))
+    return "\n".join(lines) + "\n"
+
+
+def report(inputs: Iterable[Path] = (DEFAULT_STACKS_DIR,), output_dir: Path = DEFAULT_PROFILE_DIR,
+           top: int = DEFAULT_TOP) -> bool:
+    """Merge the samples, write profile.folded and profile.txt, and print the report; False if there were none."""
+    files = expand_inputs(inputs)
+    stacks = merge_stacks(files)
+    if not stacks:
+        print("No profile samples found")
+        return False
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    write_folded(stacks, output_dir.joinpath("profile.folded"))
+    text = format_report(stacks, top)
+    output_dir.joinpath("profile.txt").write_text(text, encoding="utf-8")
+    print(text, end="")
+    print("Merged {} profiles into {} and {}".format(
+        len(files), output_dir.joinpath("profile.folded"), output_dir.joinpath("profile.txt")))
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Merge Lua profiler samples into a report and folded stacks")
+    parser.add_argument("inputs", nargs="*", type=Path, default=[DEFAULT_STACKS_DIR],
+                        help=".folded files or directories of them")
+    parser.add_argument("--output-dir", "-o", type=Path, default=DEFAULT_PROFILE_DIR,
+                        help="where to write profile.folded and profile.txt")
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP, help="functions to list in the report")
+    args = parser.parse_args(argv)
+    report(args.inputs, args.output_dir, args.top)
+
+
+if __name__ == "__main__":
+    main()
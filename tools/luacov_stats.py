@@ -0,0 +1,234 @@
+# Copyright 2026 SmartThings
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""luacov_stats.py
+
+Per-process luacov statistics for the driver test runners.
+
+`lua -lluacov` makes every test process read-modify-write the same
+luacov.stats.out in the driver's src directory, which corrupts the counts as
+soon as two test files of a driver run at the same time.  Instead, each test
+process is started with its own stats file (see coverage_lua_args()), and once
+a driver's tests are done its stats files are merged into the single
+luacov.stats.out that the luacov, luacov html and luacov-cobertura reporters
+read.
+
+The same merge is available as a command, for coverage collected by several
+runner processes or machines into one stats directory:
+
+    python3 tools/luacov_stats.py merge \\
+        [--stats-dir tools/coverage_output/stats] \\
+        [--cobertura-dir tools/coverage_output] \\
+        [--cobertura tools/coverage_output/coverage.xml] \\
+        [--html-dir tools/coverage_output_html]
+
+Stats file format (as written by luacov.stats.save in luacov 0.15)
+-------------------------------------------------------------------
+    <max line>:<chunk name>
+    <hits for line 1> <hits for line 2> ... <hits for line max>
+    ...
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+STATS_FILE_NAME = "luacov.stats.out"
+TOOLS_DIR = Path(os.path.abspath(__file__)).parent
+DRIVER_DIR = TOOLS_DIR.parent.joinpath("drivers")
+LUACOV_CONFIG = TOOLS_DIR.joinpath("config.luacov")
+DEFAULT_STATS_DIR = TOOLS_DIR.joinpath("coverage_output", "stats")
+
+Stats = Dict[str, List[int]]
+
+
+def stats_path(stats_dir: Path, test_file: Path) -> Path:
+    """Where the stats of one test file run are written: <stats_dir>/<driver>/<test>.out"""
+    return Path(stats_dir).joinpath(test_file.parts[-4], test_file.stem + ".out")
+
+
+def coverage_lua_args(stats_file: Path) -> List[str]:
+    """lua arguments that enable luacov with a private stats file, in place of -lluacov."""
+    return ["-e", "require('luacov.runner').init({statsfile=[==[%s]==]})" % stats_file]
+
+
+def load_stats(path: Path) -> Stats:
+    stats: Stats = {}
+    with open(path, encoding="utf-8", errors="surrogateescape") as f:
+        while True:
+            header = f.readline()
+            if not header:
+                break
+            max_line, sep, chunk_name = header.rstrip("\n").partition(":")
+            if not sep or not max_line.isdigit():
+                break
+            hits = [int(h) for h in f.readline().split()]
+            # a truncated line (killed process) just loses its trailing counts
+            hits += [0] * (int(max_line) - len(hits))
+            stats[chunk_name] = hits
+    return stats
+
+
+def merge_stats(stats_files: Iterable[Path], into: Optional[Stats] = None) -> Stats:
+    merged: Stats = into if into is not None else {}
+    for path in stats_files:
+        for chunk_name, hits in load_stats(path).items():
+            current = merged.get(chunk_name)
+            if current is None:
+                merged[chunk_name] = hits
+                continue
+            if len(hits) > len(current):
+                current.extend([0] * (len(hits) - len(current)))
+            for i, h in enumerate(hits):
+                if h:
+                    current[i] += h
+    return merged
+
+
+def save_stats(stats: Stats, path: Path) -> None:
+    with open(path, "w", encoding="utf-8", errors="surrogateescape") as f:
+        for chunk_name in sorted(stats):
+            hits = stats[chunk_name]
+            f.write("%d:%s\n" % (len(hits), chunk_name))
+            f.write("".join("%d " % h for h in hits))
+            f.write("\n")
+
+
+def merge_driver_stats(stats_files: Iterable[Path], src_dir: Path) -> Path:
+    """Merge a driver's per-process stats into <src_dir>/luacov.stats.out for the reporters."""
+    dest = Path(src_dir).joinpath(STATS_FILE_NAME)
+    save_stats(merge_stats(stats_files), dest)
+    return dest
+
+
+def run_reporter(command: List[str], src_dir: Path) -> subprocess.CompletedProcess:
+    """
+    Run a luacov reporter (luacov, luacov-cobertura, ...) against the merged
+    stats in src_dir.  PWD is set explicitly because config.luacov's cobertura
+    filenameparser builds absolute paths from it.
+    """
+    env = os.environ.copy()
+    env["PWD"] = str(src_dir)
+    return subprocess.run(command, cwd=src_dir, env=env)
+
+
+def report_driver(
+    src_dir: Path,
+    stats_files: Iterable[Path],
+    cobertura: Optional[Path] = None,
+    html: Optional[Path] = None,
+) -> None:
+    """
+    Merge one driver's stats files and run the reporters over the result:
+    luacov-cobertura when cobertura is given, the luacov html reporter (copied
+    to html) when html is given, and the plain luacov text report otherwise.
+    """
+    src_dir = Path(src_dir)
+    merge_driver_stats([f for f in stats_files if Path(f).exists()], src_dir)
+    if cobertura is not None:
+        run_reporter(["luacov-cobertura", "-o", str(cobertura), "-c", str(LUACOV_CONFIG)], src_dir)
+    if html is not None:
+        run_reporter(["luacov", "-c", str(LUACOV_CONFIG), "--reporter", "html"], src_dir)
+        html_source = src_dir.joinpath("luacov.report.out")
+        if html_source.exists():
+            shutil.copy(html_source, html)
+        else:
+            print(f"Warning: HTML coverage file for {src_dir.parent.name} not found")
+    if cobertura is None and html is None:
+        run_reporter(["luacov", "-c={}".format(LUACOV_CONFIG)], src_dir)
+
+
+COBERTURA_COUNTS = ("lines-valid", "lines-covered", "branches-valid", "branches-covered")
+
+
+def combine_cobertura(xml_files: Iterable[Path], output: Path) -> None:
+    """
+    Combine several Cobertura reports into one, summing the top level counts.
+    Reports that are missing or cannot be parsed (a test process killed while
+    writing one) are skipped with a warning.
+    """
+    combined = ET.Element("coverage")
+    sources = ET.SubElement(combined, "sources")
+    packages = ET.SubElement(combined, "packages")
+    totals = dict.fromkeys(COBERTURA_COUNTS, 0)
+    seen_sources = set()
+    for xml_file in xml_files:
+        try:
+            root = ET.parse(xml_file).getroot()
+        except (ET.ParseError, OSError) as e:
+            print("Warning: skipping coverage report {}: {}".format(xml_file, e))
+            continue
+        for key in COBERTURA_COUNTS:
+            totals[key] += int(float(root.get(key, 0)))
+        for source in root.iter("source"):
+            if source.text not in seen_sources:
+                seen_sources.add(source.text)
+                sources.append(source)
+        for package in root.iter("package"):
+            packages.append(package)
+    for key, value in totals.items():
+        combined.set(key, str(value))
+    combined.set("line-rate", "%.4f" % (totals["lines-covered"] / totals["lines-valid"] if totals["lines-valid"] else 0))
+    combined.set("branch-rate", "%.4f" % (totals["branches-covered"] / totals["branches-valid"] if totals["branches-valid"] else 0))
+    ET.ElementTree(combined).write(output, encoding="utf-8", xml_declaration=True)
+
+
+def find_driver_src(driver: str) -> Optional[Path]:
+    for src_dir in DRIVER_DIR.glob("*/{}/src".format(driver)):
+        return src_dir
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Merge per-process luacov stats and produce coverage reports")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    merge = subparsers.add_parser("merge", help="merge <stats-dir>/<driver>/*.out per driver and report")
+    merge.add_argument("--stats-dir", type=Path, default=DEFAULT_STATS_DIR, help="directory of per-driver stats directories")
+    merge.add_argument("--cobertura-dir", type=Path, help="write <driver>_coverage.xml Cobertura reports here")
+    merge.add_argument("--cobertura", type=Path, help="write a single Cobertura report covering every driver")
+    merge.add_argument("--html-dir", type=Path, help="write <driver>_luacov.report.html reports here")
+    args = parser.parse_args(argv)
+
+    if not args.stats_dir.is_dir():
+        print("No coverage stats found in {}".format(args.stats_dir))
+        sys.exit(1)
+    for out_dir in (args.cobertura_dir, args.html_dir):
+        if out_dir is not None:
+            out_dir.mkdir(parents=True, exist_ok=True)
+
+    driver_reports = []
+    for driver_stats in sorted(p for p in args.stats_dir.iterdir() if p.is_dir()):
+        src_dir = find_driver_src(driver_stats.name)
+        if src_dir is None:
+            print("Warning: no driver named {} found, skipping its coverage".format(driver_stats.name))
+            continue
+        cobertura = None
+        if args.cobertura_dir is not None or args.cobertura is not None:
+            cobertura = (args.cobertura_dir or args.stats_dir).joinpath(driver_stats.name + "_coverage.xml")
+            driver_reports.append(cobertura)
+        html = args.html_dir.joinpath(driver_stats.name + "_luacov.report.html") if args.html_dir else None
+        report_driver(src_dir, sorted(driver_stats.glob("*.out")), cobertura, html)
+
+    if args.cobertura is not None:
+        combine_cobertura([r for r in driver_reports if r.exists()], args.cobertura)
+        print("Combined coverage for {} driver(s) written to {}".format(len(driver_reports), args.cobertura))
+
+
+if __name__ == "__main__":
+    main()
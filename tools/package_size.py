@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# Copyright 2026 SmartThings
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""package_size.py
+
+Builds each driver's package in memory the way deploy.py does (see
+driver_package.py), breaks its size down by what is in it, and compares it
+against a stored baseline:
+
+    config      config.yml, fingerprints.yml, search-parameters.yml
+    profiles    profiles/**
+    certs       *.pem and *.crt files
+    lua         Lua modules that are not part of a sub-driver
+    sub-driver  each sub-driver's package (a src directory with a
+                can_handle.lua), reported by name
+
+Sizes are compressed bytes in the zip, which is what hubs download.
+
+Usage
+-----
+    python3 tools/package_size.py [--driver NAME ...] [--verbose]
+        [--baseline tools/package_sizes.json] [--update-baseline]
+        [--max-growth PERCENT] [--max-growth-bytes BYTES] [--max-size BYTES]
+        [--prune modules|all] [--markdown package-size.md]
+
+Arguments
+---------
+    --baseline          JSON file of each driver's package size
+                        (default: tools/package_sizes.json)
+    --update-baseline   Write this run's sizes to the baseline
+    --max-growth        Fail when a driver's package grows more than this
+                        percentage over its baseline (default: 5) ...
+    --max-growth-bytes  ... and by more than this many bytes (default: 2048)
+    --max-size          Fail when any package is larger than this
+    --prune             Measure packages with unreferenced files left out,
+                        as deploy.py does with PRUNE_UNREFERENCED
+    --markdown          Write the report as a markdown PR comment
+
+Drivers are also limited to those with changes in the whitespace separated
+ALL_CHANGED_FILES environment variable, when it is set.
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import zipfile
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+import driver_package
+from fingerprint_index import changed_drivers
+
+DRIVER_DIR = Path(__file__).resolve().parents[1].joinpath("drivers")
+DEFAULT_BASELINE = Path(__file__).resolve().parent.joinpath("package_sizes.json")
+CONFIG_FILES = ("config.yml", "fingerprints.yml")
+CERT_SUFFIXES = (".pem", ".crt")
+
+
+class PackageSize(NamedTuple):
+    driver: str
+    compressed: int
+    uncompressed: int
+    # compressed bytes by category (config, profiles, certs, lua, sub-driver <name>)
+    breakdown: Dict[str, int]
+
+
+def sub_driver_dirs(src_dir: Path) -> List[Path]:
+    """Sub-driver packages under src, outermost first."""
+    return sorted((path.parent for path in src_dir.rglob("can_handle.lua")
+                   if path.parent != src_dir and "test" not in path.relative_to(src_dir).parts),
+                  key=lambda path: len(path.parts))
+
+
+def categorize(path: Path, sub_drivers: List[Path]) -> str:
+    if path.name in CONFIG_FILES or path.name.startswith("search-parameters."):
+        return "config"
+    if path.parts[0] == "profiles":
+        return "profiles"
+    if path.suffix in CERT_SUFFIXES:
+        return "certs"
+    for sub_driver in sub_drivers:
+        if sub_driver in path.parents:
+            return "sub-driver " + sub_driver.relative_to("src").as_posix()
+    return "lua"
+
+
+def measure_package(driver_dir: Path, prune: Optional[str] = None) -> PackageSize:
+    exclude = driver_package.pruned_files(driver_dir, prune)
+    buffer = io.BytesIO()
+    driver_package.write_package(driver_dir, buffer, exclude)
+    sub_drivers = [path.relative_to(driver_dir) for path in sub_driver_dirs(driver_dir / "src")]
+    breakdown: Dict[str, int] = defaultdict(int)
+    uncompressed = 0
+    with zipfile.ZipFile(buffer) as package:
+        for info in package.infolist():
+            breakdown[categorize(Path(info.filename), sub_drivers)] += info.compress_size
+            uncompressed += info.file_size
+    return PackageSize(driver_dir.name, len(buffer.getvalue()), uncompressed, dict(breakdown))
+
+
+def load_baseline(path: Path) -> Dict[str, int]:
+    if not path.is_file():
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baseline(path: Path, sizes: List[PackageSize]) -> None:
+    """Record the sizes measured, keeping the baseline of drivers that were not."""
+    baseline = load_baseline(path)
+    baseline.update({size.driver: size.compressed for size in sizes})
+    tmp = Path(str(path) + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, indent=1, sort_keys=True)
+        f.write("\n")
+    os.replace(tmp, path)
+
+
+def over_budget(size: PackageSize, baseline: Optional[int], max_growth: float, max_growth_bytes: int,
+                max_size: Optional[int]) -> Optional[str]:
+    if max_size is not None and size.compressed > max_size:
+        return "{} bytes is over the {} byte limit".format(size.compressed, max_size)
+    if baseline:
+        growth = size.compressed - baseline
+        if growth > max_growth_bytes and growth * 100.0 / baseline > max_growth:
+            return "grew {} bytes ({:+.1f}%) over its baseline of {} bytes".format(
+                growth, growth * 100.0 / baseline, baseline)
+    return None
+
+
+def format_change(size: int, baseline: Optional[int]) -> str:
+    if not baseline:
+        return "new"
+    return "{:+d} ({:+.1f}%)".format(size - baseline, (size - baseline) * 100.0 / baseline)
+
+
+def write_markdown(path: Path, sizes: List[PackageSize], baseline: Dict[str, int], failures: Dict[str, str]) -> None:
+    lines = ["# Driver package sizes", "", "| Driver | Compressed | Change | Uncompressed | |", "|---|---:|---:|---:|---|"]
+    for size in sizes:
+        lines.append("| {} | {} | {} | {} | {} |".format(
+            size.driver, size.compressed, format_change(size.compressed, baseline.get(size.driver)),
+            size.uncompressed, failures.get(size.driver, "")))
+    Path(path).write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report driver package sizes against a baseline and budget")
+    parser.add_argument("--driver", "-d", action="append", dest="drivers", help="only measure this driver (repeatable)")
+    parser.add_argument("--verbose", "-v", action="store_true", help="show each package's size breakdown")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="the stored package sizes")
+    parser.add_argument("--update-baseline", action="store_true", help="write this run's sizes to the baseline")
+    parser.add_argument("--max-growth", type=float, default=5.0, metavar="PERCENT", help="allowed growth over the baseline")
+    parser.add_argument("--max-growth-bytes", type=int, default=2048, metavar="BYTES", help="growth always allowed, in bytes")
+    parser.add_argument("--max-size", type=int, metavar="BYTES", help="largest package allowed")
+    parser.add_argument("--prune", choices=driver_package.PRUNE_CHOICES, help="measure with unreferenced files left out")
+    parser.add_argument("--markdown", type=Path, help="write the report as a markdown comment")
+    args = parser.parse_args(argv)
+
+    drivers = set(args.drivers or [])
+    drivers.update(changed_drivers(os.environ.get("ALL_CHANGED_FILES", "").split()))
+    driver_dirs = [d for d in sorted(DRIVER_DIR.glob("*/*"), key=lambda d: d.name)
+                   if d.joinpath("config.yml").is_file() and (not drivers or d.name in drivers)]
+    baseline = load_baseline(args.baseline)
+    sizes = [measure_package(driver_dir, args.prune) for driver_dir in driver_dirs]
+
+    failures = {}
+    for size in sizes:
+        print("{:<40} {:>9} bytes  {:>16}  ({} uncompressed)".format(
+            size.driver, size.compressed, format_change(size.compressed, baseline.get(size.driver)), size.uncompressed))
+        if args.verbose:
+            for category, nbytes in sorted(size.breakdown.items(), key=lambda item: -item[1]):
+                print("    {:<48} {:>9}".format(category, nbytes))
+        problem = over_budget(size, baseline.get(size.driver), args.max_growth, args.max_growth_bytes, args.max_size)
+        if problem:
+            failures[size.driver] = problem
+    print("{} packages, {} bytes".format(len(sizes), sum(size.compressed for size in sizes)))
+
+    if args.markdown is not None:
+        write_markdown(args.markdown, sizes, baseline, failures)
+    if args.update_baseline:
+        save_baseline(args.baseline, sizes)
+    elif failures:
+        for driver, problem in failures.items():
+            print("{}: package {}".format(driver, problem))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,23 @@
 
 import os, sys
 import re
-import subprocess
 from collections import defaultdict
 import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import junit_xml
 import shutil
+from capability_cache import DriverCapabilityDirs
+import luacov_stats
+import diff_coverage
+import lua_profile
+from driver_test_lib import (QUARANTINE_FILE, discover_test_files, load_last_failed, load_quarantine, prioritize, quarantined,
+                             run_lua, run_test_files, save_last_failed, test_name_filter_args)
+import flaky_tests
+from capability_impact import impacted_test_files
+from junit_stream import DEFAULT_MAX_OUTPUT, JUnitStreamWriter, spill_dir_for
+from file_watch import FileWatcher
 
 VERBOSITY_TOTALS_ONLY = 0
 VERBOSITY_TEST_STATUS_ONLY = 1
@@ -18,42 +29,103 @@ DRIVER_DIR = Path(os.path.abspath(__file__)).parents[1].joinpath("drivers")
 LUACOV_CONFIG = DRIVER_DIR.parent.joinpath("tools", "config.luacov")
 
 def find_affected_tests(working_dir, changed_files):
-    affected_tests = []
-    if changed_files is not None:
-        for file in changed_files:
-            if "src" in file:
-                path = Path(working_dir).joinpath(file)
-                if path.parts[-1] != "src":
-                    path = [parent for parent in path.parents if parent.parts[-1] == "src"][0]
-                affected_tests.extend(path.rglob("test/test_*.lua"))
-
-    affected_tests = set(affected_tests)
+    """
+    The test files to run for changed files: a changed test file itself, and
+    every test file of a driver whose source, profiles, fingerprints or config
+    changed (or of a driver directory given directly).  Paths outside
+    drivers/<partner>/<driver>/ are skipped, and deleted files still select
+    their driver's tests.
+    """
+    affected_tests = set()
+    if changed_files is None:
+        return affected_tests
+    for file in changed_files:
+        path = Path(os.path.abspath(Path(working_dir).joinpath(file)))
+        try:
+            relative = path.relative_to(DRIVER_DIR)
+        except ValueError:
+            continue
+        if len(relative.parts) < 2:
+            continue
+        driver_dir = DRIVER_DIR.joinpath(*relative.parts[:2])
+        rest = relative.parts[2:]
+        if rest[:2] == ("src", "test") and path.name.startswith("test_") and path.suffix == ".lua":
+            if path.is_file():
+                affected_tests.add(path)
+            continue
+        # anything else in the driver, including helpers shared by its test files, can affect all of them
+        affected_tests.update(driver_dir.glob("src/test/test_*.lua"))
     return affected_tests
 
-def run_tests(verbosity_level, filter, junit, coverage_files, html):
+def print_failures(test_file, failures):
+    print("Unit test failures in {}:".format(test_file))
+    for failed_test in failures:
+        print("    {}".format(failed_test))
+
+def run_tests(verbosity_level, filter, junit, coverage_files, html, diff_changes=None, failed_first=False, max_failures=None, test_filter=None, timeout=None, memory_limit=None, profile=False, quarantine=None, junit_max_output=DEFAULT_MAX_OUTPUT, only_files=None):
     owd = os.getcwd()
     coverage_files = find_affected_tests(owd, coverage_files)
     failure_files = defaultdict(list)
-    ts = []
+    # each test file's suite is written as soon as it finishes rather than kept until the end
+    junit_writer = JUnitStreamWriter(junit, junit_max_output, spill_dir_for(junit)) if junit is not None else None
+    # failures of tests in the quarantine list are reported but don't fail the run
+    quarantine = quarantine or {}
+    quarantined_files = defaultdict(list)
     total_tests = 0
     total_passes = 0
-    drivers_needing_html = {}
+    coverage_stats = defaultdict(list)
     # Propagate ST_CAPABILITY_JSON_DIR so the mock capability channel can load
     # capability definitions from pre-fetched JSON files produced by
-    # tools/fetch_capability_definitions.py.
+    # tools/fetch_capability_definitions.py. When ST_CAPABILITY_MANIFEST_DIR is
+    # also set, each driver's tests only get the capabilities that driver uses.
     env = os.environ.copy()
-    for test_file in DRIVER_DIR.glob("*" + os.path.sep + "*" + os.path.sep + "src" + os.path.sep + "test" + os.path.sep + "test_*.lua"):
+    capability_dirs = DriverCapabilityDirs.from_env(env)
+    lua_args = []
+    if test_filter is not None:
+        # the harness only registers the test cases whose name contains the filter
+        env["ST_TEST_NAME_FILTER"] = test_filter
+        lua_args = test_name_filter_args()
+    if profile:
+        # only this run's samples go into the report
+        shutil.rmtree(lua_profile.DEFAULT_STACKS_DIR, ignore_errors=True)
+    test_files = DRIVER_DIR.glob("*" + os.path.sep + "*" + os.path.sep + "src" + os.path.sep + "test" + os.path.sep + "test_*.lua")
+    if failed_first:
+        test_files = prioritize(test_files, load_last_failed())
+    # failures are printed as they happen when iterating quickly
+    stream_failures = failed_first or max_failures is not None
+    ran_files = []
+    failed_tests = 0
+    for test_file in test_files:
+        if max_failures is not None and failed_tests >= max_failures:
+            print("Stopping after {} failures".format(failed_tests))
+            break
         if filter != None and re.search(filter, str(test_file)) is None:
             continue
-        os.chdir(test_file.parents[1])
+        # diff coverage only needs the tests of drivers whose source changed
+        if diff_changes is not None and test_file not in coverage_files:
+            continue
+        # e.g. only the tests impacted by changed capability definitions
+        if only_files is not None and test_file not in only_files:
+            continue
+        if capability_dirs is not None:
+            env["ST_CAPABILITY_JSON_DIR"] = str(capability_dirs.for_driver(test_file.parts[-4]))
         test_line = "## Running tests from {}".format(test_file)
         print("#" * len(test_line))
         print(test_line)
         if test_file in coverage_files:
-            a = subprocess.run("lua -lluacov {}".format(test_file), stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True, env=env)
+            # each test file gets its own luacov stats file; they are merged per driver below
+            stats_file = luacov_stats.stats_path(luacov_stats.DEFAULT_STATS_DIR, test_file)
+            stats_file.parent.mkdir(parents=True, exist_ok=True)
+            stats_file.unlink(missing_ok=True)
+            coverage_stats[test_file.parents[1]].append(stats_file)
+            a = run_lua([*lua_args, *luacov_stats.coverage_lua_args(stats_file), str(test_file)], test_file.parents[1], env, timeout, memory_limit)
+        elif profile:
+            stacks_file = lua_profile.stacks_path(lua_profile.DEFAULT_STACKS_DIR, test_file)
+            stacks_file.parent.mkdir(parents=True, exist_ok=True)
+            a = run_lua([*lua_args, *lua_profile.profile_lua_args(stacks_file), str(test_file)], test_file.parents[1], env, timeout, memory_limit)
         else:
-            a = subprocess.run("lua {}".format(test_file), stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True, env=env)
-        lines = a.stdout.decode().split("\n")
+            a = run_lua([*lua_args, str(test_file)], test_file.parents[1], env, timeout, memory_limit)
+        lines = a.stdout.split("\n")
         test_count = 0
         passes = 0
         last_line = ""
@@ -62,6 +134,8 @@ def run_tests(verbosity_level, filter, junit, coverage_files, html):
         test_file_name = os.path.basename(test_file)
         test_suite_name = os.path.splitext(test_file_name)[0].replace('_', ' ')
         test_suite = junit_xml.TestSuite(test_suite_name)
+        # peak memory and CPU time of the test file's lua process
+        test_suite.properties = a.properties()
         test_case = None
         test_logs = ""
         test_title = ""
@@ -98,11 +172,15 @@ def run_tests(verbosity_level, filter, junit, coverage_files, html):
                 test_done = True
                 test_status = line
                 failure_string = f"{in_progress_test_name} [line {test_case.line}]"
-                failure_files[test_file].append(failure_string)
-                if "traceback" in test_case.stdout:
-                    test_case.add_error_info(line, test_case.stdout)
+                if quarantined(quarantine, test_file, in_progress_test_name):
+                    quarantined_files[test_file].append(failure_string)
+                    test_case.add_skipped_info("quarantined as flaky: " + line, test_case.stdout)
                 else:
-                    test_case.add_failure_info(line, test_case.stdout)
+                    failure_files[test_file].append(failure_string)
+                    if "traceback" in test_case.stdout:
+                        test_case.add_error_info(line, test_case.stdout)
+                    else:
+                        test_case.add_failure_info(line, test_case.stdout)
                 test_cases.append(test_case)
                 test_case = None
             if test_done:
@@ -126,9 +204,16 @@ def run_tests(verbosity_level, filter, junit, coverage_files, html):
 
         m = re.match(r"Passed (\d+) of (\d+) tests", last_line)
         if m is None:
-            failure_files[test_file].append("\n    ".join(a.stderr.decode().split("\n")))
+            stderr = a.stderr
+            if a.timed_out:
+                stderr = "Timed out after {} seconds\n{}".format(timeout, stderr)
             test_case = junit_xml.TestCase(test_suite.name)
-            test_case.add_error_info("FAILED", a.stderr.decode())
+            if quarantined(quarantine, test_file):
+                quarantined_files[test_file].append("\n    ".join(stderr.split("\n")))
+                test_case.add_skipped_info("quarantined as flaky: FAILED", stderr)
+            else:
+                failure_files[test_file].append("\n    ".join(stderr.split("\n")))
+                test_case.add_error_info("FAILED", stderr)
             test_cases.append(test_case)
             test_case = None
         else:
@@ -136,64 +221,161 @@ def run_tests(verbosity_level, filter, junit, coverage_files, html):
                 print(last_line)
             if int(m.group(1)) != passes or int(m.group(2)) != test_count:
                 failure_files[test_file].append("Unexpected difference in test counts")
+            elif a.returncode != 0 and test_file not in failure_files and test_file not in quarantined_files:
+                # the harness finished but lua still failed, e.g. while shutting down
+                failure_files[test_file].append("Exited with status {}\n    {}".format(a.returncode, "\n    ".join(a.stderr.split("\n"))))
+                test_case = junit_xml.TestCase("(crash) {}".format(test_suite.name))
+                test_case.add_error_info("FAILED", "Exited with status {}\n{}".format(a.returncode, a.stderr))
+                test_cases.append(test_case)
+                test_case = None
 
         print("#" * len(test_line))
+        ran_files.append(test_file)
         total_tests += test_count
         total_passes += passes
+        failed_tests += len(failure_files[test_file]) if test_file in failure_files else 0
+        if stream_failures and test_file in failure_files:
+            print_failures(test_file, failure_files[test_file])
         test_suite.test_cases = test_cases
-        ts.append(test_suite)
-        if test_file in coverage_files:
-            if html:
-                driver_name = test_file.parts[-4]
-                src_path = test_file.parents[1]
-                drivers_needing_html[driver_name] = src_path
-            else:
-                subprocess.run("luacov -c={}".format(LUACOV_CONFIG), shell=True)
+        if junit_writer is not None:
+            junit_writer.write_suite(test_suite)
+
+    if capability_dirs is not None:
+        capability_dirs.cleanup()
 
-    if drivers_needing_html:
+    if coverage_stats and html:
         coverage_html_dir = DRIVER_DIR.parent.joinpath("tools/coverage_output_html")
         try:
             os.mkdir(coverage_html_dir)
         except FileExistsError:
             pass
 
-        for driver_name, src_path in drivers_needing_html.items():
-            os.chdir(src_path)
-            subprocess.run("luacov -c {} --reporter html".format(LUACOV_CONFIG), shell=True)
-            html_source = Path("luacov.report.out")
-            html_dest = coverage_html_dir.joinpath(driver_name+"_luacov.report.html")
-            if html_source.exists():
-                shutil.copy(html_source, html_dest)
-            else:
-                print(f"Warning: HTML coverage file for {driver_name} not found")
+    if diff_changes is not None:
+        # changed lines only, read straight from the stats; no whole-file luacov reports
+        diff_coverage.report(None, changes=diff_changes)
+    else:
+        # merge each driver's per-test-file stats, then report once per driver
+        for src_path, stats_files in coverage_stats.items():
+            html_dest = coverage_html_dir.joinpath(src_path.parts[-2]+"_luacov.report.html") if html else None
+            luacov_stats.report_driver(src_path, stats_files, html=html_dest)
+
+    if profile:
+        lua_profile.report()
 
     total_test_info = "Total unit tests passes: {}/{}".format(total_passes, total_tests)
     print("#" * len(total_test_info))
     print(total_test_info)
     print("#" * len(total_test_info))
 
-    os.chdir(owd)
-    if junit is not None:
-        with open(junit, 'w+') as outfile:
-            junit_xml.to_xml_report_file(outfile, ts)
+    if junit_writer is not None:
+        junit_writer.close()
 
-    for f in failure_files.keys():
-        print("Unit test failures in {}:".format(f))
-        for failed_test in failure_files[f]:
+    save_last_failed(ran_files, failure_files.keys())
+
+    for f in quarantined_files.keys():
+        print("Quarantined failures (not failing the run) in {}:".format(f))
+        for failed_test in quarantined_files[f]:
             print("    {}".format(failed_test))
 
+    for f in failure_files.keys():
+        print_failures(f, failure_files[f])
+
     if len(failure_files.keys()) > 0:
         sys.exit(1)
 
+def print_watch_result(result):
+    passed = len(result.passing())
+    status = "FAIL" if result.failed else "PASS"
+    print("{} {} {} ({}/{}) {:.1f}s".format(status, result.driver, result.test_file.name, passed, len(result.cases), result.duration))
+    for name in result.failing():
+        print("     {}".format(name))
+    if result.timed_out:
+        print("     timed out")
+    elif len(result.cases) == 0 and result.stderr != "":
+        for line in result.stderr.strip().split("\n")[-5:]:
+            print("     {}".format(line))
+    elif result.crashed:
+        print("     exited with status {}".format(result.returncode))
+        for line in result.stderr.strip().split("\n")[-5:]:
+            print("     {}".format(line))
+
+def watch_tests(filter, test_filter=None, jobs=None, timeout=None, memory_limit=None, debounce=0.2, polling=False):
+    """Rerun the test files affected by each change under drivers/ until interrupted."""
+    env = os.environ.copy()
+    lua_args = []
+    if test_filter is not None:
+        env["ST_TEST_NAME_FILTER"] = test_filter
+        lua_args = test_name_filter_args()
+    capability_dirs = DriverCapabilityDirs.from_env(env)
+
+    def env_for(test_file):
+        if capability_dirs is None:
+            return env
+        file_env = dict(env)
+        file_env["ST_CAPABILITY_JSON_DIR"] = str(capability_dirs.for_driver(test_file.parts[-4]))
+        return file_env
+
+    def selected(test_files):
+        return sorted(f for f in test_files if filter is None or re.search(filter, str(f)) is not None)
+
+    # the worker threads and capability directories are set up once and reused by every rerun
+    with FileWatcher(DRIVER_DIR, polling) as watcher, ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as executor:
+        print("Watching {} for changes ({}), Ctrl-C to stop".format(DRIVER_DIR, watcher.method))
+        pending = selected(discover_test_files(filter)) if filter is not None else []
+        try:
+            while True:
+                if pending:
+                    start = time.monotonic()
+                    results = []
+                    for result in run_test_files(pending, lua_args=lua_args, env_for=env_for, timeout=timeout,
+                                                 memory_limit=memory_limit, executor=executor):
+                        print_watch_result(result)
+                        results.append(result)
+                    failed = [r.test_file for r in results if r.failed]
+                    save_last_failed(pending, failed)
+                    print("Passed {} of {} tests in {} files ({} failed) in {:.1f}s".format(
+                        sum(len(r.passing()) for r in results), sum(len(r.cases) for r in results),
+                        len(results), len(failed), time.monotonic() - start))
+                changed = watcher.wait(debounce)
+                if watcher.overflowed:
+                    print("Lost track of file changes, rerunning every selected test file")
+                    pending = selected(discover_test_files(filter))
+                    continue
+                pending = selected(find_affected_tests(os.getcwd(), changed))
+                names = sorted(str(path.relative_to(DRIVER_DIR)) if DRIVER_DIR in path.parents else str(path) for path in changed)
+                print("--- {}{}: {} test files".format(names[0], " (+{} more)".format(len(names) - 1) if len(names) > 1 else "", len(pending)))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if capability_dirs is not None:
+                capability_dirs.cleanup()
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run all driver tests found in sub directories")
     parser.add_argument("--verbose", "-v", action="store_true", help="print individual test names and pass status")
     parser.add_argument("--extraverbose", "-vv", action="store_true", help="print individual test names and pass status with full logs on failures")
     parser.add_argument("--superextraverbose", "-vvv", action="store_true", help="print all logs from all tests")
     parser.add_argument("--filter", "-f",  type=str, nargs="?", help="only run tests containing the filter value in the path")
-    parser.add_argument("--junit", "-j", type=str, nargs="?", help="output test results in JUnit XML to the specified file")
+    parser.add_argument("--junit", "-j", type=str, nargs="?", help="output test results in JUnit XML to the specified file, written as each test file finishes (gzip-compressed if it ends in .gz)")
+    parser.add_argument("--junit-max-output", type=int, default=DEFAULT_MAX_OUTPUT, metavar="CHARS", help="cut captured output longer than CHARS in the JUnit report, keeping the whole of it in a directory next to the report (0: no limit)")
     parser.add_argument("--coverage", "-c", nargs="*", help="run code tests with coverage (luacov must be installed) OPTIONAL: restrict files to run coverage tests for")
     parser.add_argument("--html", action="store_true", help="Generate HTML coverage reports for the files specified by the coverage argument")
+    parser.add_argument("--diff-coverage", "-d", type=str, metavar="REF", help="run the tests of drivers changed since the git ref REF with coverage and report coverage of the changed lines only")
+    parser.add_argument("--test-filter", "-t", type=str, metavar="NAME", help="only run the test cases whose name contains NAME (in the test files selected by --filter)")
+    parser.add_argument("--timeout", type=float, metavar="SECONDS", help="kill a test file's lua process after SECONDS and report the file as failed")
+    parser.add_argument("--memory-limit", type=int, metavar="MB", help="cap each test file's lua process at MB MiB of address space (Linux)")
+    parser.add_argument("--profile", "-p", action="store_true", help="sample each test file with tools/lua/profiler.lua and report the hottest functions across all files (not with coverage)")
+    parser.add_argument("--watch", "-w", action="store_true", help="watch drivers/ and rerun the test files affected by each saved change (those matching --filter, which are also run first)")
+    parser.add_argument("--jobs", type=int, help="test files to run at once in --watch and --repeat modes (default: number of CPUs)")
+    parser.add_argument("--debounce", type=float, default=0.2, metavar="SECONDS", help="in --watch mode, wait until files have stopped changing for SECONDS")
+    parser.add_argument("--poll", action="store_true", help="in --watch mode, poll for changes instead of using inotify")
+    parser.add_argument("--failed-first", "-F", action="store_true", help="run the test files that failed last time and those of drivers with uncommitted changes first, printing failures as they happen")
+    parser.add_argument("--max-failures", "-x", type=int, metavar="N", help="stop starting new test files after N test failures")
+    parser.add_argument("--capability-changes", nargs="+", metavar="CAPABILITY", help="only run the test files of drivers using these changed capability definitions (<id>_<version>.json files or capability ids; see tools/capability_impact.py)")
+    parser.add_argument("--repeat", "-n", type=int, metavar="N", help="run the selected test files N times each, --jobs at once, and report flaky tests (see tools/flaky_tests.py)")
+    parser.add_argument("--write-quarantine", action="store_true", help="with --repeat, write the flaky tests found to the quarantine list")
+    parser.add_argument("--quarantine", type=Path, default=QUARANTINE_FILE, metavar="FILE", help="report failures of the tests listed in FILE without failing the run (default: tools/test_quarantine.json, if present)")
+    parser.add_argument("--no-quarantine", action="store_true", help="fail on quarantined tests too")
     args = parser.parse_args()
     verbosity_level = 0
     if args.verbose:
@@ -202,4 +384,29 @@ if __name__ == "__main__":
         verbosity_level = 2
     elif args.superextraverbose:
         verbosity_level = 3
-    run_tests(verbosity_level, args.filter, args.junit, args.coverage, args.html)
+    if args.repeat is not None:
+        if args.repeat < 2:
+            parser.error("--repeat must be at least 2")
+        test_files = discover_test_files(args.filter)
+        if not test_files:
+            parser.error("no test files match --filter")
+        report = flaky_tests.run(test_files, args.repeat, args.jobs, args.test_filter, args.timeout, args.memory_limit,
+                                 quarantine_file=args.quarantine if args.write_quarantine else None)
+        # flaky tests are reported but don't fail the run; tests failing every time do
+        sys.exit(1 if report["failing"] else 0)
+    if args.watch:
+        watch_tests(args.filter, args.test_filter, args.jobs, args.timeout, args.memory_limit, args.debounce, args.poll)
+        sys.exit(0)
+    if args.profile and (args.coverage is not None or args.diff_coverage is not None):
+        # luacov and the profiler both need the debug hook
+        parser.error("--profile cannot be combined with --coverage or --diff-coverage")
+    diff_changes = None
+    if args.diff_coverage is not None:
+        diff_changes = diff_coverage.changed_lines(args.diff_coverage)
+        args.coverage = [str(path) for path in diff_changes]
+    only_files = None
+    if args.capability_changes:
+        only_files = set(impacted_test_files(args.capability_changes, drivers_dir=DRIVER_DIR))
+        print("{} test files use the changed capabilities".format(len(only_files)))
+    run_tests(verbosity_level, args.filter, args.junit, args.coverage, args.html, diff_changes, args.failed_first, args.max_failures, args.test_filter, args.timeout, args.memory_limit, args.profile,
+              None if args.no_quarantine else load_quarantine(args.quarantine), args.junit_max_output, only_files)
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# Copyright 2026 SmartThings
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""run_driver_tests_live.py
+
+Runs driver test files concurrently from a single asyncio supervisor and shows
+live progress: overall files and tests done, an ETA, and per-driver counts of
+running, passed and failed tests.  Failures are printed as they happen.  Writes
+the same tools/test_output/<driver>_test_output.xml JUnit files as
+run_driver_tests_p.py.
+
+Usage
+-----
+    python3 tools/run_driver_tests_live.py [--filter REGEX] [--driver NAME ...]
+        [--jobs N] [--timeout SECONDS] [--memory-limit MB]
+        [--timings test_timings.json] [--record-timings test_timings.json]
+        [--quarantine FILE | --no-quarantine]
+
+The ETA starts from the per-file durations in --timings (see
+tools/test_shards.py; files without one are estimated from their size) and is
+corrected by how fast this run has been going so far.  When stdout is not a
+terminal, a progress line is printed every few seconds instead of the
+dashboard.
+
+Failures of the tests in the quarantine list (tools/test_quarantine.json, see
+tools/flaky_tests.py) are printed and reported as skipped, but don't fail
+the run, as in the other runners.
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Set
+
+import test_shards
+from capability_cache import DriverCapabilityDirs
+from driver_test_lib import (DRIVER_DIR, QUARANTINE_FILE, TestFileResult, discover_test_files, load_quarantine,
+                             quarantined, run_test_files_async, save_last_failed, test_name_filter_args)
+from junit_stream import JUnitStreamWriter, spill_dir_for
+
+TEST_OUTPUT_DIR = DRIVER_DIR.parent.joinpath("tools", "test_output")
+REFRESH_INTERVAL = 0.25
+PLAIN_PROGRESS_INTERVAL = 5.0
+
+
+class DriverProgress:
+    def __init__(self, total_files: int):
+        self.total_files = total_files
+        self.running = 0
+        self.done = 0
+        self.passed = 0
+        self.failed = 0
+        self.results: List[TestFileResult] = []
+
+
+class Progress:
+    """Run state shared between the supervisor and the display."""
+
+    def __init__(self, test_files: List[Path], estimates: Dict[Path, float], jobs: int,
+                 quarantine: Optional[Mapping[Path, Set[str]]] = None):
+        self.estimates = estimates
+        self.quarantine = quarantine or {}
+        self.jobs = jobs
+        self.start = time.monotonic()
+        self.drivers: Dict[str, DriverProgress] = {}
+        counts = defaultdict(int)
+        for test_file in test_files:
+            counts[test_file.parts[-4]] += 1
+        for driver, count in sorted(counts.items()):
+            self.drivers[driver] = DriverProgress(count)
+        self.total_files = len(test_files)
+        self.done_files = 0
+        self.passed = 0
+        self.failed = 0
+        self.remaining_estimate = sum(estimates.values())
+        self.done_estimate = 0.0
+
+    def started(self, test_file: Path) -> None:
+        self.drivers[test_file.parts[-4]].running += 1
+
+    def finished(self, result: TestFileResult) -> None:
+        driver = self.drivers[result.driver]
+        driver.running -= 1
+        driver.done += 1
+        driver.results.append(result)
+        passed = len(result.passing())
+        failed = len(result.failing(self.quarantine))
+        if result.failed_with(self.quarantine) and failed == 0:
+            # the file errored or timed out outside of any test case
+            failed = 1
+        driver.passed += passed
+        driver.failed += failed
+        self.passed += passed
+        self.failed += failed
+        self.done_files += 1
+        estimate = self.estimates.get(result.test_file, 0.0)
+        self.remaining_estimate -= estimate
+        self.done_estimate += estimate
+
+    def eta(self) -> Optional[float]:
+        """Seconds left: the remaining estimate, scaled by how this run compares to the estimates."""
+        if self.done_files == self.total_files:
+            return 0.0
+        elapsed = time.monotonic() - self.start
+        if self.done_estimate > 0 and elapsed > 1.0:
+            return max(0.0, self.remaining_estimate * elapsed / self.done_estimate)
+        return self.remaining_estimate / self.jobs if self.remaining_estimate > 0 else None
+
+    def summary_line(self) -> str:
+        elapsed = time.monotonic() - self.start
+        eta = self.eta()
+        running = sum(d.running for d in self.drivers.values())
+        return "files {}/{}  running {}  passed {}  failed {}  elapsed {}  eta {}".format(
+            self.done_files, self.total_files, running, self.passed, self.failed,
+            format_seconds(elapsed), format_seconds(eta) if eta is not None else "?")
+
+
+def format_seconds(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds + 0.5), 60)
+    return "{}:{:02d}".format(minutes, seconds)
+
+
+class Dashboard:
+    """Redraws the progress block in place at the bottom of a terminal."""
+
+    def __init__(self, progress: Progress):
+        self.progress = progress
+        self.lines_drawn = 0
+
+    def clear(self) -> None:
+        if self.lines_drawn:
+            sys.stdout.write("\x1b[{}F\x1b[J".format(self.lines_drawn))
+            self.lines_drawn = 0
+
+    def draw(self) -> None:
+        self.clear()
+        width, height = shutil.get_terminal_size()
+        lines = [self.progress.summary_line()[:width]]
+        # drivers with running files first, then those with failures
+        active = [(name, d) for name, d in self.progress.drivers.items() if d.running or d.failed]
+        active.sort(key=lambda item: (item[1].running == 0, item[0]))
+        for name, driver in active[:max(0, height // 2 - 2)]:
+            lines.append("  {:<40} files {:>3}/{:<3} running {:>2}  passed {:>4}  failed {:>3}".format(
+                name[:40], driver.done, driver.total_files, driver.running, driver.passed, driver.failed)[:width])
+        if len(active) > height // 2 - 2 > 0:
+            lines.append("  ... {} more drivers".format(len(active) - (height // 2 - 2)))
+        sys.stdout.write("\n".join(lines) + "\n")
+        sys.stdout.flush()
+        self.lines_drawn = len(lines)
+
+    def print_above(self, text: str) -> None:
+        self.clear()
+        print(text)
+        self.draw()
+
+
+def failure_text(result: TestFileResult, quarantine: Optional[Mapping[Path, Set[str]]] = None) -> str:
+    quarantine = quarantine or {}
+    lines = ["{}: {}".format(result.driver, result.test_file.name)]
+    for name in result.failing(quarantine):
+        lines.append("\t{} FAILED on {}".format(result.suite_name, name))
+    for name in result.quarantined_failures(quarantine):
+        lines.append("\t{} QUARANTINED failure of {}".format(result.suite_name, name))
+    if result.errored and quarantined(quarantine, result.test_file):
+        lines.append("\t{} QUARANTINED failure: test file failed to run".format(result.suite_name))
+    elif result.timed_out:
+        lines.append("\t{} ERROR: timed out after {:.1f} seconds".format(result.suite_name, result.duration))
+    elif len(result.cases) == 0 and result.stderr != "":
+        lines.append("\t{} ERROR: test file failed to run".format(result.suite_name))
+        lines.extend("\t  " + line for line in result.stderr.strip().splitlines()[-10:])
+    elif result.crashed:
+        lines.append("\t{} ERROR: exited with status {} after {} tests".format(result.suite_name, result.returncode, len(result.cases)))
+        lines.extend("\t  " + line for line in result.stderr.strip().splitlines()[-10:])
+    return "\n".join(lines)
+
+
+def write_junit(driver: str, results: List[TestFileResult], quarantine: Optional[Mapping[Path, Set[str]]] = None) -> None:
+    results = sorted(results, key=lambda r: r.test_file)
+    junit_file = TEST_OUTPUT_DIR.joinpath(driver + "_test_output.xml")
+    with JUnitStreamWriter(junit_file, spill_dir=spill_dir_for(junit_file)) as writer:
+        for r in results:
+            writer.write_suite(r.junit_suite(quarantine))
+
+
+async def run(args) -> int:
+    test_files = discover_test_files(args.filter, args.drivers)
+    if not test_files:
+        print("No test files found")
+        return 1
+    jobs = args.jobs or os.cpu_count()
+    estimates = test_shards.estimate_durations(test_files, test_shards.load_timings(args.timings))
+    quarantine = {} if args.no_quarantine else load_quarantine(args.quarantine)
+    progress = Progress(test_files, estimates, jobs, quarantine)
+    dashboard = Dashboard(progress) if sys.stdout.isatty() else None
+    TEST_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
+    env = os.environ.copy()
+    lua_args = []
+    if args.test_filter is not None:
+        env["ST_TEST_NAME_FILTER"] = args.test_filter
+        lua_args = test_name_filter_args()
+    # same per-driver capability definitions as the other runners
+    capability_dirs = DriverCapabilityDirs.from_env(env)
+
+    def env_for(test_file):
+        if capability_dirs is None:
+            return env
+        file_env = dict(env)
+        file_env["ST_CAPABILITY_JSON_DIR"] = str(capability_dirs.for_driver(test_file.parts[-4]))
+        return file_env
+
+    async def refresh():
+        while True:
+            await asyncio.sleep(REFRESH_INTERVAL if dashboard else PLAIN_PROGRESS_INTERVAL)
+            if dashboard:
+                dashboard.draw()
+            else:
+                print(progress.summary_line(), flush=True)
+
+    refresher = asyncio.ensure_future(refresh())
+    failed_files = []
+    try:
+        async for result in run_test_files_async(test_files, jobs, lua_args, env_for, args.timeout,
+                                                 args.memory_limit, on_start=progress.started):
+            progress.finished(result)
+            if result.failed_with(quarantine):
+                failed_files.append(result.test_file)
+            # quarantined failures are printed too, but don't fail the run
+            if result.failed:
+                if dashboard:
+                    dashboard.print_above(failure_text(result, quarantine))
+                else:
+                    print(failure_text(result, quarantine), flush=True)
+            driver = progress.drivers[result.driver]
+            if driver.done == driver.total_files:
+                write_junit(result.driver, driver.results, quarantine)
+    finally:
+        refresher.cancel()
+        if capability_dirs is not None:
+            capability_dirs.cleanup()
+
+    if dashboard:
+        dashboard.draw()
+    else:
+        print(progress.summary_line())
+    save_last_failed(test_files, failed_files)
+    if args.record_timings is not None:
+        test_shards.save_timings(args.record_timings, {r.test_file: r.duration for d in progress.drivers.values() for r in d.results})
+
+    total_line = "Total unit tests passes: {}/{}".format(progress.passed, progress.passed + progress.failed)
+    print("#" * len(total_line))
+    print(total_line)
+    print("#" * len(total_line))
+    return 1 if failed_files else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run driver tests concurrently with a live progress view")
+    parser.add_argument("--filter", "-f", help="only run test files whose path matches this regex")
+    parser.add_argument("--driver", "-d", action="append", dest="drivers", help="only run this driver's tests (repeatable)")
+    parser.add_argument("--test-filter", "-t", metavar="NAME", help="only run the test cases whose name contains NAME")
+    parser.add_argument("--jobs", "-j", type=int, help="test files to run at once (default: number of CPUs)")
+    parser.add_argument("--timeout", type=float, metavar="SECONDS", help="kill a test file's lua process after SECONDS")
+    parser.add_argument("--memory-limit", type=int, metavar="MB", help="cap each lua process at MB MiB of address space (Linux)")
+    parser.add_argument("--timings", type=Path, help="per-file durations from an earlier run, for the ETA")
+    parser.add_argument("--record-timings", type=Path, help="write this run's per-file durations to this file")
+    parser.add_argument("--quarantine", type=Path, default=QUARANTINE_FILE, metavar="FILE", help="report failures of the tests listed in FILE without failing the run (default: tools/test_quarantine.json, if present)")
+    parser.add_argument("--no-quarantine", action="store_true", help="fail on quarantined tests too")
+    args = parser.parse_args(argv)
+    try:
+        sys.exit(asyncio.run(run(args)))
+    except KeyboardInterrupt:
+        sys.exit(130)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,58 +1,138 @@
 #!/usr/bin/env python3
 
-import subprocess, junit_xml, os, sys
+import junit_xml, os, shutil, sys
+import argparse
 from pathlib import Path
-from multiprocessing import Pool
+from multiprocessing import Pool, Value
 import regex as re # supports multi-threading
+from capability_cache import DriverCapabilityDirs
+import luacov_stats
+import lua_profile
+import test_shards
+from capability_impact import impacted_test_files
+from junit_stream import DEFAULT_MAX_OUTPUT, JUnitStreamWriter, spill_dir_for
+from driver_test_lib import QUARANTINE_FILE, load_last_failed, load_quarantine, prioritize, quarantined, run_lua, save_last_failed
 
 test_case_re = re.compile("Running test \"(.*?)\".+?-{2,}.*?(PASSED|FAILED)", flags=re.DOTALL)
 LUACOV_CONFIG = Path(os.path.abspath(__file__)).parent.joinpath("config.luacov")
 DRIVER_DIRS = Path(os.path.abspath(__file__)).parents[1].joinpath("drivers")
 DRIVERS = [driver for driver in DRIVER_DIRS.glob("*/*") if driver.is_dir()] # this gets all the children of the children of the drivers directory
-CHANGED_DRIVERS = [Path(driver).name for driver in sys.argv[1:]]
+
+class RunConfig:
+  """This run's settings. Pool workers get them from init_worker, so they hold under any start method, not only fork."""
+  def __init__(self):
+    # Drivers to collect coverage for
+    self.changed_drivers = []
+    # Per-driver capability directories
+    self.capability_dirs = None
+    # When sharding, the test files this shard runs, and the suffix of its JUnit file names
+    self.shard_files = None
+    self.shard_suffix = ""
+    # With --capability-changes, only the test files impacted by the changed capability definitions
+    self.selected_files = None
+    # With --failed-first, the position of each test file in the prioritized run order
+    self.file_order = None
+    # With --max-failures, no new test files are started once failure_count (shared by every worker) reaches max_failures
+    self.max_failures = None
+    self.failure_count = None
+    self.stream_failures = False
+    # Per test file limits: seconds before the lua process is killed, and MiB of address space
+    self.timeout = None
+    self.memory_limit = None
+    # With --profile, every test file runs under tools/lua/profiler.lua
+    self.profile = False
+    # Known flaky tests, from tools/flaky_tests.py: their failures are printed but don't fail the run
+    self.quarantine = {}
+    # JUnit reports: gzip-compressed or not, and how much of each captured output to keep in them
+    self.junit_suffix = ".xml"
+    self.junit_max_output = DEFAULT_MAX_OUTPUT
+
+CONFIG = RunConfig()
+
+def init_worker(config):
+  global CONFIG
+  CONFIG = config
 
 def per_driver_task(driver_dir):
-  os.chdir(driver_dir.joinpath('src'))
-  results = map(run_test, driver_dir.glob("src/test/test_*.lua"))
-  successes, failures, failure_output, test_suites = 0, 0, "", []
-  for result in results:
-    test_suites.append(result[0])
+  test_files = [test_file for test_file in driver_dir.glob("src/test/test_*.lua") if (CONFIG.shard_files is None or test_file in CONFIG.shard_files) and (CONFIG.selected_files is None or test_file in CONFIG.selected_files)]
+  if CONFIG.file_order is not None:
+    test_files.sort(key=CONFIG.file_order.get)
+  if len(test_files) == 0:
+    return (None, {}, [])
+  successes, failures, failure_output, durations, failed_files = 0, 0, "", {}, []
+  # suites are written as each test file finishes, so partial results survive a killed run
+  junit_writer = None
+  for test_file in test_files:
+    if CONFIG.max_failures is not None and CONFIG.failure_count.value >= CONFIG.max_failures:
+      break
+    result = run_test(test_file)
+    if junit_writer is None:
+      junit_file = driver_dir.parent.parent.parent.joinpath("tools/test_output/").joinpath(driver_dir.name+CONFIG.shard_suffix+"_test_output"+CONFIG.junit_suffix)
+      junit_writer = JUnitStreamWriter(junit_file, CONFIG.junit_max_output, spill_dir_for(junit_file))
+    junit_writer.write_suite(result[0])
     successes += result[1]
     failures += result[2]
     if result[3] != "":
       failure_output += result[3] + '\n'
-  with open(driver_dir.parent.parent.parent.joinpath("tools/test_output/").joinpath(driver_dir.name+"_test_output.xml"), 'w+') as outfile:
-    junit_xml.to_xml_report_file(outfile, test_suites)
+      failed_files.append(test_file)
+      if CONFIG.stream_failures:
+        print(driver_dir.name + ": \n" + result[3], flush=True)
+    if result[2] and CONFIG.failure_count is not None:
+      with CONFIG.failure_count.get_lock():
+        CONFIG.failure_count.value += result[2]
+    durations[test_file] = result[4]
+  if junit_writer is None:
+    return (None, {}, [])
+  junit_writer.close()
   print("{}: passed {} of {} tests".format(driver_dir.name, successes, successes+failures))
   if failure_output != "":
     failure_output = driver_dir.name + ": \n" + failure_output
   else:
     failure_output = None
-  if driver_dir.name in CHANGED_DRIVERS:
+  if driver_dir.name in CONFIG.changed_drivers and CONFIG.shard_files is None:
+    # merge the per-test-file stats written by run_test into one report for the driver
     outfile = driver_dir.parent.parent.parent.joinpath("tools/coverage_output").joinpath(driver_dir.name+"_coverage.xml")
-    subprocess.run("luacov-cobertura -o {} -c {}".format(outfile, LUACOV_CONFIG), shell=True)
-  return failure_output
+    stats_files = [luacov_stats.stats_path(luacov_stats.DEFAULT_STATS_DIR, test_file) for test_file in driver_dir.glob("src/test/test_*.lua")]
+    luacov_stats.report_driver(driver_dir.joinpath('src'), stats_files, cobertura=outfile)
+  return (failure_output, durations, failed_files)
 
 def run_test(test_file):
   # Propagate ST_CAPABILITY_JSON_DIR so the mock capability channel can load
   # capability definitions from pre-fetched JSON files produced by
-  # tools/fetch_capability_definitions.py.
+  # tools/fetch_capability_definitions.py. When ST_CAPABILITY_MANIFEST_DIR is
+  # also set, each driver's tests only get the capabilities that driver uses.
   env = os.environ.copy()
-  if test_file.parent.parent.parent.name in CHANGED_DRIVERS:
-    a = subprocess.run("lua -lluacov {}".format(test_file), stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True, env=env)
+  if CONFIG.capability_dirs is not None:
+    env["ST_CAPABILITY_JSON_DIR"] = str(CONFIG.capability_dirs.for_driver(test_file.parent.parent.parent.name))
+  if test_file.parent.parent.parent.name in CONFIG.changed_drivers:
+    # each test file writes its own luacov stats, so files can safely run concurrently
+    stats_file = luacov_stats.stats_path(luacov_stats.DEFAULT_STATS_DIR, test_file)
+    stats_file.parent.mkdir(parents=True, exist_ok=True)
+    stats_file.unlink(missing_ok=True)
+    a = run_lua([*luacov_stats.coverage_lua_args(stats_file), str(test_file)], test_file.parents[1], env, CONFIG.timeout, CONFIG.memory_limit)
+  elif CONFIG.profile:
+    stacks_file = lua_profile.stacks_path(lua_profile.DEFAULT_STACKS_DIR, test_file)
+    stacks_file.parent.mkdir(parents=True, exist_ok=True)
+    a = run_lua([*lua_profile.profile_lua_args(stacks_file), str(test_file)], test_file.parents[1], env, CONFIG.timeout, CONFIG.memory_limit)
   else:
-    a = subprocess.run("lua {}".format(test_file), stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True, env=env)
-  error = a.stderr.decode()
+    a = run_lua([str(test_file)], test_file.parents[1], env, CONFIG.timeout, CONFIG.memory_limit)
+  duration = a.duration
+  error = a.stderr
   if error and error != "":
     print(error)
-  parsed_output = a.stdout.decode()
+  parsed_output = a.stdout
   test_suite_name = str(test_file)[str(test_file).rindex('/')+1:-4].replace('_',' ')
   test_suite = junit_xml.TestSuite(test_suite_name)
+  # peak memory and CPU time of the test file's lua process
+  test_suite.properties = a.properties()
   successes, failures, failure_output, test_cases = 0, 0, "", []
   for match in test_case_re.finditer(parsed_output):
     test_case = junit_xml.TestCase(match[1])
     test_case.stdout = match[0]
-    if match[2] == "FAILED":
+    if match[2] == "FAILED" and quarantined(CONFIG.quarantine, test_file, match[1]):
+      print("\t{} QUARANTINED failure of {}".format(test_suite_name, match[1]))
+      test_case.add_skipped_info("quarantined as flaky: FAILED", match[0])
+    elif match[2] == "FAILED":
       failures += 1
       if "traceback" in match[0]:
         failure_output += "\t{} ERROR in {}\n".format(test_suite_name, match[1])
@@ -63,16 +143,81 @@ def run_test(test_file):
     else:
       successes += 1
     test_cases.append(test_case)
-  if error and error != "" and len(test_cases) == 0:
+  if ((error and error != "" and len(test_cases) == 0) or a.timed_out) and quarantined(CONFIG.quarantine, test_file):
+    print("\t{} QUARANTINED failure: test file failed to run".format(test_suite_name))
+    error_case = junit_xml.TestCase("(file error) {}".format(test_suite_name))
+    error_case.add_skipped_info("quarantined as flaky: ERROR", error or parsed_output[-4096:])
+    test_cases.append(error_case)
+  elif error and error != "" and len(test_cases) == 0:
     failure_output += "\t{} ERROR: test file failed to run\n".format(test_suite_name)
     error_case = junit_xml.TestCase("(file error) {}".format(test_suite_name))
     error_case.add_error_info("ERROR", error)
     test_cases.append(error_case)
     failures += 1
+  elif a.returncode != 0 and not a.timed_out and len(test_cases) > 0 and successes == len(test_cases):
+    # lua died partway through, after every test it got to had passed; a failed test, quarantined
+    # or not, already accounts for a non-zero exit
+    if quarantined(CONFIG.quarantine, test_file):
+      print("\t{} QUARANTINED failure: exited with status {}".format(test_suite_name, a.returncode))
+      crash_case = junit_xml.TestCase("(crash) {}".format(test_suite_name))
+      crash_case.add_skipped_info("quarantined as flaky: ERROR", error or parsed_output[-4096:])
+    else:
+      failure_output += "\t{} ERROR: exited with status {} after {} tests\n".format(test_suite_name, a.returncode, len(test_cases))
+      crash_case = junit_xml.TestCase("(crash) {}".format(test_suite_name))
+      crash_case.add_error_info("ERROR", error or parsed_output[-4096:])
+      failures += 1
+    test_cases.append(crash_case)
+  if a.timed_out and not quarantined(CONFIG.quarantine, test_file):
+    failure_output += "\t{} ERROR: timed out after {} seconds\n".format(test_suite_name, CONFIG.timeout)
+    timeout_case = junit_xml.TestCase("(timeout) {}".format(test_suite_name))
+    timeout_case.add_error_info("TIMEOUT", "Timed out after {} seconds\n{}".format(CONFIG.timeout, parsed_output[-4096:]))
+    test_cases.append(timeout_case)
+    failures += 1
   test_suite.test_cases = test_cases
-  return (test_suite, successes, failures, failure_output)
+  return (test_suite, successes, failures, failure_output, duration)
 
 if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Run all driver tests in parallel, with coverage for the changed drivers")
+  parser.add_argument("changed_drivers", nargs="*", help="driver directories to collect coverage for")
+  parser.add_argument("--shard", type=test_shards.parse_shard, help="only run shard i of N (as i/N) of the test files, balanced by --timings")
+  parser.add_argument("--timings", type=Path, help="per-file test durations from an earlier run, used to balance shards")
+  parser.add_argument("--record-timings", type=Path, help="write this run's per-file test durations to this file (merged with its existing entries)")
+  parser.add_argument("--capability-changes", nargs="+", metavar="CAPABILITY", help="only run the test files of drivers using these changed capability definitions (<id>_<version>.json files or capability ids; see tools/capability_impact.py)")
+  parser.add_argument("--timeout", type=float, metavar="SECONDS", help="kill a test file's lua process after SECONDS and report the file as failed")
+  parser.add_argument("--memory-limit", type=int, metavar="MB", help="cap each test file's lua process at MB MiB of address space (Linux)")
+  parser.add_argument("--profile", "-p", action="store_true", help="sample each test file with tools/lua/profiler.lua and report the hottest functions across all files (disables coverage)")
+  parser.add_argument("--failed-first", "-F", action="store_true", help="run the test files that failed last time and those of drivers with uncommitted changes first, printing failures as they happen")
+  parser.add_argument("--max-failures", "-x", type=int, metavar="N", help="stop starting new test files after N test failures")
+  parser.add_argument("--junit-gzip", action="store_true", help="gzip-compress the JUnit reports (<driver>_test_output.xml.gz)")
+  parser.add_argument("--junit-max-output", type=int, default=DEFAULT_MAX_OUTPUT, metavar="CHARS", help="cut captured output longer than CHARS in the JUnit reports, keeping the whole of it in a <driver>_test_output directory (0: no limit)")
+  parser.add_argument("--quarantine", type=Path, default=QUARANTINE_FILE, metavar="FILE", help="report failures of the tests listed in FILE without failing the run (default: tools/test_quarantine.json, if present)")
+  parser.add_argument("--no-quarantine", action="store_true", help="fail on quarantined tests too")
+  args = parser.parse_args()
+  CONFIG.changed_drivers = [Path(driver).name for driver in args.changed_drivers]
+  CONFIG.timeout = args.timeout
+  CONFIG.memory_limit = args.memory_limit
+  CONFIG.profile = args.profile
+  CONFIG.junit_suffix = ".xml.gz" if args.junit_gzip else ".xml"
+  CONFIG.junit_max_output = args.junit_max_output
+  if not args.no_quarantine:
+    CONFIG.quarantine = load_quarantine(args.quarantine)
+  if CONFIG.profile:
+    # luacov and the profiler both need the debug hook
+    if CONFIG.changed_drivers:
+      print("Not collecting coverage while profiling")
+    CONFIG.changed_drivers = []
+    shutil.rmtree(lua_profile.DEFAULT_STACKS_DIR, ignore_errors=True)
+  if args.capability_changes:
+    CONFIG.selected_files = set(impacted_test_files(args.capability_changes, drivers_dir=DRIVER_DIRS))
+    print("{} test files use the changed capabilities".format(len(CONFIG.selected_files)))
+    if CONFIG.changed_drivers:
+      # only some of a driver's test files run, so its coverage would be incomplete
+      print("Not collecting coverage for a capability change run")
+      CONFIG.changed_drivers = []
+  if args.shard is not None:
+    CONFIG.shard_files = set(test_shards.shard_files(args.shard, args.timings))
+    CONFIG.shard_suffix = "_shard{}of{}".format(*args.shard)
+    print("Shard {} of {}: {} test files".format(*args.shard, len(CONFIG.shard_files)))
 
   try:
     os.mkdir(Path(os.path.abspath(__file__)).parent.joinpath("test_output"))
@@ -84,9 +229,49 @@ if __name__ == "__main__":
   except FileExistsError:
     pass
 
+  CONFIG.capability_dirs = DriverCapabilityDirs.from_env(os.environ)
+
+  drivers = DRIVERS
+  if args.failed_first:
+    # drivers are started in the order of their highest priority test file
+    ordered_files = prioritize(DRIVER_DIRS.glob("*/*/src/test/test_*.lua"), load_last_failed())
+    CONFIG.file_order = {test_file: i for i, test_file in enumerate(ordered_files)}
+    driver_order = {}
+    for test_file in ordered_files:
+      driver_order.setdefault(test_file.parents[2], len(driver_order))
+    drivers = sorted(DRIVERS, key=lambda driver: driver_order.get(driver, len(driver_order)))
+  if args.max_failures is not None:
+    CONFIG.max_failures = args.max_failures
+    CONFIG.failure_count = Value('i', 0)
+  CONFIG.stream_failures = args.failed_first or args.max_failures is not None
+
   failure_output = ""
-  with Pool() as pool:
-    failure_output = pool.map(per_driver_task, DRIVERS)
+  with Pool(initializer=init_worker, initargs=(CONFIG,)) as pool:
+    # imap with a chunksize of 1 starts drivers in order, so prioritized drivers go first
+    driver_results = list(pool.imap(per_driver_task, drivers, chunksize=1))
+  failure_output = [result[0] for result in driver_results]
+  save_last_failed([test_file for result in driver_results for test_file in result[1]],
+                   [test_file for result in driver_results for test_file in result[2]])
+  if CONFIG.max_failures is not None and CONFIG.failure_count.value >= CONFIG.max_failures:
+    print("Stopped starting new test files after {} failures".format(CONFIG.failure_count.value))
+
+  if args.record_timings is not None:
+    test_shards.save_timings(args.record_timings, {test_file: duration for result in driver_results for test_file, duration in result[1].items()})
+
+  if CONFIG.capability_dirs is not None:
+    CONFIG.capability_dirs.cleanup()
+
+  if CONFIG.profile:
+    lua_profile.report()
+
+  # one Cobertura report across every covered driver, alongside the per-driver ones
+  coverage_reports = [report for report in Path(os.path.abspath(__file__)).parent.joinpath("coverage_output").glob("*_coverage.xml")
+                      if report.stem[:-len("_coverage")] in CONFIG.changed_drivers]
+  if CONFIG.shard_files is not None and CONFIG.changed_drivers:
+    # a driver's test files can be split across shards, so its coverage is only complete once all stats are merged
+    print("Coverage stats left in {} for tools/luacov_stats.py merge".format(luacov_stats.DEFAULT_STATS_DIR))
+  elif coverage_reports:
+    luacov_stats.combine_cobertura(coverage_reports, Path(os.path.abspath(__file__)).parent.joinpath("coverage_output", "coverage.xml"))
 
   exit_code = 0
 
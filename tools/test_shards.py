@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# Copyright 2026 SmartThings
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""test_shards.py
+
+Splitting the driver test files across several machines, and merging the
+JUnit reports the shards produce.
+
+Test files are assigned to shards by estimated duration, longest first, each to
+the shard with the least estimated time so far.  Estimates come from a timings
+file recorded by an earlier run (run_driver_tests_p.py --record-timings); files
+without a recorded time are estimated from their size.  The assignment depends
+only on the file list, the timings file and N, so every shard computes the same
+split independently.
+
+Usage
+-----
+    python3 tools/run_driver_tests_p.py --shard 1/4 --timings test_timings.json
+    python3 tools/test_shards.py plan --shard 1/4 [--timings test_timings.json]
+    python3 tools/test_shards.py merge \\
+        --output tools/test_output/merged_test_output.xml \\
+        shard1/tools/test_output shard2/tools/test_output ...
+
+Timings file format
+-------------------
+    {"<test file path relative to the repo root>": <seconds>, ...}
+
+Merge arguments
+---------------
+    inputs      JUnit XML files, or directories whose *_test_output.xml files
+                are merged; reports written with --junit-gzip (.xml.gz) are
+                read too
+    --output    Where to write the combined report
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+from driver_test_lib import DRIVER_DIR, discover_test_files
+
+REPO_ROOT = DRIVER_DIR.parent
+SUITE_COUNTS = ("tests", "failures", "errors", "skipped", "disabled")
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """Parse "i/N" (1-based) into (i, N)."""
+    index, sep, count = value.partition("/")
+    if not sep or not index.isdigit() or not count.isdigit() or not 1 <= int(index) <= int(count):
+        raise argparse.ArgumentTypeError(f"expected a shard as i/N with 1 <= i <= N, got {value!r}")
+    return int(index), int(count)
+
+
+def timing_key(test_file: Path) -> str:
+    return Path(test_file).resolve().relative_to(REPO_ROOT).as_posix()
+
+
+def load_timings(path: Optional[Path]) -> Dict[str, float]:
+    if path is None or not Path(path).is_file():
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return {k: float(v) for k, v in json.load(f).items()}
+
+
+def save_timings(path: Path, durations: Mapping[Path, float]) -> None:
+    """Record this run's durations, keeping recorded times of files that did not run."""
+    timings = load_timings(path)
+    timings.update({timing_key(test_file): round(seconds, 3) for test_file, seconds in durations.items()})
+    tmp = Path(str(path) + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(timings, f, indent=1, sort_keys=True)
+        f.write("\n")
+    os.replace(tmp, path)
+
+
+def estimate_durations(test_files: Iterable[Path], timings: Mapping[str, float]) -> Dict[Path, float]:
+    """Recorded seconds per file, or file size scaled by the recorded seconds per byte."""
+    sizes = {test_file: test_file.stat().st_size for test_file in test_files}
+    known_seconds = known_bytes = 0.0
+    for test_file, size in sizes.items():
+        seconds = timings.get(timing_key(test_file))
+        if seconds is not None:
+            known_seconds += seconds
+            known_bytes += size
+    seconds_per_byte = known_seconds / known_bytes if known_bytes else 1.0
+    return {test_file: timings.get(timing_key(test_file), size * seconds_per_byte)
+            for test_file, size in sizes.items()}
+
+
+def assign_shards(test_files: Iterable[Path], count: int, timings: Mapping[str, float]) -> List[List[Path]]:
+    """Longest-processing-time-first assignment of test files to count shards."""
+    estimates = estimate_durations(test_files, timings)
+    shards: List[List[Path]] = [[] for _ in range(count)]
+    loads = [0.0] * count
+    for test_file in sorted(estimates, key=lambda f: (-estimates[f], timing_key(f))):
+        lightest = min(range(count), key=lambda i: (loads[i], i))
+        shards[lightest].append(test_file)
+        loads[lightest] += estimates[test_file]
+    return shards
+
+
+def shard_files(shard: Tuple[int, int], timings_file: Optional[Path] = None,
+                test_files: Optional[List[Path]] = None) -> List[Path]:
+    """The test files shard (i, N) should run."""
+    index, count = shard
+    if test_files is None:
+        test_files = discover_test_files()
+    return assign_shards(test_files, count, load_timings(timings_file))[index - 1]
+
+
+def merge_junit(inputs: Iterable[Path], output: Path) -> int:
+    """Combine the test suites of several JUnit reports into one; returns the suite count."""
+    merged = ET.Element("testsuites")
+    totals = dict.fromkeys(SUITE_COUNTS, 0)
+    total_time = 0.0
+    for xml_file in inputs:
+        if Path(xml_file).name.endswith(".gz"):
+            with gzip.open(xml_file, "rb") as f:
+                root = ET.parse(f).getroot()
+        else:
+            root = ET.parse(xml_file).getroot()
+        suites = [root] if root.tag == "testsuite" else root.findall("testsuite")
+        for suite in suites:
+            for key in SUITE_COUNTS:
+                totals[key] += int(suite.get(key, 0) or 0)
+            total_time += float(suite.get("time", 0) or 0)
+            merged.append(suite)
+    for key, value in totals.items():
+        merged.set(key, str(value))
+    merged.set("time", str(round(total_time, 3)))
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    ET.ElementTree(merged).write(output, encoding="utf-8", xml_declaration=True)
+    return len(merged)
+
+
+def expand_inputs(inputs: Iterable[Path], output: Path) -> List[Path]:
+    files = []
+    for path in inputs:
+        if path.is_dir():
+            reports = [*path.glob("*_test_output.xml"), *path.glob("*_test_output.xml.gz")]
+            files.extend(sorted(p for p in reports if p.resolve() != output.resolve()))
+        else:
+            files.append(path)
+    return files
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Plan test shards and merge their JUnit reports")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    plan = subparsers.add_parser("plan", help="list the test files a shard runs")
+    plan.add_argument("--shard", type=parse_shard, required=True, help="the shard as i/N, 1 <= i <= N")
+    plan.add_argument("--timings", type=Path, help="per-file durations recorded by an earlier run")
+    merge = subparsers.add_parser("merge", help="merge shard JUnit reports into one")
+    merge.add_argument("inputs", nargs="+", type=Path, help="JUnit files, or directories of *_test_output.xml(.gz) files")
+    merge.add_argument("--output", "-o", type=Path, required=True, help="the merged JUnit report")
+    args = parser.parse_args(argv)
+
+    if args.command == "plan":
+        for test_file in shard_files(args.shard, args.timings):
+            print(timing_key(test_file))
+        return
+
+    files = expand_inputs(args.inputs, args.output)
+    if not files:
+        print("No JUnit reports found")
+        sys.exit(1)
+    suites = merge_junit(files, args.output)
+    print(f"Merged {suites} test suites from {len(files)} reports into {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,9 @@
 import argparse
+import json
 import re
 import os
-import subprocess
+from driver_test_lib import discover_test_files, run_test_files
+from capability_cache import DriverCapabilityDirs
 
 if os.environ.get("LUA_PATH") == None:
 	print("LUA_PATH environment variable must be set")
@@ -10,48 +12,47 @@ script = 'local v=require(\"version\"); print(v.api)'
 LIBS_VERSION = int(os.popen(f"lua -e '{script}'").read().strip())
 print(f"Found lua-libs version: {LIBS_VERSION}")
 
-TEST_CODE_REGEX = r"(test\.register_(?:coroutine|message)_test\(\s*\"([^\"]+)\"[\s\S]*?min_api_version\s*=\s*)(\d+)([\s\S]*?\))"
-TEST_RESULT_REGEX = r"Running test \"(.+?(?=\"))\" \(\d+ of \d+\)\n(PASSED|FAILED)"
-TEST_FILE_REGEX = r"Running tests from (\S+.lua)"
+TEST_CODE_REGEX = re.compile(r"(test\.register_(?:coroutine|message)_test\(\s*\"([^\"]+)\"[\s\S]*?min_api_version\s*=\s*)(\d+)([\s\S]*?\))")
+TEST_NAME_REGEX = re.compile(r"test\.register_(?:coroutine|message)_test\(\s*\"([^\"]+)\"")
 
-def capture_test_output(test_filter = None) -> str:
-	command = f"python3 tools/run_driver_tests.py -v".split(" ")
-	if test_filter != None:
-		command = f"python3 tools/run_driver_tests.py --filter {test_filter} -v".split(" ")
+def run_tests(test_filter = None, jobs = None, drivers = None) -> tuple:
+	test_files = discover_test_files(test_filter, drivers)
+	print(f"Running {len(test_files)} test files")
+	# same per-driver capability definitions the test runners use
+	capability_dirs = DriverCapabilityDirs.from_env(os.environ)
 
-	print(f"Running command: {command}")
-	proc = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-	print(f"Done")
-	return proc.stdout.decode('utf-8')
+	def env_for(test_file):
+		env = os.environ.copy()
+		if capability_dirs is not None:
+			env["ST_CAPABILITY_JSON_DIR"] = str(capability_dirs.for_driver(test_file.parts[-4]))
+		return env
 
-def get_results_from_output(output:str) -> dict:
 	passing = {}
 	failing = {}
-	while (m := re.search(TEST_FILE_REGEX,output)):
-		# print(m.group(1))
-		output = output[m.end():]
-
-		passed = []
-		failed = []
-		while True:
-			eot_index = len(output)
-			if eot := (re.search(r"#{10,}", output) or re.search(TEST_FILE_REGEX, output)):
-				eot_index = eot.start()
-
-			if t := re.search(TEST_RESULT_REGEX,output[:eot_index]):
-				if t.group(2) == 'PASSED':
-					passed.append(t.group(1))
-				else:
-					failed.append(t.group(1))
-				output = output[t.end():]
-			else:
-				output = output[eot_index:]
-				break
-		if len(passed) > 0:
-			passing[m.group(1)] = passed
-		if len(failed) > 0:
-			failing[m.group(1)] = failed
-	return (passing,failing)
+	skipped = {}
+	incomplete = []
+	try:
+		# results are consumed as each file finishes, so rewriting overlaps with the remaining tests
+		for result in run_test_files(test_files, jobs, env_for=env_for):
+			filename = str(result.test_file)
+			passed = result.passing()
+			failed = result.failing()
+			if len(failed) > 0:
+				failing[filename] = failed
+			if not result.complete:
+				# the harness crashed or its counts don't match what was seen: leave the file alone
+				incomplete.append(filename)
+				continue
+			if len(passed) > 0:
+				passing[filename] = passed
+			not_run = update_test_file(filename, set(passed), {c.name for c in result.cases})
+			if len(not_run) > 0:
+				skipped[filename] = not_run
+	finally:
+		if capability_dirs is not None:
+			capability_dirs.cleanup()
+	print(f"Done")
+	return (passing,failing,skipped,incomplete)
 
 def show_failing_tests(failing):
 	for filename in failing:
@@ -60,41 +61,54 @@ def show_failing_tests(failing):
 		for tn in tests:
 			print(f"	{tn}")
 
-def update_passing_tests(passing):
-	for filename in passing:
-		# print(f"Parsing file: {filename}")
-		fn = filename
-		passing_tests = list(passing[filename])
-
-		def replace_function(match):
-			if match.group(2) in passing_tests and int(match.group(3)) > LIBS_VERSION:
-				return f"{match.group(1)}{LIBS_VERSION}{match.group(4)}"
-			else:
-				return match.group(0)
-
-
-		with open(filename,'r') as fd:
-			file_contents = fd.read()
-
-		updated_test_file = re.sub(TEST_CODE_REGEX,replace_function,file_contents)
-
-		with open(filename + ".new", 'w') as fd:
-			fd.write(updated_test_file)
-
-		os.replace(filename + ".new", filename)
-		print(f"Updated: {filename}")
+def update_test_file(filename, passing_tests:set, observed_tests:set) -> list:
+	"""Update the passing tests in filename and return the registered tests that did not run."""
+	def replace_function(match):
+		if match.group(2) in passing_tests and int(match.group(3)) > LIBS_VERSION:
+			return f"{match.group(1)}{LIBS_VERSION}{match.group(4)}"
+		else:
+			return match.group(0)
+
+	with open(filename,'r') as fd:
+		file_contents = fd.read()
+
+	# one pass over the file; it is only rewritten if a version actually changed
+	not_run = [name for name in TEST_NAME_REGEX.findall(file_contents) if name not in observed_tests]
+	updated_test_file = TEST_CODE_REGEX.sub(replace_function,file_contents)
+	if updated_test_file == file_contents:
+		return not_run
+
+	with open(filename + ".new", 'w') as fd:
+		fd.write(updated_test_file)
+
+	os.replace(filename + ".new", filename)
+	print(f"Updated: {filename}")
+	return not_run
+
+def show_skipped_tests(skipped, incomplete, report_file = None):
+	skipped_count = sum(len(tests) for tests in skipped.values())
+	if skipped_count > 0:
+		print(f"{skipped_count} tests in {len(skipped)} files did not run and were left unchanged")
+	for filename in incomplete:
+		print(f"Not updated, results incomplete for: {filename}")
+	if report_file != None:
+		with open(report_file, 'w') as fd:
+			json.dump({"skipped": skipped, "incomplete": incomplete}, fd, indent=2)
+		print(f"Skipped tests written to {report_file}")
 
 if __name__ == "__main__":
 
 	parser = argparse.ArgumentParser(description="""Runs driver tests against lua libs, parses the output of the tests results,
 								  and updates the min_api_version of the tests that successfully passed if the test version is
-								  less than the test's min_api_version.NOTE: this CAN NOT be done if test filtering is active.
-								  If enabled, disable this by temporarily removing the code or commenting it out.""")
-	parser.add_argument("--filter", "-f", help="Filter of tests to run and update min_api_version for. Argument is passed into the tools/run_driver_tests.py --filter <arg>",default=None)
+								  less than the test's min_api_version. Only files whose results were fully observed are updated,
+								  and tests that did not run (e.g. filtered out by the harness) are left unchanged and reported.""")
+	parser.add_argument("--filter", "-f", help="Filter of tests to run and update min_api_version for. Regex matched against the test file path, as in tools/run_driver_tests.py --filter <arg>",default=None)
+	parser.add_argument("--driver", "-d", action="append", dest="drivers", help="Only run the tests of this driver (by directory name). Can be given more than once",default=None)
+	parser.add_argument("--skipped-report", "-s", help="Write the tests that did not run and the files that were not updated to this JSON file",default=None)
+	parser.add_argument("--jobs", "-j", type=int, help="Number of test files to run at once (default: number of CPUs)",default=None)
 	args = parser.parse_args()
-	
-	test_output = capture_test_output(args.filter)
-	passing, failing = get_results_from_output(test_output)
-	update_passing_tests(passing)
+
+	passing, failing, skipped, incomplete = run_tests(args.filter, args.jobs, args.drivers)
 	show_failing_tests(failing)
+	show_skipped_tests(skipped, incomplete, args.skipped_report)
 
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# Copyright 2026 SmartThings
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""validate_capability_references.py
+
+Validates every capability reference in driver profiles against the local
+capability definition cache written by tools/fetch_capability_definitions.py,
+without making any API requests.
+
+The cache is loaded once into an in-memory index and the driver trees are
+walked once.  For every capability in every component this checks that:
+
+  - a definition for <id>/<version> exists in the cache
+  - each config.values key names an existing attribute property
+    (<attribute>.<property>), command argument (<command>.<argument>) or
+    {{enumCommands}}
+  - each enabledValues entry is allowed by the attribute's enum (or is a valid
+    command for {{enumCommands}})
+  - each range lies within the attribute's minimum/maximum
+
+Usage
+-----
+    python3 tools/validate_capability_references.py \\
+        --drivers-dir drivers/ \\
+        --capability-dir ~/cap_cache \\
+        [--missing-as-error] \\
+        [--output-file capability_reference_comment.md]
+
+Arguments
+---------
+    --drivers-dir PATH      Root of a driver tree to scan for profiles.
+                            May be specified multiple times.
+    --capability-dir PATH   Directory of <capabilityId>_<version>.json files, or a
+                            capability bundle built by tools/capability_bundle.py.
+    --missing-as-error      Treat capabilities with no cached definition as errors.
+                            By default they are only reported as warnings, since a
+                            capability may simply have failed to download.
+    --output-file PATH      When set, write a markdown-formatted report of all
+                            problems to this file.  The file is only created when
+                            there are problems.
+"""
+
+import argparse
+import sys
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Tuple
+
+from capability_cache import CapabilityDefinition, CapabilityIndex
+from fetch_capability_definitions import EXCLUDED_IDS, iter_profiles, profile_capabilities
+
+ENUM_COMMANDS_KEY = "{{enumCommands}}"
+
+
+class Problem(NamedTuple):
+    path: Path
+    component: str
+    capability: str
+    message: str
+    error: bool
+
+
+def validate_config_value(definition: CapabilityDefinition, value: dict) -> List[str]:
+    """Return a list of problems with a single config.values entry."""
+    key = value.get("key")
+    if key == ENUM_COMMANDS_KEY:
+        commands = definition.enum_commands()
+        return [f"{ENUM_COMMANDS_KEY} enables unknown command '{v}'"
+                for v in value.get("enabledValues") or [] if v not in commands]
+
+    if not isinstance(key, str) or "." not in key:
+        return [f"config key '{key}' is not of the form <attribute>.<property>"]
+
+    name, prop = key.split(".", 1)
+    if name not in definition.attributes:
+        if name in definition.commands:
+            if prop not in definition.command_arguments(name):
+                return [f"config key '{key}': command '{name}' has no argument '{prop}'"]
+            return []
+        return [f"config key '{key}': no attribute or command named '{name}'"]
+
+    schema = definition.value_schema(name, prop)
+    if schema is None:
+        return [f"config key '{key}': attribute '{name}' has no property '{prop}'"]
+
+    problems = []
+    allowed = definition.allowed_values(name, prop)
+    if allowed is not None:
+        for v in value.get("enabledValues") or []:
+            if v not in allowed:
+                problems.append(f"config key '{key}' enables unknown value '{v}'")
+
+    value_range = value.get("range")
+    if isinstance(value_range, list) and len(value_range) == 2:
+        minimum, maximum = schema.get("minimum"), schema.get("maximum")
+        low, high = value_range
+        if (minimum is not None and low < minimum) or (maximum is not None and high > maximum):
+            problems.append(
+                f"config key '{key}' range {value_range} is outside [{minimum}, {maximum}]"
+            )
+    return problems
+
+
+def validate_profiles(
+    drivers_dirs: List[Path],
+    index: CapabilityIndex,
+    missing_as_error: bool = False,
+) -> List[Problem]:
+    problems: List[Problem] = []
+    missing: Dict[Tuple[str, int], List[Tuple[Path, str]]] = {}
+    profile_count = 0
+    load_errors: List[Tuple[Path, Exception]] = []
+    for profile_path, profile in iter_profiles(drivers_dirs, load_errors):
+        profile_count += 1
+        if profile is None:
+            continue
+        for cap_id, cap_ver, cap, component in profile_capabilities(profile):
+            if cap_id in EXCLUDED_IDS:
+                continue
+            component_id = component.get("id", "?")
+            definition = index.get(cap_id, cap_ver)
+            if definition is None:
+                missing.setdefault((cap_id, cap_ver), []).append((profile_path, component_id))
+                continue
+            for value in ((cap.get("config") or {}).get("values") or []):
+                for message in validate_config_value(definition, value):
+                    problems.append(Problem(profile_path, component_id, cap_id, message, True))
+
+    # Report each missing definition once rather than once per referencing profile
+    for (cap_id, cap_ver), references in sorted(missing.items()):
+        profile_path, component_id = references[0]
+        problems.append(Problem(profile_path, component_id, cap_id,
+                                f"no cached definition for {cap_id} v{cap_ver} "
+                                f"(referenced {len(references)} time(s))",
+                                missing_as_error))
+
+    # files that failed to load were not yielded, so each file is counted once
+    print(
+        f"Validated {profile_count} profile(s) against {len(index)} cached definition(s)"
+        + (f", {len(load_errors)} more failed to parse" if load_errors else "")
+        + "."
+    )
+    return problems
+
+
+def write_report(
+    problems: List[Problem],
+    output_file: Path,
+    root: Path,
+    truncate_at: int = 50,
+) -> None:
+    if not problems:
+        return
+    lines = [
+        "## Capability Reference Problems",
+        "",
+        "| Profile | Component | Capability | Problem |",
+        "|---------|-----------|------------|---------|",
+    ]
+    # Errors first, so truncation only ever hides warnings when possible
+    ordered = sorted(problems, key=lambda p: not p.error)
+    for p in ordered[:truncate_at]:
+        marker = ":x:" if p.error else ":warning:"
+        lines.append(f"| `{_relative(p.path, root)}` | {p.component} | `{p.capability}` | {marker} {p.message} |")
+    if len(ordered) > truncate_at:
+        lines.append("")
+        lines.append(f"_...and {len(ordered) - truncate_at} more._")
+    output_file.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def _relative(path: Path, root: Path) -> str:
+    try:
+        return str(path.relative_to(root))
+    except ValueError:
+        return str(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "--drivers-dir",
+        action="append",
+        dest="drivers_dirs",
+        metavar="PATH",
+        required=True,
+        help="Root of a driver tree to scan (may be specified multiple times).",
+    )
+    parser.add_argument(
+        "--capability-dir",
+        metavar="PATH",
+        required=True,
+        help="Directory of <capabilityId>_<version>.json files, or a capability bundle file.",
+    )
+    parser.add_argument(
+        "--missing-as-error",
+        action="store_true",
+        default=False,
+        help="Treat capabilities with no cached definition as errors instead of warnings.",
+    )
+    parser.add_argument(
+        "--output-file",
+        metavar="PATH",
+        default=None,
+        help="Write a markdown report of all problems to this file (only created when there are problems).",
+    )
+    args = parser.parse_args(argv)
+
+    drivers_dirs = [Path(d).expanduser().resolve() for d in args.drivers_dirs]
+    for d in drivers_dirs:
+        if not d.is_dir():
+            print(f"ERROR: --drivers-dir does not exist: {d}", file=sys.stderr)
+            sys.exit(1)
+    capability_dir = Path(args.capability_dir).expanduser().resolve()
+    if not capability_dir.exists():
+        print(f"ERROR: --capability-dir does not exist: {capability_dir}", file=sys.stderr)
+        sys.exit(1)
+
+    index = CapabilityIndex.load(capability_dir)
+    problems = validate_profiles(drivers_dirs, index, args.missing_as_error)
+
+    root = Path.cwd()
+    for p in problems:
+        level = "ERROR" if p.error else "WARNING"
+        print(f"  {level}: {_relative(p.path, root)} [{p.component}] {p.capability}: {p.message}")
+
+    if args.output_file:
+        write_report(problems, Path(args.output_file).expanduser().resolve(), root)
+
+    errors = sum(1 for p in problems if p.error)
+    print(f"{errors} error(s), {len(problems) - errors} warning(s).")
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()